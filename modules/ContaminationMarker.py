@@ -17,12 +17,22 @@
 
 
 import os
+import re
+import mmap
+import time
 import itertools
+import numpy as np
+from multiprocessing import Pool
 if __name__ == 'modules.ContaminationMarker':
     from .Genotypes import *
+    from .pileup_io import open_pileup, get_compression, is_stream
+    from . import metrics
 if __name__ == 'ContaminationMarker':
     from Genotypes import *
-from collections import OrderedDict
+    from pileup_io import open_pileup, get_compression, is_stream
+    import metrics
+from collections import OrderedDict, defaultdict
+from bisect import bisect_right
 
 
 class Marker:
@@ -103,75 +113,370 @@ def parse_mpileup_line(line, min_map_quality=0, min_base_quality=0):
     return(P)
 
 
-def genotype_likelihoods_for_markers(Markers, mpileup_file, min_map_quality=0, min_base_quality=0):
+def parse_samtools_mpileup_line(line, min_map_quality=0, min_base_quality=0):
+    """
+    Parse a single sample line from `samtools mpileup`; chrom, pos, ref, depth, bases, base quals and optionally mapping quals (`--output-MQ`)
+    """
+    line = line.rstrip('\r\n').split('\t')
+    chrom = line[0]
+    pos = line[1]
+    ref = line[2]
 
-    M = dict()
-    f = open(mpileup_file)
+    if int(line[3]) == 0:
+        return(Pileup(chrom, pos, ref, [], [], [], []))
 
-    for line in f:
+    bases = as_bytes_array(pileup2acgt(line[4], ref))
+    baseQs = as_bytes_array(line[5]) - 33
+    if len(bases) != len(baseQs):
+        raise ValueError("The read bases and base qualities do not line up in pileup line: " + chrom + " " + pos)
+
+    keep = baseQs >= min_base_quality
+    if min_map_quality > 0:
+        if len(line) < 7:
+            raise ValueError("samtools pileup has no mapping quality column; create it with 'samtools mpileup --output-MQ' or use a minimum mapping quality of 0")
+        keep &= (as_bytes_array(line[6]) - 33) >= min_map_quality
+
+    A_base_quals_list = baseQs[keep & (bases == ord('A'))].tolist()
+    C_base_quals_list = baseQs[keep & (bases == ord('C'))].tolist()
+    G_base_quals_list = baseQs[keep & (bases == ord('G'))].tolist()
+    T_base_quals_list = baseQs[keep & (bases == ord('T'))].tolist()
+
+    P = Pileup(chrom, pos, ref, A_base_quals_list, C_base_quals_list, G_base_quals_list, T_base_quals_list)
+    return(P)
+
+
+def detect_pileup_format(line):
+    """
+    Get the format of a pileup from one of its lines;
+    'samtools' for tab-delimited `samtools mpileup` output with a numeric depth column, otherwise 'gatk' for space-delimited GATK verbose pileup
+    """
+    fields = line.split('\t')
+    if len(fields) >= 6 and fields[3].isdigit():
+        return('samtools')
+    return('gatk')
+
+
+def has_mapping_qualities(line, pileup_format):
+    """
+    Check whether a pileup line has the mapping qualities of its reads;
+    samtools pileups need to be made with 'samtools mpileup --output-MQ', GATK pileups with -verbose
+    """
+    if pileup_format == 'samtools':
+        return(len(line.rstrip('\r\n').split('\t')) >= 7)
+    return(len(line.split(' ')) >= 8)
+
+
+def check_mapping_qualities(line, pileup_format, min_map_quality=0, name='pileup'):
+    """
+    Raise a ValueError if a minimum mapping quality is used on a pileup without mapping qualities;
+    called once with the line the format is detected from, instead of failing on every line
+    """
+    if min_map_quality > 0 and not has_mapping_qualities(line, pileup_format):
+        if pileup_format == 'samtools':
+            fix = "create it with 'samtools mpileup --output-MQ'"
+        else:
+            fix = "create it with GATK Pileup -verbose"
+        raise ValueError("The {0} pileup {1} has no mapping quality column; {2} or use a minimum mapping quality of 0".format(pileup_format, name, fix))
+
+
+def get_pileup_parser(pileup_format):
+    """
+    Get the line parsing function for a pileup format
+    """
+    parsers = {
+        'gatk': parse_mpileup_line,
+        'samtools': parse_samtools_mpileup_line
+    }
+    return(parsers[pileup_format])
+
+
+def marker_genotype_likelihood(pileup, marker):
+    """
+    Get the genotype likelihoods and coverage for a single marker from its parsed pileup;
+    returns None if there are no reads supporting either the ref or alt allele
+    """
+    if pileup.Quals[marker.ref] == [] and pileup.Quals[marker.alt] == []:
+        return(None)
+
+    AA_likelihood, AB_likelihood, BB_likelihood = compute_genotype_likelihood(pileup.Quals[marker.ref], pileup.Quals[marker.alt], normalize=False)
+    prAA, prAB, prBB = prior_genotype_probability(marker.RAF)
+
+    return({'likelihoods' : [AA_likelihood/prAA, AB_likelihood/prAB, BB_likelihood/prBB], 'coverage': pileup.depth})
+
+
+def genotype_likelihoods_for_lines(Markers, lines, min_map_quality=0, min_base_quality=0, pileup_format=None, name='pileup'):
+    """
+    Get the genotype likelihoods for the markers found in an iterable of pileup lines;
+    markers that are not found in the lines are not included in the output
+    if pileup_format is None it is detected from the first line
+    name is the input the lines are from, for the error when they have no mapping qualities
+    """
+    M = dict()
+    parse_line = None
+    timing = metrics.ENABLED
+    if timing:
+        start = time.time()
+        parse_time = 0.0
+        likelihood_time = 0.0
+        num_lines = 0
+    for line in lines:
+        if timing:
+            num_lines += 1
         if line.startswith("[REDUCE RESULT]"):
             continue
-        pileup = parse_mpileup_line(line, min_map_quality=min_map_quality, min_base_quality=min_base_quality)
+        if parse_line is None:
+            if pileup_format is None:
+                pileup_format = detect_pileup_format(line)
+            check_mapping_qualities(line, pileup_format, min_map_quality, name=name)
+            parse_line = get_pileup_parser(pileup_format)
+        # skip the lines of positions that are not markers before parsing them
+        fields = line.split(None, 2)
+        if len(fields) < 2 or fields[0] + ":" + fields[1] not in Markers:
+            continue
+        if timing:
+            t0 = time.time()
+        pileup = parse_line(line, min_map_quality=min_map_quality, min_base_quality=min_base_quality)
+        if timing:
+            t1 = time.time()
+        M[pileup.chrom + ":" + pileup.pos] = marker_genotype_likelihood(pileup, Markers[pileup.chrom + ":" + pileup.pos])
+        if timing:
+            parse_time += t1 - t0
+            likelihood_time += time.time() - t1
+    if timing:
+        # the rest of the time goes to reading, decompressing and skipping lines
+        metrics.add_time('pileup.read', time.time() - start - parse_time - likelihood_time)
+        metrics.add_time('pileup.parse_line', parse_time)
+        metrics.add_time('pileup.genotype_likelihood', likelihood_time)
+        metrics.count('pileup.lines', num_lines)
+        metrics.count('pileup.marker_lines', len(M))
+    return(M)
+
+
+def genotype_likelihoods_for_markers(Markers, mpileup_file, min_map_quality=0, min_base_quality=0, num_threads=1, pileup_format=None):
+    """
+    Get the genotype likelihoods for all markers from a plain text or compressed GATK verbose or samtools mpileup file
+    the pileup_format ('gatk' or 'samtools') is detected from the first line if it is not given
+    mpileup_file can also be "-" for stdin, a named pipe, or an open binary file object, which are read once from start to end
+    if num_threads > 1, a plain text file is split into line-aligned byte ranges that are parsed in parallel,
+    and a compressed file is decompressed with up to num_threads threads
+    """
+    seekable = not hasattr(mpileup_file, 'read') and not is_stream(mpileup_file)
+    if int(num_threads) > 1 and seekable and get_compression(mpileup_file) is None:
+        M = parallel_genotype_likelihoods(Markers, mpileup_file, num_threads=num_threads, min_map_quality=min_map_quality, min_base_quality=min_base_quality, pileup_format=pileup_format)
+    else:
+        f = open_pileup(mpileup_file, num_threads=max(int(num_threads), 1))
+        M = genotype_likelihoods_for_lines(Markers, f, min_map_quality=min_map_quality, min_base_quality=min_base_quality, pileup_format=pileup_format, name=getattr(mpileup_file, 'name', mpileup_file))
+        f.close()
+
+    for m in Markers:
         try:
-            marker = Markers[pileup.chrom + ":" + pileup.pos]
+            v = M[m]
         except:
-            continue
+            M[m] = None
+
+    return(M)
 
-        ref = marker.ref
-        alt = marker.alt
-        RAF = marker.RAF
 
-        if pileup.Quals[ref] == [] and pileup.Quals[alt] == []:
-            M[pileup.chrom + ":" + pileup.pos] = None
+def read_qualities_for_line(line, pileup_format):
+    """
+    Get the chrom, pos, and the per-read bases, base qualities and mapping qualities from a pileup line, without any filtering
+    the mapping qualities are None if the pileup does not have them
+    """
+    if pileup_format == 'samtools':
+        line = line.rstrip('\r\n').split('\t')
+        if int(line[3]) == 0:
+            return(line[0], line[1], '', [], [])
+        bases = pileup2acgt(line[4], line[2])
+        baseQs = baseQ2int(line[5])
+        mapqs = baseQ2int(line[6]) if len(line) >= 7 else None
+        return(line[0], line[1], bases, baseQs, mapqs)
+
+    line = line.split(' ')
+    bases = line[3]
+    baseQs = baseQ2int(line[4])
+    mapqs = None
+    if len(line) >= 8:
+        mapqs = [ int(v.split('@')[-1]) for v in line[7].split(',') ]
+    return(line[0], line[1], bases, baseQs, mapqs)
+
+
+def quality_histograms_for_markers(Markers, mpileup_file, mapq_bins=(0,), pileup_format=None):
+    """
+    Parse a pileup once into per-marker joint histograms of (mapping quality bin, base quality) for each base,
+    so that genotype likelihoods can be made afterwards for any min mapping quality in mapq_bins and any min base quality
+
+    mapq_bins are the lower edges of the mapping quality bins; a read is counted in the highest bin whose edge is <= its mapping quality
+    returns a dict of marker -> {(base, mapq_bin_index, base_quality): count}; markers without pileup lines are not included
+    """
+    mapq_bins = sorted(set([0] + [ int(b) for b in mapq_bins ]))
+    H = dict()
+    f = open_pileup(mpileup_file)
+    for line in f:
+        if line.startswith("[REDUCE RESULT]"):
             continue
+        if pileup_format is None:
+            pileup_format = detect_pileup_format(line)
+        chrom, pos, bases, baseQs, mapqs = read_qualities_for_line(line, pileup_format)
+        try:
+            marker = Markers[chrom + ":" + pos]
+        except:
+            continue
+        if mapqs is None and len(mapq_bins) > 1 and len(bases) > 0:
+            raise ValueError("The pileup has no mapping qualities to bin; use GATK -verbose or 'samtools mpileup --output-MQ'")
 
-        AA_likelihood, AB_likelihood, BB_likelihood = compute_genotype_likelihood(pileup.Quals[ref], pileup.Quals[alt], normalize=False)
-        prAA, prAB, prBB = prior_genotype_probability(RAF)
+        histogram = defaultdict(int)
+        for i in range(0, len(bases)):
+            if bases[i] not in ['A', 'C', 'G', 'T']:
+                continue
+            mapq_bin = 0
+            if mapqs is not None:
+                mapq_bin = bisect_right(mapq_bins, mapqs[i]) - 1
+            histogram[(bases[i], mapq_bin, baseQs[i])] += 1
+        H[chrom + ":" + pos] = dict(histogram)
+    f.close()
+    return(H)
 
 
-        M[pileup.chrom + ":" + pileup.pos] = {'likelihoods' : [AA_likelihood/prAA, AB_likelihood/prAB, BB_likelihood/prBB], 'coverage': pileup.depth}
+def genotype_likelihoods_from_histograms(Markers, H, mapq_bins=(0,), min_map_quality=0, min_base_quality=0):
+    """
+    Get the genotype likelihoods for all markers from the histograms made by `quality_histograms_for_markers`
+    min_map_quality must be one of the mapq_bins edges that were used to make the histograms
+    """
+    mapq_bins = sorted(set([0] + [ int(b) for b in mapq_bins ]))
+    if min_map_quality not in mapq_bins:
+        raise ValueError("Minimum mapping quality {0} is not one of the histogram bins {1}".format(min_map_quality, mapq_bins))
+    min_bin = mapq_bins.index(min_map_quality)
 
+    M = dict()
     for m in Markers:
         try:
-            v = M[m]
-        except:
+            histogram = H[m]
+        except KeyError:
             M[m] = None
-
-    f.close()
+            continue
+        Quals = {'A': [], 'C': [], 'G': [], 'T': []}
+        for (base, mapq_bin, baseQ) in sorted(histogram):
+            if mapq_bin >= min_bin and baseQ >= min_base_quality:
+                Quals[base].extend([baseQ] * histogram[(base, mapq_bin, baseQ)])
+        marker = Markers[m]
+        pileup = Pileup(marker.chrom, marker.pos, marker.ref, Quals['A'], Quals['C'], Quals['G'], Quals['T'])
+        M[m] = marker_genotype_likelihood(pileup, marker)
     return(M)
 
 
+def find_line_aligned_ranges(mpileup_file, num_chunks):
+    """
+    Split a file into at most num_chunks (start, end) byte ranges
+    each range starts at the beginning of a line and ends just past a newline (or at the end of the file)
+    """
+    size = os.path.getsize(mpileup_file)
+    if size == 0:
+        return([])
+    starts = [0]
+    with open(mpileup_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for i in range(1, int(num_chunks)):
+            pos = mm.find(b'\n', max(i * size // int(num_chunks), starts[-1]))
+            if pos == -1 or pos + 1 >= size:
+                break
+            if pos + 1 > starts[-1]:
+                starts.append(pos + 1)
+        mm.close()
+    ends = starts[1:] + [size]
+    return(list(zip(starts, ends)))
+
+
+def iter_mmap_lines(mpileup_file, start, end):
+    """
+    Yield the lines from a memory-mapped file that fall within the byte range [start, end)
+    """
+    with open(mpileup_file, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm.seek(start)
+        while mm.tell() < end:
+            line = mm.readline()
+            if not line:
+                break
+            if not isinstance(line, str): # Python 3 mmap returns bytes
+                line = line.decode('latin-1')
+            yield(line)
+        mm.close()
+
+
+# markers set in each pool process by _init_byte_range_worker, so that they are sent once per process instead of once per chunk
+_worker_markers = None
+
+def _init_byte_range_worker(Markers):
+    global _worker_markers
+    _worker_markers = Markers
+
+
+def _genotype_likelihoods_for_byte_range(args):
+    """
+    Worker for parallel_genotype_likelihoods; needs to be a top-level function so it can be pickled by multiprocessing
+    """
+    mpileup_file, start, end, min_map_quality, min_base_quality, pileup_format = args
+    lines = iter_mmap_lines(mpileup_file, start, end)
+    return(genotype_likelihoods_for_lines(_worker_markers, lines, min_map_quality=min_map_quality, min_base_quality=min_base_quality, pileup_format=pileup_format, name=mpileup_file))
+
+
+def parallel_genotype_likelihoods(Markers, mpileup_file, num_threads=4, num_chunks=None, min_map_quality=0, min_base_quality=0, pileup_format=None):
+    """
+    Memory-map the pileup file, split it into line-aligned byte ranges and parse the ranges in a process pool
+    the per-range results are merged in file order so that the output matches a serial parse of the file
+    """
+    if num_chunks is None:
+        # use more chunks than processes so that uneven ranges still balance out across the pool
+        num_chunks = int(num_threads) * 4
+    ranges = find_line_aligned_ranges(mpileup_file, num_chunks)
+    tasks = [ (mpileup_file, start, end, min_map_quality, min_base_quality, pileup_format) for start, end in ranges ]
+
+    pool = Pool(int(num_threads), initializer=_init_byte_range_worker, initargs=(Markers,))
+    try:
+        chunk_results = pool.map(_genotype_likelihoods_for_byte_range, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+    M = dict()
+    for chunk_result in chunk_results:
+        M.update(chunk_result)
+    return(M)
 
 
+READ_START_END = re.compile(r'\^.|\$')
+INDEL = re.compile(r'[+-]([0-9]+)')
 
 def pileup2acgt(pileup, ref):
+    """
+    Decode the read bases column of a samtools mpileup line into one upper case character per read,
+    so that it lines up with the base quality column; '.' and ',' become the ref base, deletions stay '*' and reference skips ('<', '>') become '>'.
+    Read start ('^' and its mapping quality) and end ('$') markers and the inserted or deleted sequences after each read ('+2AG', '-1C') are removed.
+    """
     ref = ref.upper()
-    nts = ''
-    i = 0
-    while i < len(pileup):
-        r = pileup[i]
-        if r in ['$',"!",']','>']:
-            i += 1
-            continue
-        if r == "^":
-            i += 2
-            continue
-        if r == "+" or r == "-":
-            indel_len = int(''.join(itertools.takewhile(str.isdigit, pileup[i+1:])))
-            i += 1 + len(str(indel_len)) + indel_len
-            continue
-        if r == ',' or r == '.':
-            r = ref
-        else:
-            r = r.upper()
-            if r not in ['A', 'C', 'G', 'T', '*', 'N']:
-                i += 1
-                continue
-        nts += r
-        i += 1
+    pileup = READ_START_END.sub('', pileup)
+    if '+' in pileup or '-' in pileup:
+        # the indel sequence length has to be read to know how many characters to skip
+        pieces = []
+        i = 0
+        for match in INDEL.finditer(pileup):
+            pieces.append(pileup[i:match.start()])
+            i = match.end() + int(match.group(1))
+        pieces.append(pileup[i:])
+        pileup = ''.join(pieces)
+    nts = pileup.upper().replace('.', ref).replace(',', ref).replace('<', '>')
     return(nts)
 
 
+def as_bytes_array(s):
+    """
+    View the characters of a string as an array of their byte values
+    """
+    if not isinstance(s, bytes): # Python 3 str
+        s = s.encode('latin-1')
+    return(np.frombuffer(s, dtype=np.uint8))
+
+
 def baseQ2int(baseQ_string, scaling_factor=33):
     ints = []
     for bq in baseQ_string:
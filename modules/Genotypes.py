@@ -21,6 +21,10 @@ import os
 from collections import defaultdict
 import numpy as np
 import random
+if __name__ == 'modules.Genotypes':
+    from . import metrics
+if __name__ == 'Genotypes':
+    import metrics
 
 
 def RAF2genotypeProb(RAF):
@@ -41,6 +45,11 @@ def downsample(baseqs):
 
 def compute_genotype_likelihood(ref_baseq, alt_baseq, normalize=True):
     '''Randomly downsample to 450x if needed and then get likelihood from base quals'''
+    if metrics.ENABLED:
+        metrics.count('genotypes.likelihoods')
+        metrics.count('genotypes.bases', len(ref_baseq) + len(alt_baseq))
+        if len(ref_baseq) > 450 or len(alt_baseq) > 450:
+            metrics.count('genotypes.downsampled')
     ref_baseq = downsample(ref_baseq)
     alt_baseq = downsample(alt_baseq)
     AA = 1
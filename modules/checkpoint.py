@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for checkpointing and resuming long concordance runs
+
+The concordance output file is the checkpoint; its rows are flushed to disk at a regular interval,
+and a resumed run reads the rows that are already there, skips those pairs and appends the rest.
+"""
+import os
+import csv
+import time
+
+def pair_key(
+    tumor_pileup, # str: path to the tumor pileup
+    normal_pileup, # str: path to the normal pileup
+    tumor_name, # str: tumor sample ID
+    normal_name # str: normal sample ID
+    ): # -> Tuple[str, str, str, str]
+    """
+    Key for a comparison that can be made from both a labeled pair and an output row
+    """
+    return((tumor_name, normal_name, os.path.basename(tumor_pileup), os.path.basename(normal_pileup)))
+
+def is_finished(
+    row # dict: a row of the output file
+    ): # -> bool
+    """
+    Check whether a row is the result of a finished comparison; rows with a status other than 'ok', from --task-timeout or --speculative, are not
+    """
+    return(row.get('status', 'ok') == 'ok')
+
+def read_finished_pairs(
+    output_file, # str: path to the output file of the previous run
+    fieldnames # List[str]: the columns that the output file should have
+    ): # -> Set[Tuple[str, str, str, str]]
+    """
+    Get the keys of the pairs that are already in an output file,
+    dropping a partly written last line left behind by an interrupted run and the rows of comparisons that did not finish;
+    returns None if there is no output to resume from
+    """
+    if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
+        return(None)
+
+    # cut off anything after the last complete line
+    with open(output_file, "rb+") as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size
+        while end > 0:
+            start = max(end - 65536, 0)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            f.truncate(end)
+    if end == 0:
+        return(None)
+
+    finished = set()
+    num_unfinished = 0
+    with open(output_file) as fin:
+        reader = csv.DictReader(fin, delimiter = '\t')
+        if reader.fieldnames != fieldnames:
+            raise Exception("Output file to resume has different columns than this run: " + output_file)
+        for row in reader:
+            if not is_finished(row):
+                num_unfinished += 1
+                continue
+            finished.add((row['tumor'], row['normal'], row['tumor_filename'], row['normal_filename']))
+
+    # drop the rows of the comparisons that timed out or failed, so that the rows of their retries replace them
+    if num_unfinished:
+        tmp_file = output_file + '.resume.tmp'
+        with open(output_file) as fin:
+            with open(tmp_file, 'w') as fout:
+                writer = csv.DictWriter(fout, delimiter = '\t', fieldnames = fieldnames, lineterminator = '\n')
+                writer.writeheader()
+                for row in csv.DictReader(fin, delimiter = '\t'):
+                    if is_finished(row):
+                        writer.writerow(row)
+        os.rename(tmp_file, output_file)
+    return(finished)
+
+class Checkpointer(object):
+    """
+    Flush an output file to disk whenever the checkpoint interval has passed
+    """
+    def __init__(self, fout, interval = 60):
+        self.fout = fout
+        self.interval = interval
+        self.last_sync = time.time()
+
+    def sync(self):
+        self.fout.flush()
+        try:
+            os.fsync(self.fout.fileno())
+        except (OSError, ValueError, AttributeError):
+            # stdout and pipes cannot be synced
+            pass
+        self.last_sync = time.time()
+
+    def update(self):
+        """
+        Call after writing a row
+        """
+        if time.time() - self.last_sync >= self.interval:
+            self.sync()
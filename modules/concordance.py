@@ -3,9 +3,65 @@ import sys
 import os
 import optparse
 import math
+import time
+import zlib
 from collections import defaultdict
 from ContaminationMarker import genotype_likelihoods_for_markers
+from pileup_io import is_stream, is_pickle, open_binary
+from genotype_likelihoods import GenotypeLikelihoods, as_genotype_likelihoods, get_panel
+import metrics
 import pickle
+import numpy as np
+
+def load_genotype_likelihoods(
+    pileup,
+    markers_data,
+    min_mapping_quality = 10,
+    min_base_quality = 20
+    ):
+    """
+    Load the genotype likelihoods for a sample
+
+    Parameters
+    ----------
+    pileup: str, dict or GenotypeLikelihoods
+        path to a GATK pileup file or a pre-saved genotypes likelihoods .pickle file; can also be "-" for stdin or a named pipe, in which case pickles are recognized from their contents.
+        If already loaded genotype likelihoods are passed, they are returned as a GenotypeLikelihoods
+    markers_data:
+        data load for markers set from a call to `ContaminationMarker.get_markers`
+    min_mapping_quality: int
+        the min mapping quality to use
+    min_base_quality: int
+        the minimum base quality to use
+
+    Returns
+    -------
+    GenotypeLikelihoods
+        the genotype likelihoods for each marker of markers_data, as aligned arrays; .pickle files can hold either those or
+        the dict returned by `ContaminationMarker.genotype_likelihoods_for_markers`
+    """
+    if isinstance(pileup, (dict, GenotypeLikelihoods)):
+        return(as_genotype_likelihoods(pileup, markers_data))
+
+    if pileup.endswith('.pickle'):
+        with metrics.timer('concordance.unpickle'):
+            with open(pileup,"rb") as fin:
+                return(as_genotype_likelihoods(pickle.load(fin), markers_data))
+
+    if is_stream(pileup):
+        # a stream can only be read once so we need to look at its contents to tell what it is
+        fin = open_binary(pileup)
+        try:
+            if is_pickle(fin.peek(1)[:1]):
+                with metrics.timer('concordance.unpickle'):
+                    return(as_genotype_likelihoods(pickle.load(fin), markers_data))
+            with metrics.timer('concordance.load_pileup'):
+                return(GenotypeLikelihoods.from_dict(genotype_likelihoods_for_markers(markers_data, fin, min_map_quality=min_mapping_quality, min_base_quality=min_base_quality), markers_data))
+        finally:
+            fin.close()
+
+    with metrics.timer('concordance.load_pileup'):
+        return(GenotypeLikelihoods.from_dict(genotype_likelihoods_for_markers(markers_data, pileup, min_map_quality=min_mapping_quality, min_base_quality=min_base_quality), markers_data))
 
 def concordance(
     tumor_pileup,
@@ -17,14 +73,14 @@ def concordance(
     min_base_quality = 20
     ):
     """
-    Calculate the concordance between a tumor and a normal sample. Both tumor and normal can be loaded from either a standard GATK pileup, or from a pre-saved genotypes likelihoods Python .pickle file.
+    Calculate the concordance between a tumor and a normal sample. Both tumor and normal can be loaded from either a standard GATK pileup, or from a pre-saved genotypes likelihoods Python .pickle file, or passed as already loaded genotype likelihoods (see `load_genotype_likelihoods`).
 
     Parameters
     ----------
     tumor_pileup: str
-        path to tumor pileup file to use for concordance. Can be a standard GATK .pileup file, or a pre-saved genotypes likelihoods .pickle file
+        path to tumor pileup file to use for concordance. Can be a standard GATK .pileup file (optionally gzip, bgzip or zstd compressed), or a pre-saved genotypes likelihoods .pickle file
     normal_pileup: str
-        path to normal pileup file to use for concordance. Can be a standard GATK .pileup file, or a pre-saved genotypes likelihoods .pickle file
+        path to normal pileup file to use for concordance. Can be a standard GATK .pileup file (optionally gzip, bgzip or zstd compressed), or a pre-saved genotypes likelihoods .pickle file
     markers_data:
         data load for markers set from a call to `ContaminationMarker.get_markers`
     min_mapping_quality: int
@@ -47,34 +103,68 @@ def concordance(
     Trying to calculate concordance between two samples with no shared markers can cause a divide by zero ZeroDivisionError error; this is currently handled in the `run.py` script.
     TODO: figure out a good way to handle the ZeroDivisionError errors
     """
-    if normal_pileup.endswith('.pickle'):
-        with open(normal_pileup,"rb") as fin:
-            Normal_genotype_likelihoods = pickle.load(fin)
-    else:
-        Normal_genotype_likelihoods = genotype_likelihoods_for_markers(markers_data, normal_pileup, min_map_quality=min_mapping_quality, min_base_quality=min_base_quality)
+    Normal_genotype_likelihoods = load_genotype_likelihoods(normal_pileup, markers_data, min_mapping_quality=min_mapping_quality, min_base_quality=min_base_quality)
+    Tumor_genotype_likelihoods = load_genotype_likelihoods(tumor_pileup, markers_data, min_mapping_quality=min_mapping_quality, min_base_quality=min_base_quality)
 
-    if tumor_pileup.endswith('.pickle'):
-        with open(tumor_pileup,"rb") as fin:
-            Tumor_genotype_likelihoods = pickle.load(fin)
-    else:
-        Tumor_genotype_likelihoods = genotype_likelihoods_for_markers(markers_data, tumor_pileup, min_map_quality=min_mapping_quality, min_base_quality=min_base_quality)
+    return(compare_genotype_likelihoods(
+        Tumor_genotype_likelihoods,
+        Normal_genotype_likelihoods,
+        markers_data,
+        normal_homozygous_markers_only = normal_homozygous_markers_only,
+        min_cov = min_cov
+        ))
 
-    concordant = 0
-    discordant = 0
-    for m in markers_data:
-        NL = Normal_genotype_likelihoods[m]
-        TL = Tumor_genotype_likelihoods[m]
-        if NL is None or TL is None:
-            continue
-        if NL['coverage'] < min_cov or TL['coverage'] < min_cov:
-            continue
-        if normal_homozygous_markers_only:
-            if NL['likelihoods'].index(max(NL['likelihoods'])) == 1:
+def compare_genotype_likelihoods(
+    Tumor_genotype_likelihoods,
+    Normal_genotype_likelihoods,
+    markers_data,
+    normal_homozygous_markers_only = False,
+    min_cov = 10
+    ):
+    """
+    Calculate the concordance between the already loaded genotype likelihoods of a tumor and a normal sample
+
+    Parameters
+    ----------
+    Tumor_genotype_likelihoods: GenotypeLikelihoods or dict
+        genotype likelihoods for the tumor, from `load_genotype_likelihoods`
+    Normal_genotype_likelihoods: GenotypeLikelihoods or dict
+        genotype likelihoods for the normal, from `load_genotype_likelihoods`
+    markers_data:
+        data load for markers set from a call to `ContaminationMarker.get_markers`; can be a subset of the markers of the likelihoods
+    normal_homozygous_markers_only: bool
+        use only homozygous markers in the Normal sample
+    min_cov: int
+        the minimum coverage value to use
+
+    Returns
+    -------
+    (float, int, int)
+        returns values for concordance, num_markers_used, num_total_markers based on the given pair; raises ZeroDivisionError if no markers could be used
+
+    Notes
+    -----
+    If both samples are GenotypeLikelihoods the markers are compared all at once on their arrays, otherwise one at a time with `marker_concordance`
+    """
+    start = time.time()
+    if isinstance(Tumor_genotype_likelihoods, GenotypeLikelihoods) and isinstance(Normal_genotype_likelihoods, GenotypeLikelihoods):
+        concordant, num_markers_used = Tumor_genotype_likelihoods.count_concordant(Normal_genotype_likelihoods, markers_data, normal_homozygous_markers_only = normal_homozygous_markers_only, min_cov = min_cov)
+        discordant = num_markers_used - concordant
+    else:
+        concordant = 0
+        discordant = 0
+        for m in markers_data:
+            is_concordant = marker_concordance(Tumor_genotype_likelihoods[m], Normal_genotype_likelihoods[m], normal_homozygous_markers_only = normal_homozygous_markers_only, min_cov = min_cov)
+            if is_concordant is None:
                 continue
-        if NL['likelihoods'].index(max(NL['likelihoods'])) == TL['likelihoods'].index(max(TL['likelihoods'])):
-            concordant += 1
-        else:
-            discordant += 1
+            if is_concordant:
+                concordant += 1
+            else:
+                discordant += 1
+    if metrics.ENABLED:
+        metrics.add_time('concordance.compare', time.time() - start)
+        metrics.count('concordance.pairs')
+        metrics.count('concordance.markers_compared', len(markers_data))
 
     # TODO: find a better way to handle this
     # if concordant+discordant == 0:
@@ -85,3 +175,253 @@ def concordance(
     num_markers_used = concordant + discordant
     num_total_markers = len(markers_data)
     return(concordance, num_markers_used, num_total_markers)
+
+def marker_concordance(
+    TL,
+    NL,
+    normal_homozygous_markers_only = False,
+    min_cov = 10
+    ):
+    """
+    Check whether the most likely genotypes of the tumor and the normal agree at a single marker
+
+    Parameters
+    ----------
+    TL: dict
+        the tumor genotype likelihoods for the marker, or None if the marker is not covered
+    NL: dict
+        the normal genotype likelihoods for the marker, or None if the marker is not covered
+
+    Returns
+    -------
+    bool
+        whether the genotypes agree; None if the marker cannot be used
+    """
+    if NL is None or TL is None:
+        return(None)
+    if NL['coverage'] < min_cov or TL['coverage'] < min_cov:
+        return(None)
+    if normal_homozygous_markers_only:
+        if NL['likelihoods'].index(max(NL['likelihoods'])) == 1:
+            return(None)
+    return(NL['likelihoods'].index(max(NL['likelihoods'])) == TL['likelihoods'].index(max(TL['likelihoods'])))
+
+# number of markers in the first block checked by the sequential test on arrays; each block after it is twice as large
+SEQUENTIAL_BLOCK_SIZE = 64
+
+# order of the markers for the sequential test, set in each pool process by `init_sequential_worker`
+_worker_marker_order = None
+
+def init_sequential_worker(
+    markers_data,
+    marker_order
+    ):
+    """
+    Pool initializer for the sequential test; keeps the marker order in the process so that it is sent once per process instead of with every pair,
+    and looks up its positions in the panel of the markers once. `sequential_compare_genotype_likelihoods` uses it when it is not given a marker order
+    """
+    global _worker_marker_order
+    _worker_marker_order = marker_order
+    get_panel(markers_data).positions(marker_order)
+
+def sequential_marker_order(
+    markers_data,
+    seed = 0
+    ):
+    """
+    Get a fixed pseudo-random order of the markers for the sequential test; the order only depends on the seed,
+    so it is the same on every run and Python version, and markers from each part of the genome are mixed together
+    """
+    return(sorted(markers_data, key = lambda m: zlib.crc32("{0}:{1}".format(seed, m).encode('ascii')) & 0xffffffff))
+
+def sequential_compare_genotype_likelihoods(
+    Tumor_genotype_likelihoods,
+    Normal_genotype_likelihoods,
+    markers_data,
+    normal_homozygous_markers_only = False,
+    min_cov = 10,
+    match_discordance = 0.1,
+    nonmatch_discordance = 0.5,
+    error_rate = 0.001,
+    marker_order = None
+    ):
+    """
+    Decide whether a tumor and a normal come from the same individual with a sequential probability ratio test,
+    stopping as soon as the markers seen so far are enough to decide at the given error rate
+
+    Parameters
+    ----------
+    Tumor_genotype_likelihoods: GenotypeLikelihoods or dict
+        genotype likelihoods for the tumor, from `load_genotype_likelihoods`
+    Normal_genotype_likelihoods: GenotypeLikelihoods or dict
+        genotype likelihoods for the normal, from `load_genotype_likelihoods`
+    markers_data:
+        data load for markers set from a call to `ContaminationMarker.get_markers`
+    normal_homozygous_markers_only: bool
+        use only homozygous markers in the Normal sample
+    min_cov: int
+        the minimum coverage value to use
+    match_discordance: float
+        the rate of discordant markers expected for samples from the same individual
+    nonmatch_discordance: float
+        the rate of discordant markers expected for samples from different individuals
+    error_rate: float
+        the probability of each kind of wrong decision
+    marker_order: list
+        the order to test the markers in, from `sequential_marker_order`; if not given, the order from `init_sequential_worker` in a pool process,
+        or else made with the default seed
+
+    Returns
+    -------
+    (float, int, int, int, str)
+        returns values for concordance, num_markers_used, num_total_markers, markers_consumed and decision.
+        The decision is "match", "nonmatch" or "undecided" if the markers ran out first. markers_consumed is the number of markers used by the test.
+        The concordance of a match is computed exactly over all the markers; for a non-match it is only over the markers consumed.
+        Raises ZeroDivisionError if no markers could be used
+
+    Notes
+    -----
+    If either sample is a GenotypeLikelihoods the markers are checked on the arrays in blocks, and the test stops at the first marker
+    where the cumulative log likelihood ratio crosses a bound, otherwise the markers are tested one at a time
+    """
+    if marker_order is None:
+        marker_order = _worker_marker_order
+    if marker_order is None:
+        marker_order = sequential_marker_order(markers_data)
+
+    # log likelihood ratio of non-match vs match added by each discordant and concordant marker
+    discordant_step = math.log(nonmatch_discordance / match_discordance)
+    concordant_step = math.log((1.0 - nonmatch_discordance) / (1.0 - match_discordance))
+    nonmatch_bound = math.log((1.0 - error_rate) / error_rate)
+    match_bound = math.log(error_rate / (1.0 - error_rate))
+
+    if isinstance(Tumor_genotype_likelihoods, GenotypeLikelihoods) or isinstance(Normal_genotype_likelihoods, GenotypeLikelihoods):
+        Tumor_genotype_likelihoods = as_genotype_likelihoods(Tumor_genotype_likelihoods, markers_data)
+        Normal_genotype_likelihoods = as_genotype_likelihoods(Normal_genotype_likelihoods, markers_data)
+        concordant, discordant, decision = _sequential_test_arrays(Tumor_genotype_likelihoods, Normal_genotype_likelihoods, marker_order,
+            normal_homozygous_markers_only, min_cov, concordant_step, discordant_step, nonmatch_bound, match_bound)
+    else:
+        concordant, discordant, decision = _sequential_test_markers(Tumor_genotype_likelihoods, Normal_genotype_likelihoods, marker_order,
+            normal_homozygous_markers_only, min_cov, concordant_step, discordant_step, nonmatch_bound, match_bound)
+
+    markers_consumed = concordant + discordant
+    if decision == "match":
+        concordance, num_markers_used, num_total_markers = compare_genotype_likelihoods(
+            Tumor_genotype_likelihoods,
+            Normal_genotype_likelihoods,
+            markers_data,
+            normal_homozygous_markers_only = normal_homozygous_markers_only,
+            min_cov = min_cov
+            )
+    else:
+        concordance = float(concordant)/float(concordant+discordant)
+        num_markers_used = markers_consumed
+        num_total_markers = len(markers_data)
+    return(concordance, num_markers_used, num_total_markers, markers_consumed, decision)
+
+def _sequential_test_arrays(
+    Tumor_genotype_likelihoods, # GenotypeLikelihoods: genotype likelihoods for the tumor
+    Normal_genotype_likelihoods, # GenotypeLikelihoods: genotype likelihoods for the normal
+    marker_order, # list: the order to test the markers in
+    normal_homozygous_markers_only, # bool
+    min_cov, # int
+    concordant_step, # float: log likelihood ratio added by a concordant marker
+    discordant_step, # float: log likelihood ratio added by a discordant marker
+    nonmatch_bound, # float
+    match_bound # float
+    ): # -> Tuple[int, int, str]
+    """
+    Run the sequential test on the arrays of the likelihoods, checking the markers in blocks that double in size
+    and stopping at the first marker where the cumulative log likelihood ratio crosses a bound; returns (concordant, discordant, decision)
+    """
+    concordant = 0
+    discordant = 0
+    llr = 0.0
+    start = 0
+    block_size = SEQUENTIAL_BLOCK_SIZE
+    while start < len(marker_order):
+        used, is_concordant = Tumor_genotype_likelihoods.marker_concordance(Normal_genotype_likelihoods, marker_order,
+            normal_homozygous_markers_only = normal_homozygous_markers_only, min_cov = min_cov, start = start, stop = start + block_size)
+        is_concordant = is_concordant[used]
+        # start the sum from the ratio so far so that it adds up in the same order as one marker at a time
+        block_llr = np.cumsum(np.concatenate(([llr], np.where(is_concordant, concordant_step, discordant_step))))[1:]
+        crossed = (block_llr >= nonmatch_bound) | (block_llr <= match_bound)
+        if crossed.any():
+            first = int(np.argmax(crossed))
+            num_concordant = int(np.count_nonzero(is_concordant[:first + 1]))
+            decision = "nonmatch" if block_llr[first] >= nonmatch_bound else "match"
+            return(concordant + num_concordant, discordant + first + 1 - num_concordant, decision)
+        num_concordant = int(np.count_nonzero(is_concordant))
+        concordant += num_concordant
+        discordant += len(is_concordant) - num_concordant
+        if len(block_llr):
+            llr = block_llr[-1]
+        start += block_size
+        block_size *= 2
+    return(concordant, discordant, "undecided")
+
+def _sequential_test_markers(
+    Tumor_genotype_likelihoods, # dict: genotype likelihoods for the tumor
+    Normal_genotype_likelihoods, # dict: genotype likelihoods for the normal
+    marker_order, # list: the order to test the markers in
+    normal_homozygous_markers_only, # bool
+    min_cov, # int
+    concordant_step, # float: log likelihood ratio added by a concordant marker
+    discordant_step, # float: log likelihood ratio added by a discordant marker
+    nonmatch_bound, # float
+    match_bound # float
+    ): # -> Tuple[int, int, str]
+    """
+    Run the sequential test one marker at a time on likelihoods in the dict form; returns (concordant, discordant, decision)
+    """
+    concordant = 0
+    discordant = 0
+    llr = 0.0
+    for m in marker_order:
+        is_concordant = marker_concordance(Tumor_genotype_likelihoods[m], Normal_genotype_likelihoods[m], normal_homozygous_markers_only = normal_homozygous_markers_only, min_cov = min_cov)
+        if is_concordant is None:
+            continue
+        if is_concordant:
+            concordant += 1
+            llr += concordant_step
+        else:
+            discordant += 1
+            llr += discordant_step
+        if llr >= nonmatch_bound:
+            return(concordant, discordant, "nonmatch")
+        if llr <= match_bound:
+            return(concordant, discordant, "match")
+    return(concordant, discordant, "undecided")
+
+def sequential_concordance(
+    tumor_pileup,
+    normal_pileup,
+    markers_data,
+    min_mapping_quality = 10,
+    normal_homozygous_markers_only = False,
+    min_cov = 10,
+    min_base_quality = 20,
+    **kwargs
+    ):
+    """
+    Load a tumor and a normal sample like `concordance` and compare them with `sequential_compare_genotype_likelihoods`,
+    which takes the rest of the keyword arguments.
+    The inputs are still loaded in full before the test starts, and comparing all the markers of loaded likelihoods costs about the same as the test,
+    so this is not faster than `concordance`; it gives a match decision at a known error rate, and the concordance of non-matches is only over the markers consumed
+
+    Returns
+    -------
+    (float, int, int, int, str)
+        returns values for concordance, num_markers_used, num_total_markers, markers_consumed and decision
+    """
+    Normal_genotype_likelihoods = load_genotype_likelihoods(normal_pileup, markers_data, min_mapping_quality=min_mapping_quality, min_base_quality=min_base_quality)
+    Tumor_genotype_likelihoods = load_genotype_likelihoods(tumor_pileup, markers_data, min_mapping_quality=min_mapping_quality, min_base_quality=min_base_quality)
+
+    return(sequential_compare_genotype_likelihoods(
+        Tumor_genotype_likelihoods,
+        Normal_genotype_likelihoods,
+        markers_data,
+        normal_homozygous_markers_only = normal_homozygous_markers_only,
+        min_cov = min_cov,
+        **kwargs
+        ))
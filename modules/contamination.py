@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for estimating the contamination of a tumor-normal pair, as done by scripts/estimate_tumor_normal_contamination.py
+
+The normal contamination is estimated from all the markers covered in the normal, and the tumor contamination from the markers
+where the normal is homozygous. Each level is the best point of a grid over the contamination fraction, refined with Brent's method.
+The table of conditional base likelihoods over the grid (`make_scores`) only depends on the grid, so a long-running process can make it once.
+ContaminationModel uses package relative imports, so this module needs to be imported as modules.contamination
+"""
+from collections import defaultdict
+import numpy as np
+from . import ContaminationModel
+from . import MathOperations
+from . import pileup_io
+from .ContaminationMarker import get_pileup_parser, detect_pileup_format, check_mapping_qualities
+from .Genotypes import compute_genotype_likelihood, RAF2genotypeProb
+
+HOMOZYGOUS_P_VALUE_THRESHOLD = 0.999
+
+def drange(start, stop, step):
+    r = start
+    while r < stop:
+        yield r
+        r += step
+
+def make_scores(
+    grid_precision = 0.01 # float: interval of the contamination grid
+    ): # -> dict
+    """
+    Make the conditional likelihoods of the bases for each point of the contamination grid
+    """
+    checkpoints = [ i for i in drange(0.0, 1.0, grid_precision) ]
+    checkpoints.append(0.5)
+    return(ContaminationModel.create_conditional_likelihood_of_base_dict(checkpoints))
+
+def marker_pileups(
+    pileup_file, # str: path to the pileup file
+    markers_data, # data load for markers set from a call to `ContaminationMarker.get_markers`
+    min_mapping_quality = 10 # int
+    ): # -> Generator[Tuple[ContaminationMarker, Pileup]]
+    """
+    Parse the lines of a pileup for the markers that have reads of the reference or alternate allele
+    """
+    fin = pileup_io.open_pileup(pileup_file)
+    parse_line = None
+    try:
+        for line in fin:
+            if line.startswith("[REDUCE RESULT]"):
+                continue
+            if parse_line is None:
+                pileup_format = detect_pileup_format(line)
+                check_mapping_qualities(line, pileup_format, min_mapping_quality, name = pileup_file)
+                parse_line = get_pileup_parser(pileup_format)
+            pileup = parse_line(line, min_map_quality = min_mapping_quality)
+            marker = markers_data.get(pileup.chrom + ":" + pileup.pos)
+            if marker is None:
+                continue
+            if pileup.Quals[marker.ref] == [] and pileup.Quals[marker.alt] == []:
+                continue
+            yield(marker, pileup)
+    finally:
+        fin.close()
+
+def pileup_base_qualities(
+    pileup_file, # str: path to the pileup file
+    markers_data, # data load for markers set from a call to `ContaminationMarker.get_markers`
+    min_mapping_quality = 10 # int
+    ): # -> Generator[Tuple[ContaminationMarker, List[int], List[int]]]
+    """
+    Get the base qualities of the reads with the reference and the alternate allele at each marker covered in a pileup
+    """
+    for marker, pileup in marker_pileups(pileup_file, markers_data, min_mapping_quality = min_mapping_quality):
+        yield((marker, pileup.Quals[marker.ref], pileup.Quals[marker.alt]))
+
+def histogram_base_qualities(
+    markers_data, # data load for markers set from a call to `ContaminationMarker.get_markers`
+    histograms, # dict: from `ContaminationMarker.quality_histograms_for_markers`
+    min_mapq_bin = 0 # int: index of the lowest mapping quality bin of the histograms to use
+    ): # -> Generator[Tuple[ContaminationMarker, List[int], List[int]]]
+    """
+    Get the base qualities of the reads with the reference and the alternate allele at each marker covered in the histograms of a pileup;
+    the same as `pileup_base_qualities` with the minimum mapping quality of the bin, but the qualities are in sorted order
+    """
+    for key, histogram in histograms.items():
+        marker = markers_data[key]
+        Quals = {marker.ref: [], marker.alt: []}
+        for (base, mapq_bin, baseQ) in sorted(histogram):
+            if base in Quals and mapq_bin >= min_mapq_bin:
+                Quals[base].extend([baseQ] * histogram[(base, mapq_bin, baseQ)])
+        if Quals[marker.ref] == [] and Quals[marker.alt] == []:
+            continue
+        yield((marker, Quals[marker.ref], Quals[marker.alt]))
+
+def log_genotype_priors(RAF):
+    p_AA, p_AB, p_BB = RAF2genotypeProb(RAF)
+    return(MathOperations.log10p(p_AA), MathOperations.log10p(p_AB), MathOperations.log10p(p_BB))
+
+def normal_marker_data(
+    marker, # ContaminationMarker
+    ref_basequals, # List[int]: base qualities of the reads with the reference allele
+    alt_basequals # List[int]: base qualities of the reads with the alternate allele
+    ): # -> Tuple[list, dict]
+    """
+    Get the contamination model data of a marker of the normal, and its homozygous genotype; None if it is not homozygous
+    """
+    AA_likelihood, AB_likelihood, BB_likelihood = compute_genotype_likelihood(ref_basequals, alt_basequals, normalize = True)
+    homozygous_genotype = None
+    if AA_likelihood >= HOMOZYGOUS_P_VALUE_THRESHOLD:
+        homozygous_genotype = {'genotype': marker.ref, 'AA_likelihood': AA_likelihood, 'AB_likelihood': AB_likelihood, 'BB_likelihood': BB_likelihood}
+    elif BB_likelihood >= HOMOZYGOUS_P_VALUE_THRESHOLD:
+        homozygous_genotype = {'genotype': marker.alt, 'AA_likelihood': AA_likelihood, 'AB_likelihood': AB_likelihood, 'BB_likelihood': BB_likelihood}
+    lPAA, lPAB, lPBB = log_genotype_priors(marker.RAF)
+    priors = [lPAA*2, lPAA+lPBB, lPAA+lPAB, lPAB*2, lPAB+lPAA, lPAB+lPBB, lPBB*2, lPBB+lPAA, lPBB+lPAB]
+    return([priors, ref_basequals, alt_basequals], homozygous_genotype)
+
+def tumor_marker_data(
+    marker, # ContaminationMarker
+    ref_basequals, # List[int]: base qualities of the reads with the reference allele
+    alt_basequals, # List[int]: base qualities of the reads with the alternate allele
+    normal_info # dict: the homozygous genotype of the normal at the marker, from `normal_marker_data`
+    ): # -> list
+    """
+    Get the contamination model data of a marker of the tumor where the normal is homozygous
+    """
+    nlPAA = MathOperations.log10p(normal_info['AA_likelihood'])
+    nlPAB = MathOperations.log10p(normal_info['AB_likelihood'])
+    nlPBB = MathOperations.log10p(normal_info['BB_likelihood'])
+    lPAA, lPAB, lPBB = log_genotype_priors(marker.RAF)
+    priors = [lPAA+nlPAA, lPBB+nlPAA, lPAB+nlPAA, lPAB+nlPAB, lPAA+nlPAB, lPBB+nlPAB, lPBB+nlPBB, lPAA+nlPBB, lPAB+nlPBB]
+    return([priors, ref_basequals, alt_basequals])
+
+def estimate_level(
+    Data, # List[list]: contamination model data of the markers
+    Scores, # dict: from `make_scores`
+    checkpoints, # List[float]: grid of contamination levels to search
+    grid_precision = 0.01 # float: interval of the grid
+    ): # -> float
+    """
+    Find the most likely contamination level on the grid, then refine it with Brent's method
+    """
+    D = ContaminationModel.calculate_contamination_likelihood(checkpoints, Data, Scores)
+    cont = checkpoints[np.argmax(D)]
+    x1 = max(cont - grid_precision, 0.0)
+    x2 = cont
+    x3 = min(cont + grid_precision, 1.0)
+    if x2 == 0.0:
+        x2 += grid_precision / 100
+    elif x2 == 1.0:
+        x2 -= grid_precision / 100
+    return(ContaminationModel.apply_brents_algorithm(Data, Scores, x1, x2, x3))
+
+def normal_data_for_markers(
+    base_qualities # Iterable[Tuple[ContaminationMarker, List[int], List[int]]]: from `pileup_base_qualities` or `histogram_base_qualities`
+    ): # -> Tuple[List[list], dict]
+    """
+    Get the contamination model data of the normal and its homozygous genotypes, keyed by chrom then pos
+    """
+    Data = []
+    normal_homozygous_genotype = defaultdict(dict)
+    for marker, ref_basequals, alt_basequals in base_qualities:
+        marker_data, homozygous_genotype = normal_marker_data(marker, ref_basequals, alt_basequals)
+        if homozygous_genotype is not None:
+            normal_homozygous_genotype[marker.chrom][marker.pos] = homozygous_genotype
+        Data.append(marker_data)
+    return(Data, normal_homozygous_genotype)
+
+def tumor_data_for_markers(
+    base_qualities, # Iterable[Tuple[ContaminationMarker, List[int], List[int]]]: from `pileup_base_qualities` or `histogram_base_qualities`
+    normal_homozygous_genotype # dict: from `normal_data_for_markers`
+    ): # -> List[list]
+    """
+    Get the contamination model data of the tumor at the markers where the normal is homozygous
+    """
+    Data = []
+    for marker, ref_basequals, alt_basequals in base_qualities:
+        normal_info = normal_homozygous_genotype.get(marker.chrom, {}).get(marker.pos)
+        if normal_info is None:
+            continue
+        Data.append(tumor_marker_data(marker, ref_basequals, alt_basequals, normal_info))
+    return(Data)
+
+def normal_contamination_data(normal_pileup, markers_data, min_mapping_quality = 10):
+    """
+    Get the contamination model data of a normal pileup and its homozygous genotypes, keyed by chrom then pos
+    """
+    return(normal_data_for_markers(pileup_base_qualities(normal_pileup, markers_data, min_mapping_quality = min_mapping_quality)))
+
+def tumor_contamination_data(tumor_pileup, markers_data, normal_homozygous_genotype, min_mapping_quality = 10):
+    """
+    Get the contamination model data of a tumor pileup at the markers where the normal is homozygous
+    """
+    return(tumor_data_for_markers(pileup_base_qualities(tumor_pileup, markers_data, min_mapping_quality = min_mapping_quality), normal_homozygous_genotype))
+
+def normal_checkpoints(grid_precision = 0.01):
+    # the contamination of the normal is searched up to 50%
+    checkpoints = [ i for i in drange(0.0, 0.5, grid_precision) ]
+    checkpoints.append(0.5)
+    return(checkpoints)
+
+def tumor_checkpoints(grid_precision = 0.01):
+    return([ i for i in drange(0.0, 1.0, grid_precision) ])
+
+def estimate_contamination(
+    tumor_pileup, # str: path to the tumor pileup
+    normal_pileup, # str: path to the normal pileup
+    markers_data, # data load for markers set from a call to `ContaminationMarker.get_markers`
+    min_mapping_quality = 10, # int
+    grid_precision = 0.01, # float: interval of the contamination grid
+    scores = None # dict: from `make_scores` with the same grid_precision; made here if not given
+    ): # -> Tuple[float, float]
+    """
+    Estimate the contamination of the normal and of the tumor, as fractions; returns (normal_contamination, tumor_contamination)
+    """
+    return(estimate_contamination_from_base_qualities(
+        pileup_base_qualities(tumor_pileup, markers_data, min_mapping_quality = min_mapping_quality),
+        pileup_base_qualities(normal_pileup, markers_data, min_mapping_quality = min_mapping_quality),
+        grid_precision = grid_precision,
+        scores = scores))
+
+def estimate_contamination_from_base_qualities(
+    tumor_base_qualities, # Iterable[Tuple[ContaminationMarker, List[int], List[int]]]: from `pileup_base_qualities` or `histogram_base_qualities`
+    normal_base_qualities, # Iterable[Tuple[ContaminationMarker, List[int], List[int]]]: the same for the normal
+    grid_precision = 0.01, # float: interval of the contamination grid
+    scores = None # dict: from `make_scores` with the same grid_precision; made here if not given
+    ): # -> Tuple[float, float]
+    """
+    Estimate the contamination of the normal and of the tumor from the base qualities of their markers; returns (normal_contamination, tumor_contamination)
+    """
+    if scores is None:
+        scores = make_scores(grid_precision)
+    normal_data, normal_homozygous_genotype = normal_data_for_markers(normal_base_qualities)
+    normal_level = estimate_level(normal_data, scores, normal_checkpoints(grid_precision), grid_precision)
+    tumor_data = tumor_data_for_markers(tumor_base_qualities, normal_homozygous_genotype)
+    tumor_level = estimate_level(tumor_data, scores, tumor_checkpoints(grid_precision), grid_precision)
+    return((normal_level, tumor_level))
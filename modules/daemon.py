@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for a long-running Conpair service that answers concordance and contamination requests over a local Unix socket
+
+The service keeps the marker panel, the contamination model tables and the genotype likelihoods of a set of reference samples
+loaded, so a request only pays for reading the new sample. Other inputs are loaded on demand into a cache of the most recently used
+samples, which is checked against the modification time of each file.
+
+The protocol is one JSON object per line in each direction; a connection can send several requests. Each request has a 'command':
+- status: the settings and the loaded samples
+- load: {'pileup': path, 'name': sample ID} keep a sample loaded as a reference; the name defaults to the ID from its manifest or its file name
+- unload: {'name': sample ID}
+- concordance: {'tumor': sample, 'normal': sample} where a sample is the name of a loaded sample or a path;
+  optional 'min_cov' and 'normal_homozygous_markers_only' override the defaults of the service
+- match: {'sample': sample, 'top': n} compare a sample against every loaded reference and get the best matches
+- contamination: {'tumor': path, 'normal': path}
+- shutdown
+Responses have 'ok': true and the results, or 'ok': false and an 'error'.
+ContaminationModel uses package relative imports, so this module needs to be imported as modules.daemon
+"""
+import os
+import sys
+import json
+import errno
+import socket
+import threading
+from collections import OrderedDict
+try:
+    import socketserver
+except ImportError: # Python 2
+    import SocketServer as socketserver
+from .concordance import load_genotype_likelihoods, compare_genotype_likelihoods
+from .loader import get_sample_name
+from . import contamination
+
+REQUIRED_ARGUMENTS = {
+    'load': ['pileup'],
+    'unload': ['name'],
+    'concordance': ['tumor', 'normal'],
+    'match': ['sample'],
+    'contamination': ['tumor', 'normal']
+}
+
+class ConcordanceService(object):
+    """
+    Answer the requests of the daemon from the loaded markers and samples
+    """
+    def __init__(self,
+        markers_data, # data load for markers set from a call to `ContaminationMarker.get_markers`
+        min_mapping_quality = 10,
+        min_base_quality = 20,
+        min_cov = 10,
+        normal_homozygous_markers_only = False,
+        cache_size = 100, # int: number of samples loaded on demand to keep
+        grid_precision = 0.01 # float: interval of the contamination grid
+        ):
+        self.markers_data = markers_data
+        self.min_mapping_quality = min_mapping_quality
+        self.min_base_quality = min_base_quality
+        self.min_cov = min_cov
+        self.normal_homozygous_markers_only = normal_homozygous_markers_only
+        self.cache_size = cache_size
+        self.grid_precision = grid_precision
+        self.scores = contamination.make_scores(grid_precision)
+        self.references = OrderedDict() # sample ID -> (path, likelihoods)
+        self.cache = OrderedDict() # path -> (modification time, likelihoods), least recently used first
+        self.lock = threading.Lock()
+        self.commands = {
+            'status': self.status,
+            'load': self.load,
+            'unload': self.unload,
+            'concordance': self.concordance,
+            'match': self.match,
+            'contamination': self.contamination
+        }
+
+    def _load_likelihoods(self, pileup):
+        return(load_genotype_likelihoods(pileup, self.markers_data, min_mapping_quality = self.min_mapping_quality, min_base_quality = self.min_base_quality))
+
+    def add_reference(self, pileup, name = None, likelihoods = None):
+        """
+        Keep the likelihoods of a sample loaded under its name
+        """
+        if name is None:
+            name = get_sample_name(pileup)
+        if likelihoods is None:
+            likelihoods = self._load_likelihoods(pileup)
+        with self.lock:
+            self.references[name] = (pileup, likelihoods)
+        return(name)
+
+    def likelihoods(self,
+        sample # str: name of a reference sample, or a path
+        ): # -> dict
+        """
+        Get the likelihoods of a reference sample, or of a file through the cache
+        """
+        with self.lock:
+            if sample in self.references:
+                return(self.references[sample][1])
+        if not os.path.exists(sample):
+            raise ValueError("Not a loaded sample or an existing file: {0}".format(sample))
+        mtime = os.path.getmtime(sample)
+        with self.lock:
+            cached = self.cache.pop(sample, None)
+            if cached is not None and cached[0] == mtime:
+                self.cache[sample] = cached
+                return(cached[1])
+        likelihoods = self._load_likelihoods(sample)
+        with self.lock:
+            self.cache[sample] = (mtime, likelihoods)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last = False)
+        return(likelihoods)
+
+    def _compare(self, tumor_likelihoods, normal_likelihoods, request):
+        try:
+            concordance_val, num_markers_used, num_total_markers = compare_genotype_likelihoods(
+                tumor_likelihoods,
+                normal_likelihoods,
+                self.markers_data,
+                normal_homozygous_markers_only = request.get('normal_homozygous_markers_only', self.normal_homozygous_markers_only),
+                min_cov = request.get('min_cov', self.min_cov))
+        except ZeroDivisionError:
+            # no shared markers that meet the coverage requirements
+            return({'concordance': None, 'num_markers_used': None, 'num_total_markers': None})
+        return({'concordance': concordance_val, 'num_markers_used': num_markers_used, 'num_total_markers': num_total_markers})
+
+    def status(self, request):
+        with self.lock:
+            references = [ {'name': name, 'pileup': pileup} for name, (pileup, likelihoods) in self.references.items() ]
+            num_cached = len(self.cache)
+        return({
+            'num_markers': len(self.markers_data),
+            'min_mapping_quality': self.min_mapping_quality,
+            'min_base_quality': self.min_base_quality,
+            'min_cov': self.min_cov,
+            'normal_homozygous_markers_only': self.normal_homozygous_markers_only,
+            'references': references,
+            'num_cached': num_cached
+        })
+
+    def load(self, request):
+        return({'name': self.add_reference(request['pileup'], name = request.get('name'))})
+
+    def unload(self, request):
+        with self.lock:
+            if self.references.pop(request['name'], None) is None:
+                raise ValueError("Not a loaded sample: {0}".format(request['name']))
+        return({'name': request['name']})
+
+    def concordance(self, request):
+        return(self._compare(self.likelihoods(request['tumor']), self.likelihoods(request['normal']), request))
+
+    def match(self, request):
+        """
+        Compare a sample as the tumor against every reference sample and get the best matches, best first
+        """
+        likelihoods = self.likelihoods(request['sample'])
+        with self.lock:
+            references = list(self.references.items())
+        matches = []
+        for name, (pileup, reference_likelihoods) in references:
+            result = self._compare(likelihoods, reference_likelihoods, request)
+            result['name'] = name
+            matches.append(result)
+        # pairs without any usable markers go last
+        matches.sort(key = lambda result: -1.0 if result['concordance'] is None else result['concordance'], reverse = True)
+        return({'matches': matches[0:request.get('top', 1)]})
+
+    def contamination(self, request):
+        normal_contamination, tumor_contamination = contamination.estimate_contamination(
+            request['tumor'],
+            request['normal'],
+            self.markers_data,
+            min_mapping_quality = self.min_mapping_quality,
+            grid_precision = self.grid_precision,
+            scores = self.scores)
+        return({'normal_contamination': normal_contamination, 'tumor_contamination': tumor_contamination})
+
+    def handle(self,
+        request # dict: a decoded request
+        ): # -> dict
+        """
+        Answer a request; errors are returned in the response instead of raised
+        """
+        try:
+            command = self.commands.get(request.get('command'))
+            if command is None:
+                raise ValueError("Unknown command: {0}".format(request.get('command')))
+            missing = [ name for name in REQUIRED_ARGUMENTS.get(request['command'], []) if name not in request ]
+            if missing:
+                raise ValueError("Missing argument: {0}".format(', '.join(missing)))
+            response = command(request)
+        except ValueError as e:
+            return({'ok': False, 'error': str(e)})
+        except Exception as e:
+            return({'ok': False, 'error': "{0}: {1}".format(type(e).__name__, e)})
+        response['ok'] = True
+        return(response)
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line.decode('utf-8'))
+                if not isinstance(request, dict):
+                    raise ValueError("requests need to be JSON objects")
+            except ValueError as e:
+                request = {}
+                response = {'ok': False, 'error': "Invalid request: {0}".format(e)}
+            else:
+                if request.get('command') == 'shutdown':
+                    response = {'ok': True}
+                else:
+                    response = self.server.service.handle(request)
+            self.wfile.write((json.dumps(response, sort_keys = True) + '\n').encode('utf-8'))
+            self.wfile.flush()
+            if request.get('command') == 'shutdown':
+                # shutdown waits for serve_forever to return, so it can not be called from the thread of a request
+                thread = threading.Thread(target = self.server.shutdown)
+                thread.daemon = True
+                thread.start()
+                return
+
+class ConcordanceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serve the requests of each connection in its own thread
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, service, socket_mode = 0o600):
+        remove_stale_socket(socket_path)
+        self.socket_path = socket_path
+        self.socket_mode = socket_mode # int: permissions of the socket file; only the owner can connect by default
+        socketserver.UnixStreamServer.__init__(self, socket_path, _RequestHandler)
+        self.service = service
+
+    def server_bind(self):
+        # make the socket without access for other users, so that there is no moment where they can connect, then give it its mode
+        umask = os.umask(0o177)
+        try:
+            socketserver.UnixStreamServer.server_bind(self)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, self.socket_mode)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+def remove_stale_socket(socket_path):
+    """
+    Remove the socket file left behind by a daemon that is no longer running; raise if a daemon is still listening on it
+    """
+    if not os.path.exists(socket_path):
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error as e:
+        if e.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+            raise
+        os.remove(socket_path)
+        return
+    finally:
+        sock.close()
+    raise Exception("A daemon is already listening on " + socket_path)
+
+def serve(
+    socket_path, # str: path of the Unix socket to listen on
+    service, # ConcordanceService
+    socket_mode = 0o600 # int: permissions of the socket file
+    ):
+    """
+    Answer requests until a shutdown request or an interrupt
+    """
+    server = ConcordanceServer(socket_path, service, socket_mode = socket_mode)
+    sys.stderr.write("Listening on {0}\n".format(socket_path))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for sending requests to a Conpair daemon (see `daemon`) over its Unix socket
+
+Only needs the standard library, so that clients start quickly without loading numpy or the marker panel.
+"""
+import json
+import socket
+
+def send_request(
+    socket_path, # str: path of the Unix socket of the daemon
+    request, # dict: request with a 'command' and its arguments
+    timeout = None # float: seconds to wait for the response
+    ): # -> dict
+    """
+    Send a request to the daemon and return its response
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        sock.close()
+    if not data:
+        raise Exception("The daemon closed the connection without a response: " + socket_path)
+    return(json.loads(data.decode('utf-8')))
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for running concordance on several nodes, with a coordinator that holds the queue of pairs
+and workers that connect to it over TCP, pull batches of pairs, compute them and send back the results
+
+Workers pull one batch at a time, so faster nodes take more of the work, and the batch of a worker
+that disconnects or dies is put back in the queue for another worker. A batch that fails or loses its worker
+too many times is given up on, so that one bad batch cannot take down every worker in turn,
+and the coordinator stops waiting if no worker has been connected for too long.
+Messages are pickled tuples sent with `multiprocessing.connection`, which authenticates both ends with a shared key:
+- coordinator to worker: ('config', dict) on connect, then ('batch', batch_id, pairs) or ('stop',)
+- worker to coordinator: ('ready',), ('results', batch_id, results) or ('failed', batch_id, error)
+"""
+import sys
+import time
+import threading
+from collections import deque
+from multiprocessing.connection import Listener, Client
+try:
+    import queue
+except ImportError: # Python 2
+    import Queue as queue
+
+def make_batches(
+    pairs, # Iterable[Tuple[str, str, str, str]]: labeled pairs from `loader.load_comparisons`
+    batch_size # int: number of pairs in each batch
+    ): # -> List[List[Tuple[str, str, str, str]]]
+    """
+    Split the pairs into batches
+    """
+    batches = []
+    batch = []
+    for pair in pairs:
+        batch.append(pair)
+        if len(batch) >= batch_size:
+            batches.append(batch)
+            batch = []
+    if batch:
+        batches.append(batch)
+    return(batches)
+
+class Coordinator(object):
+    """
+    Hand out batches of pairs to the workers that connect and collect their results
+    """
+    def __init__(self, pairs, config, address = ('localhost', 0), authkey = b'', batch_size = 100, max_attempts = 3, idle_timeout = None):
+        self.config = config # dict: settings and markers data sent to each worker
+        self.batches = make_batches(pairs, batch_size)
+        self.pending = deque(range(len(self.batches)))
+        self.done = set()
+        self.max_attempts = max_attempts # int: number of times a batch can fail or lose its worker before it is given up on
+        self.attempts = {} # batch_id -> number of failed tries
+        self.failed = [] # List[Tuple[int, str]]: (batch_id, last error) of the batches that were given up on
+        self.idle_timeout = idle_timeout # float: seconds to wait for results while no worker is connected
+        self.num_workers = 0 # number of connected workers
+        self.last_seen = time.time() # when the last worker left, or when the coordinator started
+        self.lock = threading.Lock()
+        self.results_queue = queue.Queue()
+        self.finished = threading.Event()
+        self.listener = Listener(address, authkey = authkey)
+        self.address = self.listener.address
+
+    def start(self):
+        """
+        Start accepting workers in the background
+        """
+        thread = threading.Thread(target = self._accept_workers)
+        thread.daemon = True
+        thread.start()
+
+    def _accept_workers(self):
+        while not self.finished.is_set():
+            try:
+                conn = self.listener.accept()
+            except Exception:
+                # the listener is closed once all the batches are done, and failed handshakes are skipped
+                continue
+            thread = threading.Thread(target = self._serve_worker, args = (conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _next_batch(self):
+        """
+        Get the next batch to hand out, waiting while other workers still have batches that might come back to the queue;
+        returns None once all the batches are done
+        """
+        while not self.finished.is_set():
+            with self.lock:
+                if self.pending:
+                    return(self.pending.popleft())
+            time.sleep(0.1)
+        return(None)
+
+    def _retry_batch(self, batch_id, error, lost_worker = False):
+        """
+        Put a batch that failed back in the queue, or give up on it once it has failed max_attempts times
+        """
+        with self.lock:
+            if batch_id in self.done:
+                return
+            self.attempts[batch_id] = self.attempts.get(batch_id, 0) + 1
+            if self.attempts[batch_id] >= self.max_attempts:
+                sys.stderr.write("Batch {0} failed {1} times; giving up on its {2} pairs: {3}\n".format(batch_id, self.attempts[batch_id], len(self.batches[batch_id]), error))
+                self.done.add(batch_id)
+                self.failed.append((batch_id, error))
+                self.results_queue.put([])
+            elif lost_worker:
+                sys.stderr.write("Lost a worker; putting batch {0} back in the queue\n".format(batch_id))
+                self.pending.appendleft(batch_id)
+            else:
+                # a failed batch goes to the back of the queue, so that the other batches are done first
+                sys.stderr.write("Batch {0} failed; putting it back in the queue: {1}\n".format(batch_id, error))
+                self.pending.append(batch_id)
+
+    def _serve_worker(self, conn):
+        batch_id = None
+        with self.lock:
+            self.num_workers += 1
+        try:
+            conn.send(('config', self.config))
+            while True:
+                message = conn.recv()
+                if message[0] == 'results':
+                    with self.lock:
+                        if message[1] not in self.done:
+                            self.done.add(message[1])
+                            self.results_queue.put(message[2])
+                elif message[0] == 'failed':
+                    self._retry_batch(message[1], message[2])
+                batch_id = None
+                batch_id = self._next_batch()
+                if batch_id is None:
+                    conn.send(('stop',))
+                    break
+                conn.send(('batch', batch_id, self.batches[batch_id]))
+        except (EOFError, IOError, OSError) as e:
+            # the worker is gone; put its batch back for another worker
+            if batch_id is not None:
+                self._retry_batch(batch_id, "lost the worker ({0})".format(type(e).__name__), lost_worker = True)
+        finally:
+            conn.close()
+            with self.lock:
+                self.num_workers -= 1
+                self.last_seen = time.time()
+
+    def _idle_seconds(self): # -> float
+        """
+        Get the number of seconds since the last worker left, or 0 while a worker is connected
+        """
+        with self.lock:
+            if self.num_workers > 0:
+                return(0.0)
+            return(time.time() - self.last_seen)
+
+    def results(self):
+        """
+        Yield the results of the pairs as their batches arrive, until all the batches are done; the pairs of the batches in `failed` have no results.
+        Raises an Exception if no worker has been connected for idle_timeout seconds while batches are left
+        """
+        try:
+            for i in range(len(self.batches)):
+                while True:
+                    try:
+                        batch_results = self.results_queue.get(timeout = 1.0)
+                        break
+                    except queue.Empty:
+                        if self.idle_timeout and self._idle_seconds() > self.idle_timeout:
+                            raise Exception("No worker has been connected for {0} seconds and {1} of {2} batches are not done".format(self.idle_timeout, len(self.batches) - len(self.done), len(self.batches)))
+                for result in batch_results:
+                    yield(result)
+        finally:
+            self.finished.set()
+            self.listener.close()
+
+def connect(
+    address, # Tuple[str, int]: host and port of the coordinator
+    authkey, # bytes: shared key
+    timeout = 60 # float: seconds to keep trying while the coordinator is not up yet
+    ):
+    """
+    Connect to a coordinator, retrying until it is up
+    """
+    start = time.time()
+    while True:
+        try:
+            return(Client(address, authkey = authkey))
+        except (IOError, OSError):
+            if time.time() - start > timeout:
+                raise
+            time.sleep(0.5)
+
+def run_worker(
+    address, # Tuple[str, int]: host and port of the coordinator
+    authkey, # bytes: shared key
+    execute, # function(pairs, config) -> List[Tuple]: computes the results of a batch of pairs
+    timeout = 60 # float: seconds to keep trying to connect
+    ): # -> int
+    """
+    Pull batches of pairs from a coordinator and send back their results until there are none left; returns the number of batches done
+    """
+    conn = connect(address, authkey, timeout = timeout)
+    num_batches = 0
+    try:
+        message = conn.recv()
+        config = message[1]
+        conn.send(('ready',))
+        while True:
+            message = conn.recv()
+            if message[0] == 'stop':
+                break
+            batch_id, pairs = message[1:3]
+            try:
+                results = list(execute(pairs, config))
+            except Exception as e:
+                # report the error and take the next batch, so that a bad batch does not take down the worker
+                sys.stderr.write("Batch {0} failed: {1}: {2}\n".format(batch_id, type(e).__name__, e))
+                conn.send(('failed', batch_id, "{0}: {1}".format(type(e).__name__, e)))
+                continue
+            conn.send(('results', batch_id, results))
+            num_batches += 1
+    except EOFError:
+        # the coordinator finished and closed the connection
+        pass
+    finally:
+        conn.close()
+    return(num_batches)
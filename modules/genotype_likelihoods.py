@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for keeping the genotype likelihoods of a sample as aligned arrays in the order of the marker panel
+
+`ContaminationMarker.genotype_likelihoods_for_markers` gives a dict of marker -> None or {'likelihoods': [AA, AB, BB], 'coverage': n},
+which is a few small Python objects per marker. A GenotypeLikelihoods holds the same values as
+- likelihoods: float64 (markers x 3)
+- coverage: int32
+- present: bool, whether the marker has any reads of the reference or alternate allele
+- calls: int8, the index of the most likely genotype, or -1 where the marker is not present
+so that the concordance of a pair is a few vectorized operations on the calls and coverage instead of a Python loop over the markers.
+The marker keys are kept once per panel and shared by all the samples loaded against it in a process.
+A GenotypeLikelihoods can still be read like the dict, one marker at a time.
+"""
+import zlib
+import numpy as np
+
+# (number of markers, checksum of the marker keys) -> MarkerPanel
+_PANELS = {}
+# number of sets of markers whose positions are kept by each panel
+MAX_SUBSETS = 4
+
+class MarkerPanel(object):
+    """
+    The marker keys of a panel in order, with their positions and the positions of the subsets of markers compared against it
+    """
+    def __init__(self, keys):
+        self.keys = tuple(keys) # Tuple[str]: "chrom:pos" of each marker
+        self._index = None
+        self._subsets = [] # (markers_data, positions) of the last few sets of markers compared, such as the markers and their sequential test order, to look them up once
+
+    @property
+    def index(self): # -> Dict[str, int]
+        if self._index is None:
+            self._index = dict( (key, i) for i, key in enumerate(self.keys) )
+        return(self._index)
+
+    def positions(self,
+        markers_data # the markers to compare; the whole panel or a subset of it
+        ): # -> numpy.ndarray
+        """
+        Get the positions of the markers in the panel, or None if they are the whole panel in order;
+        raises KeyError for markers that are not in the panel
+        """
+        for i, (subset, positions) in enumerate(self._subsets):
+            if subset is markers_data:
+                # keep the sets that are used again and again, such as the order of the sequential test, ahead of the ones used once
+                if i > 0:
+                    self._subsets = [self._subsets[i]] + self._subsets[:i] + self._subsets[i + 1:]
+                return(positions)
+        keys = tuple(markers_data)
+        if keys == self.keys:
+            positions = None
+        else:
+            index = self.index
+            positions = np.array([ index[key] for key in keys ], dtype = np.intp)
+        self._subsets = [(markers_data, positions)] + self._subsets[:MAX_SUBSETS - 1]
+        return(positions)
+
+def get_panel(
+    markers # Iterable[str]: marker keys in order, such as the data from `ContaminationMarker.get_markers`
+    ): # -> MarkerPanel
+    """
+    Get the shared MarkerPanel for a set of marker keys, making it the first time
+    """
+    keys = tuple(markers)
+    checksum = (len(keys), zlib.crc32('\n'.join(keys).encode('utf-8')) & 0xffffffff)
+    panel = _PANELS.get(checksum)
+    if panel is None or panel.keys != keys:
+        panel = MarkerPanel(keys)
+        _PANELS[checksum] = panel
+    return(panel)
+
+class GenotypeLikelihoods(object):
+    """
+    Genotype likelihoods, coverage and most likely genotypes of a sample at every marker of a panel
+    """
+    def __init__(self, panel, likelihoods, coverage, present):
+        self.panel = panel # MarkerPanel
+        self.likelihoods = likelihoods # numpy.ndarray: float64 (markers x 3)
+        self.coverage = coverage # numpy.ndarray: int32
+        self.present = present # numpy.ndarray: bool
+        # ties go to the first genotype, as with list.index(max(...))
+        self.calls = np.where(present, np.argmax(likelihoods, axis = 1), -1).astype(np.int8)
+
+    @classmethod
+    def from_dict(cls,
+        M, # dict: marker -> None or {'likelihoods': [AA, AB, BB], 'coverage': n}, from `ContaminationMarker.genotype_likelihoods_for_markers`
+        markers_data # data load for markers set from a call to `ContaminationMarker.get_markers`; markers of M that are not in it are left out
+        ): # -> GenotypeLikelihoods
+        panel = get_panel(markers_data)
+        likelihoods = []
+        coverage = []
+        present = []
+        for key in panel.keys:
+            value = M.get(key)
+            if value is None:
+                likelihoods.append((0.0, 0.0, 0.0))
+                coverage.append(0)
+                present.append(False)
+            else:
+                likelihoods.append(value['likelihoods'])
+                coverage.append(value['coverage'])
+                present.append(True)
+        return(cls(panel,
+            np.array(likelihoods, dtype = np.float64).reshape((len(panel.keys), 3)),
+            np.array(coverage, dtype = np.int32),
+            np.array(present, dtype = bool)))
+
+    def to_dict(self): # -> dict
+        """
+        Get the likelihoods in the dict form of `ContaminationMarker.genotype_likelihoods_for_markers`
+        """
+        return(dict( (key, self[key]) for key in self.panel.keys ))
+
+    @property
+    def nbytes(self): # -> int
+        return(int(self.likelihoods.nbytes + self.coverage.nbytes + self.present.nbytes + self.calls.nbytes))
+
+    def __len__(self):
+        return(len(self.panel.keys))
+
+    def __iter__(self):
+        return(iter(self.panel.keys))
+
+    def keys(self):
+        return(list(self.panel.keys))
+
+    def __contains__(self, key):
+        return(key in self.panel.index)
+
+    def __getitem__(self, key): # -> dict
+        i = self.panel.index[key]
+        if not self.present[i]:
+            return(None)
+        return({'likelihoods': self.likelihoods[i].tolist(), 'coverage': int(self.coverage[i])})
+
+    def get(self, key, default = None):
+        if key not in self:
+            return(default)
+        return(self[key])
+
+    def items(self):
+        return([ (key, self[key]) for key in self.panel.keys ])
+
+    def __eq__(self, other):
+        if isinstance(other, GenotypeLikelihoods):
+            return(self.panel.keys == other.panel.keys
+                and np.array_equal(self.present, other.present)
+                and np.array_equal(self.coverage[self.present], other.coverage[other.present])
+                and np.array_equal(self.likelihoods[self.present], other.likelihoods[other.present]))
+        if isinstance(other, dict):
+            return(self.to_dict() == other)
+        return(NotImplemented)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return(equal)
+        return(not equal)
+
+    __hash__ = None
+
+    def __getstate__(self):
+        # the panel is looked up again on loading so that it is shared with the other samples of the process
+        return({'keys': self.panel.keys, 'likelihoods': self.likelihoods, 'coverage': self.coverage, 'present': self.present, 'calls': self.calls})
+
+    def __setstate__(self, state):
+        self.panel = get_panel(state['keys'])
+        self.likelihoods = state['likelihoods']
+        self.coverage = state['coverage']
+        self.present = state['present']
+        self.calls = state['calls']
+
+    def _select(self, markers_data, start = 0, stop = None):
+        positions = self.panel.positions(markers_data)
+        if positions is None:
+            return(self.calls[start:stop], self.coverage[start:stop])
+        positions = positions[start:stop]
+        return(self.calls[positions], self.coverage[positions])
+
+    def marker_concordance(self,
+        normal, # GenotypeLikelihoods: the likelihoods of the normal, with self as the tumor
+        markers_data, # the markers to compare, in the order to compare them; the whole panel or a subset of it
+        normal_homozygous_markers_only = False, # bool
+        min_cov = 10, # int
+        start = 0, # int: index in markers_data of the first marker to check
+        stop = None # int: index in markers_data to stop before; the end if None
+        ): # -> Tuple[numpy.ndarray, numpy.ndarray]
+        """
+        Check the markers with the same rules as `concordance.marker_concordance`, all at once;
+        returns (used, concordant) bool arrays in the order of markers_data[start:stop]
+        """
+        tumor_calls, tumor_coverage = self._select(markers_data, start, stop)
+        normal_calls, normal_coverage = normal._select(markers_data, start, stop)
+        # markers that are not present have calls of -1 and a coverage of 0
+        used = (tumor_calls >= 0) & (normal_calls >= 0) & (tumor_coverage >= min_cov) & (normal_coverage >= min_cov)
+        if normal_homozygous_markers_only:
+            used &= normal_calls != 1
+        return(used, tumor_calls == normal_calls)
+
+    def count_concordant(self,
+        normal, # GenotypeLikelihoods: the likelihoods of the normal, with self as the tumor
+        markers_data, # the markers to compare; the whole panel or a subset of it
+        normal_homozygous_markers_only = False, # bool
+        min_cov = 10 # int
+        ): # -> Tuple[int, int]
+        """
+        Count the markers where the most likely genotypes of the tumor and the normal agree, with the same rules as `concordance.marker_concordance`;
+        returns (num_concordant, num_markers_used)
+        """
+        used, concordant = self.marker_concordance(normal, markers_data, normal_homozygous_markers_only = normal_homozygous_markers_only, min_cov = min_cov)
+        num_markers_used = int(np.count_nonzero(used))
+        num_concordant = int(np.count_nonzero(used & concordant))
+        return(num_concordant, num_markers_used)
+
+def as_genotype_likelihoods(
+    likelihoods, # GenotypeLikelihoods, or a dict from `ContaminationMarker.genotype_likelihoods_for_markers`
+    markers_data # data load for markers set from a call to `ContaminationMarker.get_markers`
+    ): # -> GenotypeLikelihoods
+    if isinstance(likelihoods, GenotypeLikelihoods):
+        return(likelihoods)
+    return(GenotypeLikelihoods.from_dict(likelihoods, markers_data))
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for comparing every sample of a single list against every other one and grouping the samples into individuals
+
+Only the upper triangle of the sample x sample matrix is computed. The samples are split into blocks,
+and each task loads the genotype likelihoods of two blocks once and compares all of their pairs,
+so each pileup is read once per block pair instead of once per comparison.
+Samples are then grouped into individuals with union-find over the pairs whose concordance passes a threshold.
+"""
+import csv
+from multiprocessing import Pool
+from concordance import load_genotype_likelihoods, compare_genotype_likelihoods
+
+def make_blocks(
+    num_samples, # int: number of samples
+    block_size # int: number of samples in each block
+    ): # -> List[Tuple[int, int]]
+    """
+    Split the sample indexes into (start, end) blocks
+    """
+    return([ (start, min(start + block_size, num_samples)) for start in range(0, num_samples, block_size) ])
+
+def default_block_size(
+    num_samples, # int: number of samples
+    num_threads # int: number of processes
+    ): # -> int
+    """
+    Use the largest blocks that still give at least two block pair tasks for each process
+    """
+    num_blocks = 1
+    while num_blocks * (num_blocks + 1) // 2 < 2 * num_threads and num_blocks < num_samples:
+        num_blocks += 1
+    return(max((num_samples + num_blocks - 1) // num_blocks, 1))
+
+# markers and comparison settings set in each pool process by _init_worker, so that they are sent once per process instead of once per task
+_worker_markers = None
+_worker_settings = None
+
+def _init_worker(markers_data, settings):
+    global _worker_markers
+    global _worker_settings
+    _worker_markers = markers_data
+    _worker_settings = settings
+
+def _compare_block_pair(args):
+    """
+    Worker for run_parallel_identity; compares all the upper triangle pairs between two blocks of samples
+    """
+    block1, samples1, block2, samples2 = args
+    markers_data = _worker_markers
+    min_mapping_quality, normal_homozygous_markers_only, min_cov, min_base_quality = _worker_settings
+    likelihoods = {}
+    for block, samples in [(block1, samples1), (block2, samples2)]:
+        for i, sample in zip(range(*block), samples):
+            if i not in likelihoods:
+                likelihoods[i] = load_genotype_likelihoods(sample, markers_data, min_mapping_quality = min_mapping_quality, min_base_quality = min_base_quality)
+
+    results = []
+    for i in range(*block1):
+        for j in range(max(block2[0], i + 1), block2[1]):
+            try:
+                concordance_val, num_markers_used, num_total_markers = compare_genotype_likelihoods(
+                    likelihoods[i],
+                    likelihoods[j],
+                    markers_data,
+                    normal_homozygous_markers_only = normal_homozygous_markers_only,
+                    min_cov = min_cov)
+            except ZeroDivisionError:
+                concordance_val = None
+                num_markers_used = None
+                num_total_markers = None
+            results.append((i, j, concordance_val, num_markers_used, num_total_markers))
+    return(results)
+
+def run_parallel_identity(
+    samples, # List[str]: sample pileups, or already loaded genotype likelihoods
+    markers_data, # data load for markers set from a call to `ContaminationMarker.get_markers`
+    num_threads, # int
+    min_mapping_quality,
+    normal_homozygous_markers_only,
+    min_cov,
+    min_base_quality,
+    block_size = None # int: number of samples in each block; picked from the number of samples and threads if not given
+    ): # -> Generator[Tuple[int, int, float, int, int]]
+    """
+    Compare every sample against every later sample in the list in parallel blocks and yield
+    (index1, index2, concordance, num_markers_used, num_total_markers) for each pair;
+    each task is sent only the samples of its two blocks
+    """
+    if block_size is None:
+        block_size = default_block_size(len(samples), num_threads)
+    blocks = make_blocks(len(samples), block_size)
+
+    settings = (min_mapping_quality, normal_homozygous_markers_only, min_cov, min_base_quality)
+    pool = Pool(int(num_threads), initializer = _init_worker, initargs = (markers_data, settings))
+    results = []
+    for b1, block1 in enumerate(blocks):
+        for block2 in blocks[b1:]:
+            results.append(pool.apply_async(_compare_block_pair, args = ((block1, samples[block1[0]:block1[1]], block2, samples[block2[0]:block2[1]]),)))
+    pool.close()
+    for result in results:
+        for pair_result in result.get():
+            yield(pair_result)
+    pool.join()
+
+class UnionFind(object):
+    """
+    Disjoint sets of the integers 0 to n - 1
+    """
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.rank = [0] * n
+
+    def find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # path compression
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return(root)
+
+    def union(self, i, j):
+        root_i = self.find(i)
+        root_j = self.find(j)
+        if root_i == root_j:
+            return
+        if self.rank[root_i] < self.rank[root_j]:
+            root_i, root_j = root_j, root_i
+        self.parent[root_j] = root_i
+        if self.rank[root_i] == self.rank[root_j]:
+            self.rank[root_i] += 1
+
+def group_samples(
+    num_samples, # int
+    pair_results, # Iterable[Tuple[int, int, float, int, int]]: results from run_parallel_identity
+    threshold = 0.8 # float: min concordance for two samples to be from the same individual
+    ): # -> List[int]
+    """
+    Group the samples into individuals; returns the group number of each sample, numbered in order of first appearance.
+    The pairs are folded into the groups as they are read, so pair_results can be a generator that is never held in memory
+    """
+    groups = UnionFind(num_samples)
+    for i, j, concordance_val, num_markers_used, num_total_markers in pair_results:
+        if concordance_val is not None and concordance_val >= threshold:
+            groups.union(i, j)
+    group_numbers = {}
+    sample_groups = []
+    for i in range(num_samples):
+        root = groups.find(i)
+        if root not in group_numbers:
+            group_numbers[root] = len(group_numbers) + 1
+        sample_groups.append(group_numbers[root])
+    return(sample_groups)
+
+def load_individuals(
+    individuals_file # str: tab separated file with a sample ID and an individual ID on each line
+    ): # -> Dict[str, str]
+    """
+    Load the expected individual for each sample ID
+    """
+    individuals = {}
+    with open(individuals_file) as fin:
+        for row in csv.reader(fin, delimiter = '\t'):
+            if len(row) < 2 or row[0].startswith('#'):
+                continue
+            individuals[row[0]] = row[1]
+    return(individuals)
+
+def find_unexpected_groupings(
+    sample_names, # List[str]
+    sample_groups, # List[int]: from group_samples
+    individuals = None # Dict[str, str]: expected individual of each sample ID; samples that are not in it are their own individual
+    ): # -> List[str]
+    """
+    Check the groups against the expected individuals; returns a description of the problem for each sample, or an empty string.
+    A group that mixes several individuals can be a sample swap or mislabel; an individual split over several groups can be a swap or a failed sample
+    """
+    if individuals is None:
+        individuals = {}
+    expected = [ individuals.get(name, name) for name in sample_names ]
+    individuals_of_group = {}
+    groups_of_individual = {}
+    for individual, group in zip(expected, sample_groups):
+        individuals_of_group.setdefault(group, set()).add(individual)
+        groups_of_individual.setdefault(individual, set()).add(group)
+
+    problems = []
+    for individual, group in zip(expected, sample_groups):
+        problem = []
+        if len(individuals_of_group[group]) > 1:
+            problem.append("group has individuals " + ','.join(sorted(individuals_of_group[group])))
+        if len(groups_of_individual[individual]) > 1:
+            problem.append("individual is in groups " + ','.join([ str(g) for g in sorted(groups_of_individual[individual]) ]))
+        problems.append('; '.join(problem))
+    return(problems)
@@ -23,7 +23,7 @@ def load_comparisons(
     num_normals = 'all', # str: string representing int of number of files to load if we only want a subset of the input list for testing
     use_manifests = False, # bool: for each file loaded, if an adjacent .json file exists, load it and look for an 'id' field with an alternative sample ID to use
     manifest_dir = None # str: alternative location to look for manifest files
-    ): # -> Tuple[ List[str, str, str, str], int, int ]
+    ): # -> Tuple[ LabeledPairs, int, int ]
     """
     Load the samples from file and make the comparisons of tumors vs normals
     """
@@ -33,9 +33,9 @@ def load_comparisons(
 
     # evaluate if paths / glob patterns passed
     if tumor:
-        tumor_pileups = glob.glob(tumor)
+        tumor_pileups = glob_or_stdin(tumor)
     if normal:
-        normal_pileups = glob.glob(normal)
+        normal_pileups = glob_or_stdin(normal)
 
     # try to load from files if nothing has been loaded yet
     if tumor_pileups is None and tumors_list:
@@ -61,18 +61,106 @@ def load_comparisons(
     num_tumors_loaded = len(tumor_pileups)
     num_normals_loaded = len(normal_pileups)
 
-    # get all combinations of both lists of pileups
-    pairs = list(itertools.product(tumor_pileups, normal_pileups))
+    # resolve the sample ID of each file only once, even if it is in both lists
+    sample_names = {}
+    for pileup in itertools.chain(tumor_pileups, normal_pileups):
+        if pileup not in sample_names:
+            sample_names[pileup] = get_sample_name(pileup, use_manifests = use_manifests, manifest_dir = manifest_dir)
 
-    # add sample ID labels to each pair
-    labeled_pairs = []
-    for pair in pairs:
-        tumor_pileup, normal_pileup = pair
-        tumor_name = get_sample_name(tumor_pileup, use_manifests = use_manifests, manifest_dir = manifest_dir)
-        normal_name = get_sample_name(normal_pileup, use_manifests = use_manifests, manifest_dir = manifest_dir)
-        labeled_pairs.append((tumor_pileup, normal_pileup, tumor_name, normal_name))
+    # add sample ID labels to all combinations of both lists of pileups
+    labeled_pairs = LabeledPairs(
+        [ (pileup, sample_names[pileup]) for pileup in tumor_pileups ],
+        [ (pileup, sample_names[pileup]) for pileup in normal_pileups ]
+        )
     return(labeled_pairs, num_tumors_loaded, num_normals_loaded)
 
+class LabeledPairs(object):
+    """
+    All the combinations of each tumor vs each normal, made lazily so that only the lists of tumors and normals are kept in memory;
+    iterating yields (tumor_pileup, normal_pileup, tumor_name, normal_name), and can be done more than once
+    """
+    def __init__(self, tumors, normals):
+        self.tumors = tumors # List[Tuple[str, str]]: (pileup, sample name) of each tumor
+        self.normals = normals # List[Tuple[str, str]]: (pileup, sample name) of each normal
+
+    def __iter__(self):
+        for tumor_pileup, tumor_name in self.tumors:
+            for normal_pileup, normal_name in self.normals:
+                yield((tumor_pileup, normal_pileup, tumor_name, normal_name))
+
+    def __len__(self):
+        return(len(self.tumors) * len(self.normals))
+
+class FilteredPairs(object):
+    """
+    The pairs of a LabeledPairs, or of another FilteredPairs, that pass a filter, made lazily in the same way;
+    the length is counted with one pass over the pairs the first time it is needed
+    """
+    def __init__(self, pairs, keep):
+        self.pairs = pairs # LabeledPairs or FilteredPairs
+        self.keep = keep # Callable[[Tuple[str, str, str, str]], bool]
+        self._length = None
+
+    def __iter__(self):
+        for pair in self.pairs:
+            if self.keep(pair):
+                yield(pair)
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(1 for pair in self)
+        return(self._length)
+
+def pair_inputs(
+    pairs # Iterable[Tuple[str, str, str, str]]: labeled pairs
+    ): # -> Generator[str]
+    """
+    Yield the input of each tumor and normal of the pairs, possibly more than once;
+    for a LabeledPairs they come from its lists of tumors and normals instead of from each of the pairs
+    """
+    if isinstance(pairs, LabeledPairs):
+        for pileup, name in itertools.chain(pairs.tumors, pairs.normals):
+            yield(pileup)
+        return
+    for pair in pairs:
+        yield(pair[0])
+        yield(pair[1])
+
+def load_samples(
+    samples = None, # str: glob pattern or path to sample file(s)
+    samples_list = None, # str: text file with file paths, one per line
+    num_samples = 'all', # str: string representing int of number of files to load if we only want a subset of the input list for testing
+    use_manifests = False, # bool: for each file loaded, if an adjacent .json file exists, load it and look for an 'id' field with an alternative sample ID to use
+    manifest_dir = None # str: alternative location to look for manifest files
+    ): # -> List[Tuple[str, str]]
+    """
+    Load a single list of samples, for comparing every sample against every other one;
+    returns (filepath, sample name) for each sample
+    """
+    pileups = None
+    if samples:
+        pileups = glob_or_stdin(samples)
+    if pileups is None and samples_list:
+        with open(samples_list) as fin:
+            pileups = [ line.strip() for line in fin if line.strip() != '' ]
+    if pileups is None:
+        raise Exception("No sample files loaded. Please run again with a positional arg for 'samples', or with an arg for '--samples-list'.")
+
+    if num_samples != 'all':
+        pileups = pileups[0:int(num_samples)]
+
+    return([ (pileup, get_sample_name(pileup, use_manifests = use_manifests, manifest_dir = manifest_dir)) for pileup in pileups ])
+
+def glob_or_stdin(
+    pattern # str: glob pattern or path to file(s), or "-" for stdin
+    ): # -> List[str]
+    """
+    Get the files matching a glob pattern; "-" is kept as is since it means the input will be read from stdin
+    """
+    if pattern == '-':
+        return(['-'])
+    return(glob.glob(pattern))
+
 def get_sample_name(
     filepath, # str: filepath to the input file to evaluate
     use_manifests = True, # bool: for each file loaded, if an adjacent .json file exists, load it and look for an 'id' field with an alternative sample ID to use
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for keeping the concordance of a tumor x normal run as dense matrices and saving them in a binary file
+
+Each tumor is a row and each normal a column, in the order the pairs were loaded. The file is a compressed NumPy .npz archive with the arrays
+- concordance: float64, NaN where there is no value
+- num_markers_used, num_total_markers: int32, -1 where there is no value
+- computed: bool, whether the pair was compared; pairs with no shared markers are computed but have no values
+- tumors, normals: the sample IDs of the rows and columns
+- tumor_filepaths, normal_filepaths: the input paths of the rows and columns
+so that `numpy.load` gives the whole run without parsing any text, and the full TSV output can still be written back out of it.
+"""
+import numpy as np
+
+MATRIX_ARRAYS = ['concordance', 'num_markers_used', 'num_total_markers', 'computed', 'tumors', 'normals', 'tumor_filepaths', 'normal_filepaths']
+
+def _strings(values):
+    # sample IDs and paths saved by Python 2 are loaded as bytes by Python 3
+    return([ value.decode('utf-8') if isinstance(value, bytes) and not isinstance(value, str) else value for value in values ])
+
+class ConcordanceMatrix(object):
+    """
+    Dense tumor x normal matrices of the concordance values, filled in as the results arrive
+    """
+    def __init__(self, tumors, normals):
+        self.tumors = list(tumors) # List[Tuple[str, str]]: (pileup, sample ID) of each row
+        self.normals = list(normals) # List[Tuple[str, str]]: (pileup, sample ID) of each column
+        self.tumor_index = dict( (tumor, i) for i, tumor in enumerate(self.tumors) )
+        self.normal_index = dict( (normal, j) for j, normal in enumerate(self.normals) )
+        shape = (len(self.tumors), len(self.normals))
+        self.concordance = np.full(shape, np.nan, dtype = np.float64)
+        self.num_markers_used = np.full(shape, -1, dtype = np.int32)
+        self.num_total_markers = np.full(shape, -1, dtype = np.int32)
+        self.computed = np.zeros(shape, dtype = bool)
+
+    @classmethod
+    def from_pairs(cls,
+        pairs # Iterable[Tuple[str, str, str, str]]: labeled pairs from `loader.load_comparisons`
+        ): # -> ConcordanceMatrix
+        """
+        Make an empty matrix with a row for each tumor and a column for each normal of the pairs
+        """
+        tumors = []
+        normals = []
+        seen_tumors = set()
+        seen_normals = set()
+        for tumor_pileup, normal_pileup, tumor_name, normal_name in pairs:
+            if (tumor_pileup, tumor_name) not in seen_tumors:
+                seen_tumors.add((tumor_pileup, tumor_name))
+                tumors.append((tumor_pileup, tumor_name))
+            if (normal_pileup, normal_name) not in seen_normals:
+                seen_normals.add((normal_pileup, normal_name))
+                normals.append((normal_pileup, normal_name))
+        return(cls(tumors, normals))
+
+    def add(self, tumor_pileup, normal_pileup, tumor_name, normal_name, concordance_val, num_markers_used, num_total_markers):
+        """
+        Set the values of a pair; values of None are left empty
+        """
+        i = self.tumor_index[(tumor_pileup, tumor_name)]
+        j = self.normal_index[(normal_pileup, normal_name)]
+        self.computed[i, j] = True
+        if concordance_val is not None:
+            self.concordance[i, j] = concordance_val
+            self.num_markers_used[i, j] = num_markers_used
+            self.num_total_markers[i, j] = num_total_markers
+
+    def save(self,
+        output_file # str: path of the .npz file; the name is used as is
+        ):
+        with open(output_file, "wb") as fout:
+            np.savez_compressed(fout,
+                concordance = self.concordance,
+                num_markers_used = self.num_markers_used,
+                num_total_markers = self.num_total_markers,
+                computed = self.computed,
+                tumors = np.array([ name for pileup, name in self.tumors ]),
+                normals = np.array([ name for pileup, name in self.normals ]),
+                tumor_filepaths = np.array([ pileup for pileup, name in self.tumors ]),
+                normal_filepaths = np.array([ pileup for pileup, name in self.normals ]))
+
+    @classmethod
+    def load(cls,
+        input_file # str: path of a .npz file written by `save`
+        ): # -> ConcordanceMatrix
+        data = np.load(input_file)
+        missing = [ name for name in MATRIX_ARRAYS if name not in data.files ]
+        if missing:
+            raise Exception("Not a concordance matrix file, missing {0}: {1}".format(', '.join(missing), input_file))
+        matrix = cls(
+            zip(_strings(data['tumor_filepaths'].tolist()), _strings(data['tumors'].tolist())),
+            zip(_strings(data['normal_filepaths'].tolist()), _strings(data['normals'].tolist())))
+        matrix.concordance = data['concordance']
+        matrix.num_markers_used = data['num_markers_used']
+        matrix.num_total_markers = data['num_total_markers']
+        matrix.computed = data['computed']
+        data.close()
+        return(matrix)
+
+    def results(self): # -> Generator[Tuple[str, str, str, str, float, int, int]]
+        """
+        Yield (tumor_pileup, normal_pileup, tumor_name, normal_name, concordance, num_markers_used, num_total_markers) for each computed pair, by row;
+        pairs without values have None for them
+        """
+        for i, j in zip(*np.nonzero(self.computed)):
+            tumor_pileup, tumor_name = self.tumors[i]
+            normal_pileup, normal_name = self.normals[j]
+            if np.isnan(self.concordance[i, j]):
+                yield((tumor_pileup, normal_pileup, tumor_name, normal_name, None, None, None))
+            else:
+                yield((tumor_pileup, normal_pileup, tumor_name, normal_name, float(self.concordance[i, j]), int(self.num_markers_used[i, j]), int(self.num_total_markers[i, j])))
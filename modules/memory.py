@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for measuring peak memory use and fitting a run into a memory budget
+
+Peak RSS comes from getrusage; for the worker processes it is the largest peak of the finished child processes,
+so it is read after the pool has been joined. The total is estimated as the peak of the main process plus the
+worker peak for each worker, since the workers run side by side.
+The budget is split between the workers and the sample likelihood sets they hold, using rough per-marker sizes
+of loaded genotype likelihoods, to pick the number of workers and how many likelihood sets each one keeps loaded at once.
+"""
+import re
+import sys
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+# approximate size in memory of the genotype likelihoods of one marker of one sample, and of one marker of the panel
+LIKELIHOODS_BYTES_PER_MARKER = 40
+MARKER_BYTES = 500
+# approximate size of one marker of a pileup while it is being parsed, before it is packed into a GenotypeLikelihoods
+PARSE_BYTES_PER_MARKER = 1000
+# approximate memory of a worker process before it loads any data; Python with numpy and scipy imported
+WORKER_OVERHEAD_BYTES = 40e6
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+def parse_size(
+    value # str: a number of bytes with an optional K, M, G or T suffix, such as '16G' or '512M'
+    ): # -> int
+    """
+    Convert a memory size to bytes
+    """
+    match = re.match(r'^\s*([0-9.]+)\s*([KMGT]?)B?\s*$', str(value).upper())
+    if match is None:
+        raise ValueError("Could not parse memory size: {0}; use a number of bytes with an optional K, M, G or T suffix".format(value))
+    return(int(float(match.group(1)) * SIZE_UNITS[match.group(2)]))
+
+def format_size(num_bytes):
+    """
+    Format a number of bytes for messages, such as '1.5G'
+    """
+    for unit in ['T', 'G', 'M', 'K']:
+        if num_bytes >= SIZE_UNITS[unit]:
+            return('{0:.1f}{1}'.format(float(num_bytes) / SIZE_UNITS[unit], unit))
+    return('{0}'.format(int(num_bytes)))
+
+def _maxrss_bytes(who):
+    if resource is None:
+        return(None)
+    maxrss = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform != 'darwin':
+        maxrss *= 1024
+    return(maxrss)
+
+def peak_rss(): # -> int
+    """
+    Get the peak resident memory of this process in bytes, or None where it cannot be measured
+    """
+    if resource is None:
+        return(None)
+    return(_maxrss_bytes(resource.RUSAGE_SELF))
+
+def peak_worker_rss(): # -> int
+    """
+    Get the largest peak resident memory of the finished child processes of this process in bytes, or None where it cannot be measured
+    """
+    if resource is None:
+        return(None)
+    return(_maxrss_bytes(resource.RUSAGE_CHILDREN))
+
+def peak_total_rss(
+    num_workers # int: number of worker processes that ran at the same time
+    ): # -> int
+    """
+    Estimate the peak memory of the whole run from the main and worker peaks
+    """
+    main_rss = peak_rss()
+    if main_rss is None:
+        return(None)
+    return(main_rss + int(num_workers) * (peak_worker_rss() or 0))
+
+def likelihoods_bytes(
+    num_markers # int: number of markers in the panel
+    ): # -> int
+    """
+    Estimate the memory of the loaded genotype likelihoods of one sample
+    """
+    return(int(num_markers * LIKELIHOODS_BYTES_PER_MARKER))
+
+def worker_bytes(
+    num_markers, # int: number of markers in the panel
+    num_sets # int: number of sample likelihood sets the worker holds at once
+    ): # -> int
+    """
+    Estimate the memory of a worker process; its own copy of the markers, the pileup it is parsing, and the likelihood sets it holds
+    """
+    return(int(WORKER_OVERHEAD_BYTES + num_markers * (MARKER_BYTES + PARSE_BYTES_PER_MARKER) + num_sets * likelihoods_bytes(num_markers)))
+
+def available_bytes(
+    memory_budget, # int: bytes available to the whole run
+    reserved = 0 # int: bytes already set aside, such as for the workers
+    ): # -> int
+    """
+    Get the part of the budget not used so far by this process or set aside
+    """
+    return(memory_budget - (peak_rss() or 0) - reserved)
+
+def plan_workers(
+    memory_budget, # int: bytes available to the whole run
+    num_threads, # int: number of workers requested
+    num_markers, # int: number of markers in the panel
+    sets_per_worker # int: number of sample likelihood sets each worker holds at once
+    ): # -> int
+    """
+    Get the number of workers, up to num_threads, that fit in the budget; at least one
+    """
+    per_worker = worker_bytes(num_markers, sets_per_worker)
+    num_workers = min(int(num_threads), int(available_bytes(memory_budget) // per_worker))
+    if num_workers < 1:
+        sys.stderr.write("WARNING: a memory budget of {0} is too small for even one worker holding {1} likelihood sets ({2}); using one worker\n".format(
+            format_size(memory_budget), sets_per_worker, format_size(per_worker)))
+        return(1)
+    if num_workers < num_threads:
+        sys.stderr.write("Using {0} of the {1} threads to fit the memory budget of {2}\n".format(num_workers, num_threads, format_size(memory_budget)))
+    return(num_workers)
+
+def plan_resident_sets(
+    num_bytes, # int: bytes available for the likelihood sets
+    num_markers, # int: number of markers in the panel
+    minimum = 1 # int: smallest number of sets that can still be worked with
+    ): # -> int
+    """
+    Get the number of sample likelihood sets that fit in num_bytes
+    """
+    return(max(int(num_bytes // likelihoods_bytes(num_markers)), minimum))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for lightweight timers and counters on the hot paths, aggregated across the worker processes
+
+Metrics are off by default, and the instrumented code only checks `ENABLED` before taking any timings,
+so that runs without metrics pay next to nothing. Each process keeps its own totals; pool tasks are run through
+`run_task`, which sends the totals of the task back to the main process along with its result to be merged there.
+Timers are named '<module>.<stage>' and also count how many times they were recorded.
+"""
+import os
+import time
+import json
+import cProfile
+from collections import defaultdict
+
+ENABLED = False
+timers = defaultdict(float) # name -> seconds
+timer_counts = defaultdict(int) # name -> number of times recorded
+counters = defaultdict(int) # name -> count
+
+# profiler of this process, kept across the tasks it runs
+_profiler = None
+
+def enable(enabled = True):
+    global ENABLED
+    ENABLED = enabled
+
+def reset():
+    timers.clear()
+    timer_counts.clear()
+    counters.clear()
+
+def add_time(name, seconds):
+    timers[name] += seconds
+    timer_counts[name] += 1
+
+def count(name, value = 1):
+    counters[name] += value
+
+class timer(object):
+    """
+    Context manager that adds the time spent in its block to a timer, when metrics are enabled
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if ENABLED:
+            add_time(self.name, time.time() - self.start)
+
+def snapshot(): # -> dict
+    """
+    Get a copy of the totals of this process
+    """
+    return({'timers': dict(timers), 'timer_counts': dict(timer_counts), 'counters': dict(counters)})
+
+def merge(other):
+    """
+    Add the totals from another process to the totals of this process
+    """
+    for name, seconds in other['timers'].items():
+        timers[name] += seconds
+    for name, value in other['timer_counts'].items():
+        timer_counts[name] += value
+    for name, value in other['counters'].items():
+        counters[name] += value
+
+def run_task(
+    func, # function to run; needs to be a top-level function so it can be pickled
+    args, # tuple
+    kwds, # dict
+    profile_dir = None # str: directory to dump the cProfile stats of the worker process to
+    ): # -> Tuple[object, dict]
+    """
+    Run a task in a pool worker with metrics enabled and return (result, snapshot of the metrics of the task);
+    the metrics of tasks that raise an exception are lost.
+    With profile_dir, the task is also profiled and the stats of all the tasks of this process so far are written to worker.<pid>.prof
+    """
+    global _profiler
+    enable()
+    reset()
+    if profile_dir is not None:
+        if _profiler is None:
+            _profiler = cProfile.Profile()
+        _profiler.enable()
+    start = time.time()
+    try:
+        value = func(*args, **kwds)
+    finally:
+        if profile_dir is not None:
+            _profiler.disable()
+            _profiler.dump_stats(os.path.join(profile_dir, 'worker.{0}.prof'.format(os.getpid())))
+    add_time('worker.task', time.time() - start)
+    return((value, snapshot()))
+
+def write_metrics(
+    fout, # file handle to write the JSON lines to
+    run_info # dict: details of the run written on the first line
+    ):
+    """
+    Write the metrics as JSON lines; a line for the run, then a line for each timer and each counter, sorted by name
+    """
+    fout.write(json.dumps(dict(run_info, type = 'run'), sort_keys = True) + '\n')
+    for name in sorted(timers):
+        fout.write(json.dumps({'type': 'timer', 'name': name, 'seconds': timers[name], 'count': timer_counts[name]}, sort_keys = True) + '\n')
+    for name in sorted(counters):
+        fout.write(json.dumps({'type': 'counter', 'name': name, 'value': counters[name]}, sort_keys = True) + '\n')
+
+class Stopwatch(object):
+    """
+    Time the consecutive stages of a run; each lap adds the time since the previous lap to a timer, when metrics are enabled
+    """
+    def __init__(self):
+        self.last = time.time()
+
+    def lap(self, name):
+        now = time.time()
+        if ENABLED:
+            add_time(name, now - self.last)
+        self.last = now
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for checking a tumor-normal pair for both concordance and contamination from a single parse of each pileup
+
+Each pileup is parsed once into per-marker histograms of (mapping quality bin, base quality) for each base, as for `sweep`.
+The genotype likelihoods for the concordance and the base qualities for the contamination model are both made from the histograms,
+with their own minimum mapping quality, instead of reading and parsing each pileup once for each.
+ContaminationModel uses package relative imports, so this module needs to be imported as modules.pair
+"""
+from collections import OrderedDict
+from .ContaminationMarker import quality_histograms_for_markers, genotype_likelihoods_from_histograms
+from .concordance import compare_genotype_likelihoods
+from .genotype_likelihoods import GenotypeLikelihoods
+from . import contamination
+from . import metrics
+
+PAIR_FIELDS = ['concordance', 'num_markers_used', 'num_total_markers', 'normal_contamination', 'tumor_contamination']
+
+def marker_statistics(
+    pileup, # str: path to the pileup file
+    markers_data, # data load for markers set from a call to `ContaminationMarker.get_markers`
+    mapq_bins # List[int]: the min mapping quality values that will be used
+    ): # -> dict
+    """
+    Parse a pileup once into the per-marker histograms that both the concordance and the contamination are made from
+    """
+    if pileup.endswith('.pickle'):
+        raise Exception("Pair checks need pileup inputs; the likelihoods saved in .pickle files do not have the base qualities for the contamination: " + pileup)
+    with metrics.timer('pair.histograms'):
+        return(quality_histograms_for_markers(markers_data, pileup, mapq_bins = mapq_bins))
+
+def check_pair_statistics(
+    tumor_histograms, # dict: from `marker_statistics` for the tumor
+    normal_histograms, # dict: from `marker_statistics` for the normal
+    markers_data, # data load for markers set from a call to `ContaminationMarker.get_markers`
+    min_mapping_quality = 10, # int: for the concordance
+    min_base_quality = 20, # int: for the concordance
+    min_cov = 10, # int
+    normal_homozygous_markers_only = False, # bool
+    contamination_min_mapping_quality = None, # int: for the contamination; the same as min_mapping_quality if None
+    grid_precision = 0.01, # float: interval of the contamination grid
+    scores = None # dict: from `contamination.make_scores` with the same grid_precision; made here if not given
+    ): # -> OrderedDict
+    """
+    Get the concordance and the contamination of a pair from the histograms of its pileups;
+    the histograms need to have bins for both min mapping quality values
+    """
+    if contamination_min_mapping_quality is None:
+        contamination_min_mapping_quality = min_mapping_quality
+    mapq_bins = sorted(set([0, min_mapping_quality, contamination_min_mapping_quality]))
+    record = OrderedDict()
+
+    with metrics.timer('pair.genotype_likelihoods'):
+        likelihoods = [ GenotypeLikelihoods.from_dict(genotype_likelihoods_from_histograms(
+            markers_data,
+            histograms,
+            mapq_bins = mapq_bins,
+            min_map_quality = min_mapping_quality,
+            min_base_quality = min_base_quality), markers_data) for histograms in [tumor_histograms, normal_histograms] ]
+    with metrics.timer('pair.concordance'):
+        try:
+            record['concordance'], record['num_markers_used'], record['num_total_markers'] = compare_genotype_likelihoods(
+                likelihoods[0],
+                likelihoods[1],
+                markers_data,
+                normal_homozygous_markers_only = normal_homozygous_markers_only,
+                min_cov = min_cov)
+        except ZeroDivisionError:
+            # no shared markers that meet the coverage requirements
+            record['concordance'], record['num_markers_used'], record['num_total_markers'] = None, None, None
+
+    min_mapq_bin = mapq_bins.index(contamination_min_mapping_quality)
+    with metrics.timer('pair.contamination'):
+        record['normal_contamination'], record['tumor_contamination'] = contamination.estimate_contamination_from_base_qualities(
+            contamination.histogram_base_qualities(markers_data, tumor_histograms, min_mapq_bin = min_mapq_bin),
+            contamination.histogram_base_qualities(markers_data, normal_histograms, min_mapq_bin = min_mapq_bin),
+            grid_precision = grid_precision,
+            scores = scores)
+    return(record)
+
+def check_pair(
+    tumor_pileup, # str: path to the tumor pileup
+    normal_pileup, # str: path to the normal pileup
+    markers_data, # data load for markers set from a call to `ContaminationMarker.get_markers`
+    min_mapping_quality = 10, # int: for the concordance
+    min_base_quality = 20, # int: for the concordance
+    min_cov = 10, # int
+    normal_homozygous_markers_only = False, # bool
+    contamination_min_mapping_quality = None, # int: for the contamination; the same as min_mapping_quality if None
+    grid_precision = 0.01, # float: interval of the contamination grid
+    scores = None # dict: from `contamination.make_scores` with the same grid_precision; made here if not given
+    ): # -> OrderedDict
+    """
+    Get the concordance, the normal contamination and the tumor contamination of a pair, parsing each pileup once;
+    returns a record with the PAIR_FIELDS; the concordance values are None if the pair has no markers to compare
+    """
+    if contamination_min_mapping_quality is None:
+        contamination_min_mapping_quality = min_mapping_quality
+    mapq_bins = [min_mapping_quality, contamination_min_mapping_quality]
+    return(check_pair_statistics(
+        marker_statistics(tumor_pileup, markers_data, mapq_bins),
+        marker_statistics(normal_pileup, markers_data, mapq_bins),
+        markers_data,
+        min_mapping_quality = min_mapping_quality,
+        min_base_quality = min_base_quality,
+        min_cov = min_cov,
+        normal_homozygous_markers_only = normal_homozygous_markers_only,
+        contamination_min_mapping_quality = contamination_min_mapping_quality,
+        grid_precision = grid_precision,
+        scores = scores))
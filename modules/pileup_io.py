@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for opening pileup files for reading
+This should support reading from
+- plain text pileups
+- gzip compressed pileups
+- bgzip compressed pileups
+- zstd compressed pileups
+- stdin ("-") and named pipes (FIFOs), which can only be read once from start to end
+
+The compression is detected from the magic bytes at the start of the file instead of the file extension.
+Compressed files are streamed through an external decompressor (bgzip, pigz, zstd) when one is available
+so that decompression runs in its own process (and threads, where the format allows) alongside parsing;
+otherwise they are decompressed in-process. Compressed streams are always decompressed in-process.
+"""
+import io
+import os
+import sys
+import zlib
+import signal
+import subprocess
+try:
+    from shutil import which
+except ImportError: # Python 2
+    from distutils.spawn import find_executable as which
+
+# read in large blocks; network filesystems perform poorly with many small reads
+BUFFER_SIZE = 4 * 1024 * 1024
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# first byte of a pickled dict; protocol 2+ starts with the PROTO opcode, protocol 0 with MARK, protocol 1 with EMPTY_DICT
+PICKLE_MAGIC = [b'\x80', b'(', b'}']
+
+# default number of threads to give to external decompressors
+DECOMPRESSION_THREADS = 4
+
+
+def detect_compression(header):
+    """
+    Get the compression type from the first bytes of a file; returns one of 'gzip', 'bgzip', 'zstd' or None for uncompressed
+
+    bgzip files are gzip files whose members carry a 'BC' extra subfield, https://samtools.github.io/hts-specs/SAMv1.pdf
+    """
+    if header.startswith(ZSTD_MAGIC):
+        return('zstd')
+    if header.startswith(GZIP_MAGIC):
+        # FLG.FEXTRA is set and the first extra subfield ID is 'BC'
+        if len(header) >= 14 and ord(header[3:4]) & 4 and header[12:14] == b'BC':
+            return('bgzip')
+        return('gzip')
+    return(None)
+
+
+def is_pickle(header):
+    """
+    Check if the first bytes of a file look like a Python pickle instead of a pileup
+    """
+    return(header[0:1] in PICKLE_MAGIC)
+
+
+def is_stream(filepath):
+    """
+    Check if the path is stdin ("-") or something that is not a regular file, such as a named pipe;
+    these can only be read once and cannot be seeked or memory-mapped
+    """
+    if filepath == '-':
+        return(True)
+    return(os.path.exists(filepath) and not os.path.isfile(filepath))
+
+
+def open_binary(filepath):
+    """
+    Open a path, or stdin for "-", as a buffered binary file object that supports peek
+    """
+    if filepath == '-':
+        return(io.open(sys.stdin.fileno(), 'rb', buffering = BUFFER_SIZE, closefd = False))
+    return(io.open(filepath, 'rb', buffering = BUFFER_SIZE))
+
+
+def get_compression(filepath):
+    """
+    Get the compression type of a file on disk
+    """
+    with io.open(filepath, 'rb') as fin:
+        return(detect_compression(fin.read(16)))
+
+
+def decompression_command(compression, filepath, num_threads = DECOMPRESSION_THREADS):
+    """
+    Get the command line for the external program to use to decompress the file, or None if no program is available
+    """
+    num_threads = str(max(int(num_threads), 1))
+    if compression == 'bgzip' and which('bgzip'):
+        # bgzip can decompress independent BGZF blocks on multiple threads
+        return(['bgzip', '--decompress', '--stdout', '--threads', num_threads, filepath])
+    if compression in ['gzip', 'bgzip'] and which('pigz'):
+        return(['pigz', '--decompress', '--stdout', '--processes', num_threads, filepath])
+    if compression == 'zstd' and which('zstd'):
+        return(['zstd', '--decompress', '--stdout', '--quiet', '-T' + num_threads, filepath])
+    return(None)
+
+
+class GzipStreamReader(io.RawIOBase):
+    """
+    Streaming gzip decompression of a binary file object
+    Handles files made of many concatenated gzip members, such as bgzip files, and does not need the file object to be seekable
+    """
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.pending = b''
+        self.offset = 0 # position of the next byte to return in pending
+        self.finished = False
+
+    def readable(self):
+        return(True)
+
+    def readinto(self, b):
+        while self.offset >= len(self.pending) and not self.finished:
+            chunk = self.fileobj.read(BUFFER_SIZE)
+            if not chunk:
+                self.pending = self.decompressor.flush()
+                self.offset = 0
+                self.finished = True
+                break
+            data = self.decompressor.decompress(chunk)
+            # any unused data is the start of the next gzip member
+            while self.decompressor.unused_data:
+                unused_data = self.decompressor.unused_data
+                self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                data += self.decompressor.decompress(unused_data)
+            self.pending = data
+            self.offset = 0
+        # keep an offset into the decompressed block instead of copying the rest of it on every read
+        n = min(len(b), len(self.pending) - self.offset)
+        b[:n] = memoryview(self.pending)[self.offset:self.offset + n]
+        self.offset += n
+        return(n)
+
+    def close(self):
+        self.fileobj.close()
+        super(GzipStreamReader, self).close()
+
+
+def _restore_sigpipe():
+    """
+    Let the child be stopped by SIGPIPE when the stream is closed early, instead of exiting with a write error;
+    Python 2 ignores SIGPIPE and its children inherit that, Python 3 already restores it
+    """
+    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+
+if sys.version_info[0] >= 3 or not hasattr(signal, 'SIGPIPE'):
+    _restore_sigpipe = None
+
+
+class ProcessReader(object):
+    """
+    Iterate over the lines of the stdout of an external decompression program
+    """
+    def __init__(self, command):
+        self.command = command
+        self.proc = subprocess.Popen(command, stdout = subprocess.PIPE, bufsize = BUFFER_SIZE, preexec_fn = _restore_sigpipe)
+        self.stream = text_stream(self.proc.stdout)
+
+    def __iter__(self):
+        return(iter(self.stream))
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.stream.close()
+        returncode = self.proc.wait()
+        # negative return codes mean the program was stopped by a signal, e.g. SIGPIPE if we closed the stream early
+        if returncode > 0:
+            raise IOError("Decompression failed with exit code {0}: {1}".format(returncode, ' '.join(self.command)))
+
+
+def text_stream(stream):
+    """
+    Wrap a binary stream so that iterating over it yields native str lines
+    """
+    if sys.version_info[0] >= 3:
+        return(io.TextIOWrapper(stream, encoding = 'latin-1'))
+    # on Python 2 the binary lines are already str
+    return(stream)
+
+
+def decompressed_stream(raw, compression):
+    """
+    Wrap a binary file object with in-process decompression
+    """
+    if compression in ['gzip', 'bgzip']:
+        return(io.BufferedReader(GzipStreamReader(raw), buffer_size = BUFFER_SIZE))
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise IOError("Reading zstd compressed pileups requires either the 'zstd' program or the 'zstandard' Python package")
+        return(io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, read_size = BUFFER_SIZE), buffer_size = BUFFER_SIZE))
+    return(raw)
+
+
+def open_pileup(filepath, num_threads = DECOMPRESSION_THREADS):
+    """
+    Open a pileup file for reading lines, decompressing it on the fly if needed
+
+    Parameters
+    ----------
+    filepath: str or file-like
+        path to a plain text, gzip, bgzip or zstd compressed pileup file, "-" for stdin,
+        or an already opened binary file object from `open_binary`
+    num_threads: int
+        the number of threads to allow an external decompression program to use
+
+    Returns
+    -------
+    file-like
+        an object that can be iterated over for the lines of the file and has a close method
+    """
+    if hasattr(filepath, 'read'):
+        raw = filepath
+    else:
+        raw = open_binary(filepath)
+    compression = detect_compression(raw.peek(16)[:16])
+    if compression is None:
+        return(text_stream(raw))
+
+    # the bytes we peeked at are only in our buffer, so streams need to be decompressed in-process
+    if raw is not filepath and not is_stream(filepath):
+        command = decompression_command(compression, filepath, num_threads = num_threads)
+        if command is not None:
+            raw.close()
+            return(ProcessReader(command))
+
+    return(text_stream(decompressed_stream(raw, compression)))
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for reporting the progress of long runs; comparisons done, throughput, the current bottleneck stage and an estimated time left
+
+A background thread reports at a regular interval, so that a run still reports while it waits on slow comparisons
+whose results have not come back yet. Each report is a line on stderr, and can also be written as a text file
+in the Prometheus exposition format for the textfile collector of a node exporter to pick up.
+The bottleneck is the timer of `metrics` that grew the most since the last report, so it needs metrics to be enabled.
+"""
+import os
+import sys
+import time
+import datetime
+import threading
+import metrics
+
+# timers that wrap the other timers instead of timing a stage of their own
+WRAPPER_TIMERS = ['worker.task', 'pool.wait']
+
+def format_duration(seconds):
+    if seconds is None:
+        return('NA')
+    return(str(datetime.timedelta(seconds = int(round(seconds)))))
+
+class ProgressReporter(object):
+    """
+    Count the finished comparisons of a run and report on them every interval seconds, to stderr and/or a Prometheus text file
+    """
+    def __init__(self, total, command, unit = 'pairs', interval = 30.0, stream = sys.stderr, textfile = None):
+        self.total = total # int: number of comparisons in the run
+        self.command = command # str: name of the run command, used as a label in the text file
+        self.unit = unit
+        self.interval = interval
+        self.stream = stream # file handle to write the report lines to, or None
+        self.textfile = textfile # str: path of the Prometheus text file, or None
+        self.done = 0
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.last_time = self.start_time
+        self.last_done = 0
+        self.last_timers = {}
+        self.last_bottleneck = None
+
+    def start(self):
+        """
+        Start reporting in the background
+        """
+        self.start_time = self.last_time = time.time()
+        self.last_timers = dict(metrics.timers)
+        self.thread = threading.Thread(target = self._run)
+        self.thread.daemon = True
+        self.thread.start()
+        return(self)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.report()
+
+    def update(self, num_done = 1):
+        with self.lock:
+            self.done += num_done
+
+    def stop(self):
+        """
+        Stop the background reports and make a final one
+        """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.report(final = True)
+
+    def bottleneck(self, timers):
+        """
+        Get the stage whose timer grew the most since the last report;
+        the timers of the workers only grow when their results come back, so the last bottleneck is kept until then
+        """
+        growth = dict( (name, seconds - self.last_timers.get(name, 0.0)) for name, seconds in timers.items() )
+        stages = [ name for name in growth if name not in WRAPPER_TIMERS and growth[name] > 0 ]
+        if not stages:
+            stages = [ name for name in growth if growth[name] > 0 ]
+        if stages:
+            self.last_bottleneck = max(stages, key = lambda name: growth[name])
+        return(self.last_bottleneck)
+
+    def status(self, final = False):
+        """
+        Get the progress since the start of the run and the throughput since the last report, as a dict;
+        the final status has the throughput of the whole run instead
+        """
+        now = time.time()
+        with self.lock:
+            done = self.done
+        try:
+            timers = dict(metrics.timers)
+        except RuntimeError:
+            # a worker result was merged while copying; keep the timers of the last report
+            timers = self.last_timers
+        elapsed = now - self.start_time
+        rate = (done - self.last_done) / (now - self.last_time) if now > self.last_time else 0.0
+        mean_rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - done) / mean_rate if mean_rate > 0 else None
+        if final:
+            rate = mean_rate
+        status = {
+            'done': done,
+            'total': self.total,
+            'elapsed': elapsed,
+            'rate': rate,
+            'eta': eta,
+            'bottleneck': self.bottleneck(timers),
+            'stages': timers,
+            'time': now
+        }
+        self.last_time = now
+        self.last_done = done
+        self.last_timers = timers
+        return(status)
+
+    def report(self, final = False):
+        status = self.status(final)
+        if self.stream is not None:
+            percent = 100.0 * status['done'] / status['total'] if status['total'] else 100.0
+            self.stream.write("[{0}] {1}/{2} {3} ({4:.1f}%), {5:.2f} {3}/s, bottleneck: {6}, elapsed {7}, ETA {8}\n".format(
+                self.command, status['done'], status['total'], self.unit, percent, status['rate'],
+                status['bottleneck'] or 'NA', format_duration(status['elapsed']), format_duration(status['eta'])))
+            self.stream.flush()
+        if self.textfile is not None:
+            write_textfile(self.textfile, self.command, status)
+
+def write_textfile(
+    textfile, # str: path to write to; the collector only reads files ending in .prom
+    command, # str: name of the run command
+    status # dict: from `ProgressReporter.status`
+    ):
+    """
+    Write the progress in the Prometheus text exposition format; the file is replaced in one step so a scrape never sees a partial file
+    """
+    labels = 'command="{0}"'.format(command)
+    lines = []
+    def add(name, metric_type, help_text, value, extra_labels = ''):
+        if not any(line.startswith('# TYPE {0} '.format(name)) for line in lines):
+            lines.append('# HELP {0} {1}'.format(name, help_text))
+            lines.append('# TYPE {0} {1}'.format(name, metric_type))
+        lines.append('{0}{{{1}{2}}} {3}'.format(name, labels, extra_labels, repr(float(value))))
+    add('conpair_comparisons_done_total', 'counter', 'Comparisons finished so far', status['done'])
+    add('conpair_comparisons', 'gauge', 'Comparisons in the run', status['total'])
+    add('conpair_comparisons_per_second', 'gauge', 'Comparisons finished per second since the last report', status['rate'])
+    add('conpair_elapsed_seconds', 'gauge', 'Seconds since the run started', status['elapsed'])
+    if status['eta'] is not None:
+        add('conpair_eta_seconds', 'gauge', 'Estimated seconds until the run finishes', status['eta'])
+    for stage in sorted(status['stages']):
+        add('conpair_stage_seconds_total', 'counter', 'Seconds spent in each stage so far, summed over the workers', status['stages'][stage], ',stage="{0}"'.format(stage))
+    if status['bottleneck'] is not None:
+        add('conpair_bottleneck', 'gauge', 'Set to 1 for the stage that took the most time since the last report', 1, ',stage="{0}"'.format(status['bottleneck']))
+    add('conpair_last_report_timestamp_seconds', 'gauge', 'Time of the last report', status['time'])
+    temp_file = textfile + '.tmp'
+    with open(temp_file, "w") as fout:
+        fout.write('\n'.join(lines) + '\n')
+    os.rename(temp_file, textfile)
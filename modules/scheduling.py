@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for ordering the concordance tasks so that the most expensive ones start first
+
+The cost of a pair is estimated from the sizes and types of its two inputs; parsing a pileup costs far more per byte than
+loading a .pickle of likelihoods, and compressed pileups expand to several times their size on disk.
+Dispatching the tasks largest first to a pool (longest processing time first scheduling) keeps a few large inputs
+from being left for the end while the other processes sit idle.
+"""
+import os
+import heapq
+from pileup_io import get_compression, is_stream
+from genotype_likelihoods import GenotypeLikelihoods
+
+# rough throughputs for turning an input into genotype likelihoods, in bytes of input file per second
+PILEUP_BYTES_PER_SECOND = 20e6
+PICKLE_BYTES_PER_SECOND = 500e6
+# how much larger a compressed pileup is once decompressed
+COMPRESSION_RATIO = 5.0
+# fixed cost of each comparison, in seconds
+PAIR_OVERHEAD_SECONDS = 0.05
+
+def estimate_input_cost(
+    pileup # str: path to a pileup or .pickle input; or already loaded genotype likelihoods
+    ): # -> float
+    """
+    Estimate the seconds it takes to load the genotype likelihoods of an input
+    """
+    if isinstance(pileup, (dict, GenotypeLikelihoods)) or is_stream(pileup) or not os.path.exists(pileup):
+        return(0.0)
+    size = os.path.getsize(pileup)
+    if pileup.endswith('.pickle'):
+        return(size / PICKLE_BYTES_PER_SECOND)
+    if get_compression(pileup) is not None:
+        size *= COMPRESSION_RATIO
+    return(size / PILEUP_BYTES_PER_SECOND)
+
+def iter_pair_costs(
+    pairs, # Iterable[Tuple[str, str, str, str]]: labeled pairs from `loader.load_comparisons`
+    preloaded_likelihoods = None # dict: inputs that are already loaded, which cost nothing to load again
+    ): # -> Generator[float]
+    """
+    Estimate the seconds each pair takes to compute, one pair at a time; each input is only looked at once
+    """
+    if preloaded_likelihoods is None:
+        preloaded_likelihoods = {}
+    input_costs = {}
+    for pair in pairs:
+        for pileup in pair[0:2]:
+            if pileup not in input_costs:
+                input_costs[pileup] = 0.0 if pileup in preloaded_likelihoods else estimate_input_cost(pileup)
+        yield(input_costs[pair[0]] + input_costs[pair[1]] + PAIR_OVERHEAD_SECONDS)
+
+def estimate_pair_costs(
+    pairs, # Iterable[Tuple[str, str, str, str]]: labeled pairs from `loader.load_comparisons`
+    preloaded_likelihoods = None # dict: inputs that are already loaded, which cost nothing to load again
+    ): # -> List[float]
+    """
+    Estimate the seconds each pair takes to compute; each input is only looked at once
+    """
+    return(list(iter_pair_costs(pairs, preloaded_likelihoods)))
+
+def largest_first(
+    pairs, # Iterable[Tuple[str, str, str, str]]
+    costs # List[float]: estimated cost of each pair
+    ): # -> Tuple[List[Tuple[str, str, str, str]], List[float]]
+    """
+    Order the pairs and their costs from the most to the least expensive; pairs with the same cost keep their order
+    """
+    order = sorted(range(len(costs)), key = lambda i: -costs[i])
+    pairs = list(pairs)
+    return([ pairs[i] for i in order ], [ costs[i] for i in order ])
+
+def predict_makespan(
+    costs, # Iterable[float]: cost of each task, in the order they are dispatched
+    num_workers # int: number of processes running the tasks
+    ): # -> float
+    """
+    Predict the time to run all the tasks when each one goes to the next free worker in order
+    """
+    loads = [0.0] * max(int(num_workers), 1)
+    for cost in costs:
+        heapq.heapreplace(loads, loads[0] + cost)
+    return(max(loads))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for screening many tumor and normal pairs on a small subset of the markers
+
+All pairs are first compared on a subset of the most informative markers, chosen by minor allele frequency
+and spread out along every chromosome, and only the best candidate normals for each tumor
+are then compared on the full marker set.
+"""
+from collections import OrderedDict
+from multiprocessing import Pool
+from concordance import load_genotype_likelihoods, compare_genotype_likelihoods
+
+def select_screening_markers(
+    markers_data, # data load for markers set from a call to `ContaminationMarker.get_markers`
+    fraction = 0.05 # float: fraction of the markers to select
+    ): # -> OrderedDict
+    """
+    Select the markers to screen with; each chromosome gets a share of the markers in proportion to its number of markers,
+    its markers are split into that many windows by position, and the marker with the highest minor allele frequency is taken from each window
+    """
+    chroms = OrderedDict()
+    for m, marker in markers_data.items():
+        chroms.setdefault(marker.chrom, []).append(m)
+
+    num_markers = max(int(round(len(markers_data) * fraction)), 1)
+    selected = set()
+    for chrom, chrom_markers in chroms.items():
+        chrom_markers.sort(key = lambda m: int(markers_data[m].pos))
+        num_chrom_markers = min(max(int(round(num_markers * float(len(chrom_markers)) / len(markers_data))), 1), len(chrom_markers))
+        for i in range(num_chrom_markers):
+            window = chrom_markers[i * len(chrom_markers) // num_chrom_markers:(i + 1) * len(chrom_markers) // num_chrom_markers]
+            selected.add(max(window, key = lambda m: min(markers_data[m].RAF, 1.0 - markers_data[m].RAF)))
+
+    return(OrderedDict([ (m, marker) for m, marker in markers_data.items() if m in selected ]))
+
+def top_candidates(
+    screen_results, # List[Tuple]: screening results (tumor_pileup, normal_pileup, tumor_name, normal_name, concordance, num_markers_used, num_total_markers)
+    top = 3 # int: number of candidate normals to keep for each tumor
+    ): # -> List[Tuple[str, str, str, str]]
+    """
+    Get the pairs of each tumor with its best screening concordance values
+    """
+    tumors = OrderedDict()
+    for result in screen_results:
+        tumors.setdefault((result[0], result[2]), []).append(result)
+    candidates = []
+    for tumor_results in tumors.values():
+        # pairs without any usable markers go last
+        tumor_results = sorted(tumor_results, key = lambda result: -1.0 if result[4] is None else result[4], reverse = True)
+        for result in tumor_results[0:top]:
+            candidates.append(tuple(result[0:4]))
+    return(candidates)
+
+def run_parallel_screen(
+    pairs, # Iterable[Tuple[str, str, str, str]]: labeled pairs from `loader.load_comparisons`
+    screening_markers, # OrderedDict: markers from select_screening_markers
+    num_threads, # int: number of pileups to load in parallel
+    min_mapping_quality,
+    normal_homozygous_markers_only,
+    min_cov,
+    min_base_quality,
+    preloaded_likelihoods = None # dict: genotype likelihoods keyed by input path, to use in place of reading those inputs
+    ): # -> List[Tuple]
+    """
+    Load the screening markers of each unique pileup once in parallel and compare every pair on them;
+    returns (tumor_pileup, normal_pileup, tumor_name, normal_name, concordance, num_markers_used, num_total_markers) for each pair
+    """
+    if preloaded_likelihoods is None:
+        preloaded_likelihoods = {}
+    pileups = []
+    seen = set()
+    for tumor_pileup, normal_pileup, tumor_name, normal_name in pairs:
+        for pileup in [tumor_pileup, normal_pileup]:
+            if pileup not in seen:
+                seen.add(pileup)
+                pileups.append(pileup)
+
+    pool = Pool(int(num_threads))
+    results = {}
+    for pileup in pileups:
+        results[pileup] = pool.apply_async(load_genotype_likelihoods, args = (preloaded_likelihoods.get(pileup, pileup), screening_markers, min_mapping_quality, min_base_quality))
+    pool.close()
+    sample_likelihoods = dict([ (pileup, result.get()) for pileup, result in results.items() ])
+    pool.join()
+
+    screen_results = []
+    for tumor_pileup, normal_pileup, tumor_name, normal_name in pairs:
+        try:
+            concordance_val, num_markers_used, num_total_markers = compare_genotype_likelihoods(
+                sample_likelihoods[tumor_pileup],
+                sample_likelihoods[normal_pileup],
+                screening_markers,
+                normal_homozygous_markers_only = normal_homozygous_markers_only,
+                min_cov = min_cov)
+        except ZeroDivisionError:
+            concordance_val = None
+            num_markers_used = None
+            num_total_markers = None
+        screen_results.append((tumor_pileup, normal_pileup, tumor_name, normal_name, concordance_val, num_markers_used, num_total_markers))
+    return(screen_results)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for splitting the tumor vs normal pairs of one large run into shards that can run on independent nodes,
+and for merging the shard outputs back together
+
+Each pair goes to a shard picked from a checksum of its sample IDs and file names,
+so every node makes the same split from the same inputs without sharing anything but the shard number,
+and the split does not depend on the order the files are listed or globbed in.
+"""
+import csv
+import zlib
+from checkpoint import pair_key
+
+def parse_shard(
+    value # str: shard given as "i/n", with 1 <= i <= n
+    ): # -> Tuple[int, int]
+    """
+    Parse a shard number and number of shards
+    """
+    try:
+        shard_index, num_shards = [ int(v) for v in value.split('/') ]
+    except ValueError:
+        raise ValueError("Shard should be given as i/n, e.g. 1/10: " + value)
+    if num_shards < 1 or not 1 <= shard_index <= num_shards:
+        raise ValueError("Shard number should be from 1 to the number of shards: " + value)
+    return(shard_index, num_shards)
+
+def shard_of_pair(
+    pair, # Tuple[str, str, str, str]: labeled pair from `loader.load_comparisons`
+    num_shards # int
+    ): # -> int
+    """
+    Get the shard number, from 1 to num_shards, of a pair
+    """
+    key = '\t'.join(pair_key(*pair))
+    return((zlib.crc32(key.encode('utf-8')) & 0xffffffff) % num_shards + 1)
+
+def select_shard(
+    pairs, # Iterable[Tuple[str, str, str, str]]: labeled pairs from `loader.load_comparisons`
+    shard_index, # int: from 1 to num_shards
+    num_shards # int
+    ): # -> Generator[Tuple[str, str, str, str]]
+    """
+    Get the pairs that belong to one shard
+    """
+    for pair in pairs:
+        if shard_of_pair(pair, num_shards) == shard_index:
+            yield(pair)
+
+def merge_outputs(
+    input_files, # List[str]: concordance output files of the shards
+    fout, # file object to write the merged output to
+    expected_pairs = None # Iterable[Tuple[str, str, str, str]]: labeled pairs that the shards should cover, to check for missing pairs
+    ): # -> Dict[str, list]
+    """
+    Merge the concordance outputs of several shards, keeping the first row of any pair found more than once;
+    returns the keys of the 'duplicated' pairs, the 'missing' expected pairs and the 'unexpected' pairs that were not expected
+    """
+    fieldnames = None
+    writer = None
+    found = set()
+    problems = {'duplicated': [], 'missing': [], 'unexpected': []}
+    for input_file in input_files:
+        with open(input_file) as fin:
+            reader = csv.DictReader(fin, delimiter = '\t')
+            if fieldnames is None:
+                fieldnames = reader.fieldnames
+                writer = csv.DictWriter(fout, delimiter = '\t', fieldnames = fieldnames, lineterminator='\n')
+                writer.writeheader()
+            elif reader.fieldnames != fieldnames:
+                raise Exception("Shard output has different columns than the first one: " + input_file)
+            for row in reader:
+                key = (row['tumor'], row['normal'], row['tumor_filename'], row['normal_filename'])
+                if key in found:
+                    problems['duplicated'].append(key)
+                    continue
+                found.add(key)
+                writer.writerow(row)
+
+    if expected_pairs is not None:
+        expected = set()
+        for pair in expected_pairs:
+            key = pair_key(*pair)
+            expected.add(key)
+            if key not in found:
+                problems['missing'].append(key)
+        problems['unexpected'] = sorted([ key for key in found if key not in expected ])
+    return(problems)
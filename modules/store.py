@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for keeping concordance results in an on-disk SQLite database
+so that repeated runs over a growing cohort only need to compute the comparisons that are new
+
+Each result is keyed by the tumor and normal sample IDs, a fingerprint of each input file (size and modification time),
+and the parameters used for the comparison, so that changed files or different settings are computed again
+"""
+import os
+import json
+import sqlite3
+if __name__ == 'modules.store':
+    from .loader import FilteredPairs
+if __name__ == 'store':
+    from loader import FilteredPairs
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    tumor TEXT NOT NULL,
+    tumor_fingerprint TEXT NOT NULL,
+    normal TEXT NOT NULL,
+    normal_fingerprint TEXT NOT NULL,
+    params TEXT NOT NULL,
+    concordance REAL,
+    num_markers_used INTEGER,
+    num_total_markers INTEGER,
+    tumor_filepath TEXT,
+    normal_filepath TEXT,
+    PRIMARY KEY (tumor, tumor_fingerprint, normal, normal_fingerprint, params)
+);
+CREATE INDEX IF NOT EXISTS results_by_tumor ON results (params, tumor, concordance);
+CREATE INDEX IF NOT EXISTS results_by_normal ON results (params, normal, concordance);
+"""
+
+RESULT_FIELDS = ['tumor', 'normal', 'concordance', 'num_markers_used', 'num_total_markers', 'tumor_filepath', 'normal_filepath']
+
+def file_fingerprint(
+    filepath # str: path to the input file
+    ): # -> str
+    """
+    Get a cheap fingerprint of a file that changes when the file is rewritten; returns None for stdin and pipes, which cannot be fingerprinted
+    """
+    if filepath == '-' or not os.path.isfile(filepath):
+        return(None)
+    stat = os.stat(filepath)
+    return("{0}:{1}".format(stat.st_size, repr(stat.st_mtime)))
+
+def make_params_key(
+    markers, # str: path to the markers file
+    min_mapping_quality,
+    min_base_quality,
+    min_cov,
+    normal_homozygous_markers_only
+    ): # -> str
+    """
+    Make the key for the set of parameters that affect the concordance values
+    """
+    params = {
+        'markers': os.path.basename(markers),
+        'markers_fingerprint': file_fingerprint(markers),
+        'min_mapping_quality': min_mapping_quality,
+        'min_base_quality': min_base_quality,
+        'min_cov': min_cov,
+        'normal_homozygous_markers_only': bool(normal_homozygous_markers_only)
+    }
+    return(json.dumps(params, sort_keys = True))
+
+class ResultsStore(object):
+    """
+    SQLite store of concordance results
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def get(self, tumor, tumor_fingerprint, normal, normal_fingerprint, params):
+        """
+        Get the stored (concordance, num_markers_used, num_total_markers) for a comparison, or None if it has not been computed yet
+        """
+        row = self.conn.execute(
+            "SELECT concordance, num_markers_used, num_total_markers FROM results WHERE tumor = ? AND tumor_fingerprint = ? AND normal = ? AND normal_fingerprint = ? AND params = ?",
+            (tumor, tumor_fingerprint, normal, normal_fingerprint, params)).fetchone()
+        if row is None:
+            return(None)
+        return(tuple(row))
+
+    def get_all(self, params):
+        """
+        Get all the stored results for a set of parameters, as a dict of (tumor, tumor_fingerprint, normal, normal_fingerprint) -> (concordance, num_markers_used, num_total_markers)
+        """
+        rows = self.conn.execute(
+            "SELECT tumor, tumor_fingerprint, normal, normal_fingerprint, concordance, num_markers_used, num_total_markers FROM results WHERE params = ?",
+            (params,))
+        return(dict( (tuple(row[0:4]), tuple(row[4:7])) for row in rows ))
+
+    def put(self, rows, params):
+        """
+        Save results; rows are (tumor, tumor_fingerprint, normal, normal_fingerprint, concordance, num_markers_used, num_total_markers, tumor_filepath, normal_filepath)
+        """
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO results (tumor, tumor_fingerprint, normal, normal_fingerprint, concordance, num_markers_used, num_total_markers, tumor_filepath, normal_filepath, params) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [ tuple(row) + (params,) for row in rows ])
+        self.conn.commit()
+
+    def best_matches(self, params, tumor = None, normal = None, limit = 1):
+        """
+        Get the stored comparisons with the highest concordance for a tumor or a normal sample, as a list of dicts with the RESULT_FIELDS;
+        only the most recently stored result of each (tumor, normal) pair is ranked, so results for the old fingerprints of files that were rewritten are left out
+        """
+        if tumor is not None:
+            where = "tumor = ?"
+            sample = tumor
+        elif normal is not None:
+            where = "normal = ?"
+            sample = normal
+        else:
+            raise Exception("Need a tumor or a normal sample ID to look up")
+        # INSERT OR REPLACE gives each saved row a new rowid, so the highest rowid of a pair is its newest result
+        rows = self.conn.execute(
+            "SELECT " + ', '.join(RESULT_FIELDS) + " FROM results WHERE rowid IN (SELECT MAX(rowid) FROM results WHERE params = ? AND " + where + " GROUP BY tumor, normal)"
+            " AND concordance IS NOT NULL ORDER BY concordance DESC LIMIT ?",
+            (params, sample, int(limit))).fetchall()
+        return([ dict(zip(RESULT_FIELDS, row)) for row in rows ])
+
+def store_results(
+    results, # Iterable[Tuple]: results from `run.py` run_parallel_concordance
+    store, # ResultsStore
+    params, # str: params key from make_params_key
+    batch_size = 100 # int: number of results to save to the database at a time
+    ): # -> Generator[Tuple]
+    """
+    Save concordance results to the store in batches as they pass through;
+    supervised results that timed out or failed pass through without being saved, so they are computed again next time
+    """
+    fingerprints = {}
+    batch = []
+    for result in results:
+        if len(result) > 7 and result[7] != 'ok':
+            yield(result)
+            continue
+        tumor_pileup, normal_pileup, tumor_name, normal_name, concordance_val, num_markers_used, num_total_markers = result[0:7]
+        for pileup in [tumor_pileup, normal_pileup]:
+            if pileup not in fingerprints:
+                fingerprints[pileup] = file_fingerprint(pileup)
+        if fingerprints[tumor_pileup] is not None and fingerprints[normal_pileup] is not None:
+            batch.append((tumor_name, fingerprints[tumor_pileup], normal_name, fingerprints[normal_pileup], concordance_val, num_markers_used, num_total_markers, tumor_pileup, normal_pileup))
+        if len(batch) >= batch_size:
+            store.put(batch, params)
+            batch = []
+        yield(result)
+    if batch:
+        store.put(batch, params)
+
+def split_stored_pairs(
+    pairs, # Iterable[Tuple[str, str, str, str]]: labeled pairs from `loader.load_comparisons`
+    store, # ResultsStore
+    params # str: params key from make_params_key
+    ): # -> Tuple[Generator[Tuple], FilteredPairs]
+    """
+    Split the pairs into the results that are already in the store, in the same format as run_parallel_concordance, and the pairs that still need to be computed;
+    the stored results for the params are read with one query, and both parts are made lazily from the pairs
+    """
+    stored = store.get_all(params)
+    fingerprints = {}
+    def stored_result(pair):
+        tumor_pileup, normal_pileup, tumor_name, normal_name = pair[0:4]
+        for pileup in [tumor_pileup, normal_pileup]:
+            if pileup not in fingerprints:
+                fingerprints[pileup] = file_fingerprint(pileup)
+        if fingerprints[tumor_pileup] is None or fingerprints[normal_pileup] is None:
+            return(None)
+        return(stored.get((tumor_name, fingerprints[tumor_pileup], normal_name, fingerprints[normal_pileup])))
+
+    def stored_results():
+        for pair in pairs:
+            result = stored_result(pair)
+            if result is not None:
+                yield(tuple(pair) + result)
+    return(stored_results(), FilteredPairs(pairs, lambda pair: stored_result(pair) is None))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for summarizing a concordance run as the best matches of each sample instead of every pair
+
+The results are added as they stream in, and only a bounded heap of the best top_k results is kept for each tumor and each normal,
+along with the pairs whose concordance is at least min_concordance, so the summary takes O((tumors + normals) * top_k) memory
+and output plus the pairs over the threshold, whatever the number of pairs.
+"""
+import heapq
+from collections import OrderedDict
+
+def _sort_key(result):
+    # pairs without any usable markers go last
+    return(-1.0 if result[4] is None else result[4])
+
+class BestMatches(object):
+    """
+    Keep the top_k best results of each tumor and of each normal, and every result with a concordance of at least min_concordance
+    """
+    def __init__(self, top_k = None, min_concordance = None):
+        self.top_k = top_k # int: number of best matches to keep for each sample, or None to keep none
+        self.min_concordance = min_concordance # float: keep every pair with at least this concordance, or None
+        self.tumors = OrderedDict() # (tumor_pileup, tumor_name) -> heap of (concordance, -order, result)
+        self.normals = OrderedDict() # (normal_pileup, normal_name) -> heap of (concordance, -order, result)
+        self.above = [] # results with at least min_concordance
+        self.num_results = 0
+
+    def _push(self, heaps, key, item):
+        heap = heaps.setdefault(key, [])
+        if len(heap) < self.top_k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    def add(self,
+        result # Tuple: a result of `run_parallel_concordance`, starting with (tumor_pileup, normal_pileup, tumor_name, normal_name, concordance, ...)
+        ):
+        # ties are broken by keeping the earlier result
+        self.num_results += 1
+        if self.top_k:
+            item = (_sort_key(result), -self.num_results, tuple(result))
+            self._push(self.tumors, (result[0], result[2]), item)
+            self._push(self.normals, (result[1], result[3]), item)
+        if self.min_concordance is not None and result[4] is not None and result[4] >= self.min_concordance:
+            self.above.append(tuple(result))
+
+    def rows(self): # -> List[Tuple[Tuple, int, int, bool]]
+        """
+        Get (result, tumor_rank, normal_rank, above_min_concordance) for each pair in the summary, once per pair.
+        tumor_rank is the rank of the normal among the best matches of the tumor, and normal_rank that of the tumor among
+        the best matches of the normal, starting at 1; None if the pair is not one of them.
+        The best matches of each tumor come first, then those of each normal, then the other pairs above min_concordance
+        """
+        pairs = OrderedDict()
+        def get_row(result):
+            return(pairs.setdefault(result[0:4], [result, None, None, False]))
+        for rank_index, heaps in [(1, self.tumors), (2, self.normals)]:
+            for heap in heaps.values():
+                for rank, item in enumerate(sorted(heap, reverse = True)):
+                    get_row(item[2])[rank_index] = rank + 1
+        for result in self.above:
+            get_row(result)[3] = True
+        if self.min_concordance is not None:
+            for row in pairs.values():
+                row[3] = row[0][4] is not None and row[0][4] >= self.min_concordance
+        return([ tuple(row) for row in pairs.values() ])
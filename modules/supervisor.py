@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for running tasks in separate processes with per-task timeouts, bounded retries and speculative re-execution
+
+Each copy of a task runs in its own process and sends its result back through a pipe, so that a copy that runs past the timeout
+can be killed without affecting any of the others, which killing a worker of a process pool does not guarantee;
+the task is then tried again. Tasks that are much slower than the median of the finished ones can also get a second copy started,
+and whichever copy finishes first is used. Tasks that still fail after their retries are reported as failed instead of stopping the whole run.
+"""
+import os
+import sys
+import time
+import signal
+import heapq
+from collections import deque
+from multiprocessing import Process, Pipe
+
+def _run_task(conn, initializer, initargs, func, args, kwds):
+    """
+    Process target for supervised_map; sends back ('ok', return value) or ('failed', exception)
+    """
+    try:
+        if initializer is not None:
+            initializer(*initargs)
+        message = ('ok', func(*args, **kwds))
+    except Exception as e:
+        message = ('failed', e)
+    try:
+        conn.send(message)
+    except Exception as e:
+        # the value or the exception could not be pickled
+        conn.send(('failed', Exception("{0}: {1}".format(type(e).__name__, e))))
+    conn.close()
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return(values[middle])
+    return((values[middle - 1] + values[middle]) / 2.0)
+
+class RunningMedian(object):
+    """
+    Median of a growing set of values, kept in two heaps so that adding a value is O(log n) and reading the median is O(1)
+    """
+    def __init__(self):
+        self.low = [] # max heap of the lower half, as negated values
+        self.high = [] # min heap of the upper half
+
+    def __len__(self):
+        return(len(self.low) + len(self.high))
+
+    def add(self, value):
+        if self.low and value > -self.low[0]:
+            heapq.heappush(self.high, value)
+        else:
+            heapq.heappush(self.low, -value)
+        # keep the lower half the same size as the upper half or one larger
+        if len(self.low) > len(self.high) + 1:
+            heapq.heappush(self.high, -heapq.heappop(self.low))
+        elif len(self.high) > len(self.low):
+            heapq.heappush(self.low, -heapq.heappop(self.high))
+
+    def median(self): # -> float
+        if len(self.low) > len(self.high):
+            return(-self.low[0])
+        return((-self.low[0] + self.high[0]) / 2.0)
+
+def supervised_map(
+    func, # function to run for each task; needs to be a top-level function so it can be pickled
+    tasks, # Iterable[Tuple[tuple, dict]]: args and kwargs for each task; read lazily as room opens up in the window
+    num_threads, # int: number of processes to run at a time
+    timeout = None, # float: seconds a task can run before it is killed and tried again
+    max_retries = 1, # int: number of times to try a task again after it fails or times out
+    speculative_factor = None, # float: start a second copy of a task when it has run this many times longer than the median task
+    min_finished = 5, # int: number of finished tasks needed before the median is used for speculative copies
+    final_exceptions = (), # tuple: exception types that are part of a task's result, and are reported without trying again
+    poll_interval = 0.05, # float: seconds to wait between checks of the running tasks
+    window = None, # int: number of unfinished tasks to read ahead at a time; twice the number of processes if not given
+    initializer = None, # function to run in each process before its task, like the initializer of a multiprocessing.Pool
+    initargs = () # tuple: args for the initializer
+    ): # -> Generator[Tuple[int, str, object]]
+    """
+    Run the tasks and yield (task index, status, value) as each one finishes, in the order they finish;
+    status is 'ok' with the return value, 'failed' with the exception raised by the last try, or 'timeout' with None
+    Only a window of tasks is read at a time, and the next task is read when one finishes,
+    so each check of the running tasks costs the size of the window rather than the number of tasks.
+    When one copy of a speculative task finishes, the process of the other copy is killed.
+    """
+    num_threads = max(int(num_threads), 1)
+    if window is None:
+        window = 2 * num_threads
+    task_iter = enumerate(tasks)
+    exhausted = False
+    pending = {} # task_id -> (args, kwds) of the tasks in the window that have not finished
+    waiting = deque() # task_id of each copy that is waiting for a free process; speculative copies go first
+    attempts = {} # task_id -> number of copies started
+    failures = {} # task_id -> number of failed tries
+    copies = {} # task_id -> number of copies waiting or running
+    running = {} # (task_id, attempt) -> (process, connection, start time)
+    speculated = set()
+    durations = RunningMedian()
+
+    def start(task_id):
+        attempt = attempts.get(task_id, 0) + 1
+        attempts[task_id] = attempt
+        args, kwds = pending[task_id]
+        receiver, sender = Pipe(duplex = False)
+        process = Process(target = _run_task, args = (sender, initializer, initargs, func, args, kwds))
+        process.daemon = True
+        process.start()
+        sender.close()
+        running[(task_id, attempt)] = (process, receiver, time.time())
+
+    def queue_copy(task_id, first = False):
+        copies[task_id] = copies.get(task_id, 0) + 1
+        if first:
+            waiting.appendleft(task_id)
+        else:
+            waiting.append(task_id)
+
+    def receive(key):
+        # -> (status, value) sent by a copy that has finished or whose process has exited
+        process, conn, started = running.pop(key)
+        copies[key[0]] -= 1
+        message = None
+        if conn.poll():
+            try:
+                message = conn.recv()
+            except EOFError:
+                pass
+        conn.close()
+        process.join()
+        if message is None:
+            message = ('failed', Exception("The process of the task exited with code {0}".format(process.exitcode)))
+        return(message)
+
+    def stop(key):
+        process, conn, started = running.pop(key)
+        copies[key[0]] -= 1
+        try:
+            os.kill(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        process.join()
+        conn.close()
+
+    def finish(task_id):
+        # stop the other copies of the task and forget it
+        for attempt in range(1, attempts[task_id] + 1):
+            key = (task_id, attempt)
+            if key in running:
+                sys.stderr.write("Task {0} finished; killing process {1} of its other copy\n".format(task_id, running[key][0].pid))
+                stop(key)
+        while task_id in waiting:
+            waiting.remove(task_id)
+        for state in [pending, attempts, failures, copies]:
+            state.pop(task_id, None)
+        speculated.discard(task_id)
+
+    try:
+        while pending or not exhausted:
+            # fill the window
+            while not exhausted and len(pending) < window:
+                try:
+                    task_id, task = next(task_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[task_id] = task
+                queue_copy(task_id)
+            while waiting and len(running) < num_threads:
+                start(waiting.popleft())
+
+            progressed = False
+            now = time.time()
+            for key, (process, conn, started) in list(running.items()):
+                if key not in running:
+                    # stopped when another copy of its task finished
+                    continue
+                task_id, attempt = key
+                status = None
+                if conn.poll() or not process.is_alive():
+                    progressed = True
+                    status, value = receive(key)
+                    if status == 'ok':
+                        durations.add(now - started)
+                        finish(task_id)
+                        yield((task_id, 'ok', value))
+                        continue
+                    if isinstance(value, final_exceptions):
+                        finish(task_id)
+                        yield((task_id, 'failed', value))
+                        continue
+                elif timeout is not None and now - started > timeout:
+                    sys.stderr.write("Task {0} timed out after {1:.0f}s; killing process {2}\n".format(task_id, now - started, process.pid))
+                    stop(key)
+                    progressed = True
+                    status = 'timeout'
+                    value = None
+                elif speculative_factor is not None and task_id not in speculated and len(durations) >= min_finished and now - started > speculative_factor * durations.median():
+                    sys.stderr.write("Task {0} is slow ({1:.0f}s); starting another copy of it\n".format(task_id, now - started))
+                    speculated.add(task_id)
+                    queue_copy(task_id, first = True)
+
+                if status is not None:
+                    failures[task_id] = failures.get(task_id, 0) + 1
+                    if copies[task_id] > 0:
+                        # another copy can still finish the task
+                        continue
+                    if failures[task_id] <= max_retries:
+                        queue_copy(task_id)
+                    else:
+                        finish(task_id)
+                        yield((task_id, status, value))
+
+            if not progressed:
+                time.sleep(poll_interval)
+    finally:
+        # stop any copies that are still running
+        for key in list(running):
+            stop(key)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for running concordance over a grid of quality and coverage thresholds
+
+Each pileup is parsed only once into per-marker histograms of (mapping quality bin, base quality) for each base,
+and the thresholds are applied to the histograms afterwards, so that a whole grid of
+(min mapping quality, min base quality, min coverage) settings can be compared from a single parse.
+"""
+import itertools
+from multiprocessing import Pool
+from ContaminationMarker import quality_histograms_for_markers, genotype_likelihoods_from_histograms
+from concordance import compare_genotype_likelihoods
+from genotype_likelihoods import GenotypeLikelihoods
+import metrics
+
+def sweep_genotype_likelihoods(
+    pileup, # str: path to the pileup file
+    markers_data, # data load for markers set from a call to `ContaminationMarker.get_markers`
+    min_mapping_qualities, # List[int]: min mapping quality values to make likelihoods for
+    min_base_qualities # List[int]: min base quality values to make likelihoods for
+    ): # -> Dict[Tuple[int, int], GenotypeLikelihoods]
+    """
+    Parse a pileup once and make its genotype likelihoods for each combination of min mapping quality and min base quality
+    """
+    if pileup.endswith('.pickle'):
+        raise Exception("Parameter sweeps need pileup inputs; the likelihoods saved in .pickle files already have quality thresholds applied: " + pileup)
+    with metrics.timer('sweep.histograms'):
+        histograms = quality_histograms_for_markers(markers_data, pileup, mapq_bins = min_mapping_qualities)
+    likelihoods = {}
+    with metrics.timer('sweep.genotype_likelihoods'):
+        for min_mapping_quality, min_base_quality in itertools.product(min_mapping_qualities, min_base_qualities):
+            likelihoods[(min_mapping_quality, min_base_quality)] = GenotypeLikelihoods.from_dict(genotype_likelihoods_from_histograms(
+                markers_data,
+                histograms,
+                mapq_bins = min_mapping_qualities,
+                min_map_quality = min_mapping_quality,
+                min_base_quality = min_base_quality), markers_data)
+    return(likelihoods)
+
+def sweep_batches(
+    pairs, # List[Tuple[str, str, str, str]]: labeled pairs from `loader.load_comparisons`
+    max_resident = None # int: most pileups to hold the likelihoods of at once; no limit if not given
+    ): # -> List[List[Tuple[str, str, str, str]]]
+    """
+    Split the pairs into batches that each need at most max_resident pileups.
+    The tumors are split into blocks, and each tumor block is paired with each block of the normals, so that a tumor block stays
+    loaded while the normals are loaded block by block; the pairs of each batch keep their order
+    """
+    pairs = list(pairs)
+    tumors = unique([ pair[0] for pair in pairs ])
+    normals = unique([ pair[1] for pair in pairs ])
+    if max_resident is None or len(unique(tumors + normals)) <= max_resident:
+        return([pairs] if pairs else [])
+    tumor_block_size = min(len(tumors), max(max_resident // 2, 1))
+    normal_block_size = max(max_resident - tumor_block_size, 1)
+    tumor_blocks = dict( (tumor, i // tumor_block_size) for i, tumor in enumerate(tumors) )
+    normal_blocks = dict( (normal, i // normal_block_size) for i, normal in enumerate(normals) )
+    batches = {}
+    for pair in pairs:
+        batches.setdefault((tumor_blocks[pair[0]], normal_blocks[pair[1]]), []).append(pair)
+    return([ batches[key] for key in sorted(batches) ])
+
+def unique(values):
+    """
+    Get the distinct values in the order they first appear
+    """
+    seen = set()
+    result = []
+    for value in values:
+        if value not in seen:
+            seen.add(value)
+            result.append(value)
+    return(result)
+
+def run_parallel_sweep(
+    pairs, # Iterable[Tuple[str, str, str, str]]: labeled pairs from `loader.load_comparisons`
+    markers_data, # data load for markers set from a call to `ContaminationMarker.get_markers`
+    num_threads, # int: number of pileups to parse in parallel
+    min_mapping_qualities, # List[int]
+    min_base_qualities, # List[int]
+    min_covs, # List[int]
+    normal_homozygous_markers_only = False, # bool
+    profile_dir = None, # str: directory for the workers to dump their cProfile stats to, when metrics are enabled
+    max_resident = None # int: most pileups to hold the likelihoods of at once; all of them if not given
+    ): # -> Generator[Tuple]
+    """
+    Parse each unique pileup of the pairs once in parallel, then yield the concordance of every pair for every combination of thresholds;
+    (tumor_pileup, normal_pileup, tumor_name, normal_name, min_mapping_quality, min_base_quality, min_cov, concordance, num_markers_used, num_total_markers)
+    With max_resident the pairs are run in batches (see `sweep_batches`) and only the pileups of the current batch are kept loaded;
+    the results are then grouped by batch instead of in the order of the pairs, and pileups shared across batches may be parsed more than once
+    """
+    pool = Pool(int(num_threads))
+    sample_likelihoods = {}
+    for batch in sweep_batches(pairs, max_resident):
+        pileups = unique([ pileup for pair in batch for pileup in pair[0:2] ])
+        for pileup in list(sample_likelihoods):
+            if pileup not in pileups:
+                del sample_likelihoods[pileup]
+
+        results = {}
+        for pileup in pileups:
+            if pileup in sample_likelihoods:
+                continue
+            args = (pileup, markers_data, min_mapping_qualities, min_base_qualities)
+            if metrics.ENABLED:
+                results[pileup] = pool.apply_async(metrics.run_task, args = (sweep_genotype_likelihoods, args, {}, profile_dir))
+            else:
+                results[pileup] = pool.apply_async(sweep_genotype_likelihoods, args = args)
+        with metrics.timer('pool.wait'):
+            for pileup, result in results.items():
+                sample_likelihoods[pileup] = result.get()
+                if metrics.ENABLED:
+                    sample_likelihoods[pileup], task_metrics = sample_likelihoods[pileup]
+                    metrics.merge(task_metrics)
+
+        for tumor_pileup, normal_pileup, tumor_name, normal_name in batch:
+            for min_mapping_quality, min_base_quality, min_cov in itertools.product(min_mapping_qualities, min_base_qualities, min_covs):
+                try:
+                    concordance_val, num_markers_used, num_total_markers = compare_genotype_likelihoods(
+                        sample_likelihoods[tumor_pileup][(min_mapping_quality, min_base_quality)],
+                        sample_likelihoods[normal_pileup][(min_mapping_quality, min_base_quality)],
+                        markers_data,
+                        normal_homozygous_markers_only = normal_homozygous_markers_only,
+                        min_cov = min_cov)
+                except ZeroDivisionError:
+                    concordance_val = None
+                    num_markers_used = None
+                    num_total_markers = None
+                yield(tumor_pileup, normal_pileup, tumor_name, normal_name, min_mapping_quality, min_base_quality, min_cov, concordance_val, num_markers_used, num_total_markers)
+    pool.close()
+    pool.join()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+module for generating synthetic cohorts of tumor and normal pileups for testing and benchmarking
+
+Each individual gets genotypes drawn from the reference allele frequencies of a marker panel,
+and each sample gets reads simulated from its genotypes at a given depth, with base qualities, sequencing errors
+and some reads of low mapping quality. Tumors can be swapped with the tumor of another individual
+or contaminated with reads from another individual, and the truth is written next to the pileups.
+Only `random.Random.random` is used to draw values so that a seed gives the same cohort under Python 2 and 3.
+"""
+import os
+import csv
+import random
+from collections import OrderedDict
+
+BASES = ['A', 'C', 'G', 'T']
+# base qualities are drawn uniformly from this range
+MIN_BASE_QUALITY = 10
+MAX_BASE_QUALITY = 40
+# fraction of reads given a mapping quality below the default minimum
+LOW_MAPQ_FRACTION = 0.05
+HIGH_MAPQ = 60
+LOW_MAPQ = 5
+
+def subset_markers(
+    markers_data, # OrderedDict: markers from `ContaminationMarker.get_markers`
+    num_markers = None # int: number of markers to keep, spread evenly over the panel; all of them if None
+    ): # -> OrderedDict
+    """
+    Keep an evenly spaced subset of a marker panel
+    """
+    if num_markers is None or num_markers >= len(markers_data):
+        return(markers_data)
+    keys = list(markers_data.keys())
+    step = float(len(keys)) / num_markers
+    return(OrderedDict( (keys[int(i * step)], markers_data[keys[int(i * step)]]) for i in range(int(num_markers)) ))
+
+def choose(rng, values):
+    return(values[int(rng.random() * len(values))])
+
+def simulate_genotypes(
+    markers_data, # OrderedDict: markers from `ContaminationMarker.get_markers`
+    rng # random.Random
+    ): # -> Dict[str, int]
+    """
+    Draw the genotype of one individual at each marker under Hardy-Weinberg equilibrium;
+    the number of alt alleles, 0 (ref/ref), 1 (ref/alt) or 2 (alt/alt)
+    """
+    genotypes = {}
+    for key, marker in markers_data.items():
+        genotypes[key] = int(rng.random() > marker.RAF) + int(rng.random() > marker.RAF)
+    return(genotypes)
+
+def simulate_reads(
+    marker, # ContaminationMarker.Marker
+    genotype, # int: number of alt alleles of the sample
+    depth, # int: mean number of reads
+    rng, # random.Random
+    contaminant_genotype = None, # int: number of alt alleles of the contaminating individual
+    contamination = 0.0 # float: fraction of the reads that come from the contaminating individual
+    ): # -> List[Tuple[str, int, int]]
+    """
+    Simulate the reads covering a marker as a list of (base, base quality, mapping quality);
+    the depth varies uniformly between half and one and a half times the mean
+    """
+    reads = []
+    num_reads = int(depth * (0.5 + rng.random()))
+    for i in range(num_reads):
+        source_genotype = genotype
+        if contaminant_genotype is not None and rng.random() < contamination:
+            source_genotype = contaminant_genotype
+        base = marker.alt if rng.random() < source_genotype / 2.0 else marker.ref
+        base_quality = MIN_BASE_QUALITY + int(rng.random() * (MAX_BASE_QUALITY - MIN_BASE_QUALITY + 1))
+        if rng.random() < 10 ** (-base_quality / 10.0):
+            base = choose(rng, [ b for b in BASES if b != base ])
+        mapping_quality = LOW_MAPQ if rng.random() < LOW_MAPQ_FRACTION else HIGH_MAPQ
+        reads.append((base, base_quality, mapping_quality))
+    return(reads)
+
+def gatk_pileup_line(
+    marker, # ContaminationMarker.Marker
+    reads # List[Tuple[str, int, int]]: from simulate_reads
+    ): # -> str
+    """
+    Format the reads of a marker as a line of GATK verbose pileup
+    """
+    bases = ''.join( base for base, base_quality, mapping_quality in reads )
+    quals = ''.join( chr(base_quality + 33) for base, base_quality, mapping_quality in reads )
+    verbose = ','.join( 'read{0}:{1}@{2}@100@{3}'.format(marker.pos, i, i % 100, mapping_quality) for i, (base, base_quality, mapping_quality) in enumerate(reads) )
+    return(' '.join([marker.chrom, marker.pos, marker.ref, bases, quals, '', '0', verbose]) + '\n')
+
+def samtools_pileup_line(
+    marker, # ContaminationMarker.Marker
+    reads # List[Tuple[str, int, int]]: from simulate_reads
+    ): # -> str
+    """
+    Format the reads of a marker as a line of `samtools mpileup --output-MQ`; reads alternate between the forward and reverse strands
+    """
+    bases = []
+    for i, (base, base_quality, mapping_quality) in enumerate(reads):
+        if base == marker.ref:
+            bases.append('.' if i % 2 == 0 else ',')
+        else:
+            bases.append(base if i % 2 == 0 else base.lower())
+    quals = ''.join( chr(base_quality + 33) for base, base_quality, mapping_quality in reads )
+    mapqs = ''.join( chr(mapping_quality + 33) for base, base_quality, mapping_quality in reads )
+    if not reads:
+        # samtools puts a placeholder in the empty columns of uncovered positions
+        return('\t'.join([marker.chrom, marker.pos, marker.ref, '0', '*', '*', '*']) + '\n')
+    return('\t'.join([marker.chrom, marker.pos, marker.ref, str(len(reads)), ''.join(bases), quals, mapqs]) + '\n')
+
+def write_pileup(
+    output_file, # str: path to write the pileup to
+    markers_data, # OrderedDict: markers from `ContaminationMarker.get_markers`
+    genotypes, # Dict[str, int]: from simulate_genotypes
+    depth, # int: mean number of reads per marker
+    rng, # random.Random
+    pileup_format = 'gatk', # str: 'gatk' or 'samtools'
+    contaminant_genotypes = None, # Dict[str, int]: genotypes of the contaminating individual
+    contamination = 0.0 # float: fraction of the reads that come from the contaminating individual
+    ):
+    """
+    Simulate the reads of a sample at every marker and write them as a pileup; markers without reads are left out of GATK pileups
+    """
+    format_line = {'gatk': gatk_pileup_line, 'samtools': samtools_pileup_line}[pileup_format]
+    with open(output_file, "w") as fout:
+        for key, marker in markers_data.items():
+            contaminant_genotype = None
+            if contaminant_genotypes is not None:
+                contaminant_genotype = contaminant_genotypes[key]
+            reads = simulate_reads(marker, genotypes[key], depth, rng, contaminant_genotype = contaminant_genotype, contamination = contamination)
+            if not reads and pileup_format == 'gatk':
+                continue
+            fout.write(format_line(marker, reads))
+
+def make_cohort(
+    output_dir, # str: directory to write the cohort to
+    markers_data, # OrderedDict: markers from `ContaminationMarker.get_markers`
+    num_samples = 10, # int: number of individuals, each with a tumor and a normal
+    depth = 30, # int: mean number of reads per marker
+    pileup_format = 'gatk', # str: 'gatk' or 'samtools'
+    swap_rate = 0.0, # float: fraction of the tumors that are replaced by the tumor of another individual
+    contamination_rate = 0.0, # float: fraction of the tumors that are contaminated by another individual
+    contamination = 0.1, # float: fraction of the reads of contaminated tumors that come from the other individual
+    seed = 0 # int: random seed
+    ): # -> List[dict]
+    """
+    Write a tumor and a normal pileup for each individual, the lists of their paths in tumors.txt and normals.txt,
+    and the truth for each tumor in truth.tsv; returns the rows of truth.tsv
+    """
+    rng = random.Random(seed)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    extension = {'gatk': '.gatk.pileup', 'samtools': '.mpileup'}[pileup_format]
+    individuals = [ simulate_genotypes(markers_data, rng) for i in range(num_samples) ]
+
+    truth = []
+    tumors = []
+    normals = []
+    for i in range(num_samples):
+        name = 'sample{0}'.format(i + 1)
+        normal_pileup = os.path.join(output_dir, name + '_normal' + extension)
+        tumor_pileup = os.path.join(output_dir, name + '_tumor' + extension)
+        write_pileup(normal_pileup, markers_data, individuals[i], depth, rng, pileup_format = pileup_format)
+
+        # swaps and contaminants come from the next individual so that they are never the sample itself
+        other = (i + 1) % num_samples
+        tumor_individual = i
+        if num_samples > 1 and rng.random() < swap_rate:
+            tumor_individual = other
+        contaminant = None
+        tumor_contamination = 0.0
+        if num_samples > 1 and rng.random() < contamination_rate:
+            contaminant = other if tumor_individual == i else i
+            tumor_contamination = contamination
+        write_pileup(tumor_pileup, markers_data, individuals[tumor_individual], depth, rng,
+            pileup_format = pileup_format,
+            contaminant_genotypes = individuals[contaminant] if contaminant is not None else None,
+            contamination = tumor_contamination)
+
+        tumors.append(tumor_pileup)
+        normals.append(normal_pileup)
+        truth.append({
+            'tumor_pileup': tumor_pileup,
+            'normal_pileup': normal_pileup,
+            'individual': 'sample{0}'.format(i + 1),
+            'tumor_individual': 'sample{0}'.format(tumor_individual + 1),
+            'contaminant': 'sample{0}'.format(contaminant + 1) if contaminant is not None else 'NA',
+            'contamination': tumor_contamination
+        })
+
+    for list_file, pileups in [('tumors.txt', tumors), ('normals.txt', normals)]:
+        with open(os.path.join(output_dir, list_file), "w") as fout:
+            fout.write(''.join( pileup + '\n' for pileup in pileups ))
+    with open(os.path.join(output_dir, 'truth.tsv'), "w") as fout:
+        writer = csv.DictWriter(fout, delimiter = '\t', fieldnames = ['individual', 'tumor_individual', 'contaminant', 'contamination', 'tumor_pileup', 'normal_pileup'], lineterminator = '\n')
+        writer.writeheader()
+        for row in truth:
+            writer.writerow(row)
+    return(truth)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the ContaminationMarker module
+"""
+import os
+import gzip
+import unittest
+import shutil
+from tempfile import mkdtemp
+from ContaminationMarker import get_markers, genotype_likelihoods_for_markers, find_line_aligned_ranges, pileup2acgt, parse_samtools_mpileup_line, parse_mpileup_line, detect_pileup_format
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+PILEUP_DIR = os.path.join(PARENT_DIR, "data", "example", "pileup")
+marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+pileup_10lines = os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt")
+
+def gatk_to_samtools_line(line):
+    """
+    Convert a GATK verbose pileup line into the equivalent `samtools mpileup --output-MQ` line,
+    with read start and end markers, indels and a deletion added to exercise the decoder
+    """
+    fields = line.split(' ')
+    chrom, pos, ref, bases, quals = fields[0:5]
+    mapqs = [ int(v.split('@')[-1]) for v in fields[7].split(',') ]
+    read_bases = []
+    for i, base in enumerate(bases):
+        if base == ref:
+            base = '.' if i % 2 == 0 else ','
+        elif i % 2 == 1:
+            base = base.lower()
+        read_bases.append(base)
+    # first read starts here with mapping quality '+', second one ends here, third one is followed by an insertion, fourth one by a deletion
+    read_bases[0] = '^+' + read_bases[0]
+    read_bases[1] = read_bases[1] + '$'
+    read_bases[2] = read_bases[2] + '+12ACGTACGTACGT'
+    read_bases[3] = read_bases[3] + '-2AC'
+    # add a read with a deletion at this position
+    read_bases.append('*')
+    quals += 'I'
+    mapq_chars = ''.join([ chr(min(mapq, 93) + 33) for mapq in mapqs ]) + chr(60 + 33)
+    return('\t'.join([chrom, pos, ref, str(len(read_bases)), ''.join(read_bases), quals, mapq_chars]) + '\n')
+
+class TestGenotypeLikelihoods(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.markers_data = get_markers(marker_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_line_aligned_ranges(self):
+        """
+        Test that the byte ranges cover the whole file and each one starts at the beginning of a line
+        """
+        ranges = find_line_aligned_ranges(pileup_10lines, 4)
+        with open(pileup_10lines, 'rb') as fin:
+            data = fin.read()
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(data))
+        for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(data[start - 1:start], b'\n' if start > 0 else b'')
+            self.assertEqual(data[next_start - 1:next_start], b'\n')
+
+    def test_line_aligned_ranges_more_chunks_than_lines(self):
+        """
+        Test that asking for more chunks than there are lines gives one range per line
+        """
+        ranges = find_line_aligned_ranges(pileup_10lines, 100)
+        self.assertEqual(len(ranges), 10)
+
+    def test_parallel_likelihoods_match_serial(self):
+        """
+        Test that parsing the pileup in parallel chunks gives the same likelihoods as a serial parse
+        """
+        serial = genotype_likelihoods_for_markers(self.markers_data, pileup_10lines, min_map_quality=10, min_base_quality=20)
+        parallel = genotype_likelihoods_for_markers(self.markers_data, pileup_10lines, min_map_quality=10, min_base_quality=20, num_threads=2)
+        self.assertEqual(len([ m for m in serial if serial[m] is not None ]), 10)
+        self.assertEqual(serial, parallel)
+
+    def test_parallel_likelihoods_empty_file(self):
+        """
+        Test that an empty pileup gives no likelihoods for any marker
+        """
+        empty_pileup = os.path.join(self.tmpdir, "empty.pileup")
+        open(empty_pileup, "w").close()
+        likelihoods = genotype_likelihoods_for_markers(self.markers_data, empty_pileup, num_threads=2)
+        self.assertEqual(len(likelihoods), len(self.markers_data))
+        self.assertTrue(all(v is None for v in likelihoods.values()))
+
+    def test_samtools_likelihoods_match_gatk(self):
+        """
+        Test that a samtools mpileup of the same reads gives the same likelihoods as the GATK pileup
+        """
+        samtools_pileup = os.path.join(self.tmpdir, "example.samtools.pileup")
+        with open(pileup_10lines) as fin, open(samtools_pileup, "w") as fout:
+            for line in fin:
+                fout.write(gatk_to_samtools_line(line))
+        expected = genotype_likelihoods_for_markers(self.markers_data, pileup_10lines, min_map_quality=10, min_base_quality=20)
+        for num_threads in [1, 2]:
+            likelihoods = genotype_likelihoods_for_markers(self.markers_data, samtools_pileup, min_map_quality=10, min_base_quality=20, num_threads=num_threads)
+            self.assertEqual(sorted(likelihoods.keys()), sorted(expected.keys()))
+            for m in expected:
+                if expected[m] is None:
+                    self.assertEqual(likelihoods[m], None)
+                    continue
+                self.assertEqual(likelihoods[m]['coverage'], expected[m]['coverage'])
+                # the GATK parser multiplies the base probabilities in set order rather than read order, so only compare up to rounding
+                for value, expected_value in zip(likelihoods[m]['likelihoods'], expected[m]['likelihoods']):
+                    self.assertAlmostEqual(value / expected_value, 1.0, places = 12)
+
+
+    def test_pileup_without_mapq(self):
+        """
+        Test that a compressed pileup without mapping qualities is rejected from its first line when a min mapping quality is used,
+        and that a compressed pileup with them is read in full
+        """
+        samtools_pileup = os.path.join(self.tmpdir, "no_mq.pileup.gz")
+        with gzip.open(samtools_pileup, "wb") as fout:
+            fout.write(b'1\t881627\tG\t2\t.A\tII\n')
+        gatk_pileup = os.path.join(self.tmpdir, "example.pileup.gz")
+        with open(pileup_10lines, "rb") as fin:
+            with gzip.open(gatk_pileup, "wb") as fout:
+                fout.write(fin.read())
+        with self.assertRaises(ValueError) as context:
+            genotype_likelihoods_for_markers(self.markers_data, samtools_pileup, min_map_quality=10)
+        self.assertTrue(samtools_pileup in str(context.exception))
+        self.assertEqual(genotype_likelihoods_for_markers(self.markers_data, samtools_pileup)['1:881627']['coverage'], 2)
+        self.assertEqual(genotype_likelihoods_for_markers(self.markers_data, gatk_pileup, min_map_quality=10), genotype_likelihoods_for_markers(self.markers_data, pileup_10lines, min_map_quality=10))
+
+class TestSamtoolsPileup(unittest.TestCase):
+    def test_pileup2acgt(self):
+        """
+        Test decoding of the samtools read bases column
+        """
+        self.assertEqual(pileup2acgt('.,AcG*', 'T'), 'TTACG*')
+        self.assertEqual(pileup2acgt('^].$,+2AC.-12ACGTACGTACGTa<>', 'g'), 'GGGA>>')
+        # the mapping quality after '^' can look like an indel or a read end
+        self.assertEqual(pileup2acgt('^+.^$,^-a', 'C'), 'CCA')
+
+    def test_detect_pileup_format(self):
+        """
+        Test that GATK and samtools pileup lines are told apart
+        """
+        with open(pileup_10lines) as fin:
+            line = fin.readline()
+        self.assertEqual(detect_pileup_format(line), 'gatk')
+        self.assertEqual(detect_pileup_format(gatk_to_samtools_line(line)), 'samtools')
+        self.assertEqual(detect_pileup_format('1\t881627\tG\t0\t*\t*\n'), 'samtools')
+
+    def test_parse_samtools_line(self):
+        """
+        Test parsing a samtools pileup line with base and mapping quality filters
+        """
+        line = '1\t100\tA\t5\t.,^5Cg$*\tI5I+I\tI!III\n'
+        pileup = parse_samtools_mpileup_line(line)
+        self.assertEqual(pileup.Quals, {'A': [40, 20], 'C': [40], 'G': [10], 'T': []})
+        self.assertEqual(pileup.depth, 4)
+        pileup = parse_samtools_mpileup_line(line, min_map_quality=10, min_base_quality=15)
+        self.assertEqual(pileup.Quals, {'A': [40], 'C': [40], 'G': [], 'T': []})
+        pileup = parse_samtools_mpileup_line('1\t100\tA\t0\t*\t*\t*\n', min_map_quality=10)
+        self.assertEqual(pileup.depth, 0)
+
+    def test_parse_samtools_line_without_mapq(self):
+        """
+        Test that mapping quality filtering needs the --output-MQ column
+        """
+        line = '1\t100\tA\t2\t.C\tII\n'
+        self.assertEqual(parse_samtools_mpileup_line(line).depth, 2)
+        self.assertRaises(ValueError, parse_samtools_mpileup_line, line, min_map_quality=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the checkpoint module
+"""
+import os
+import unittest
+import shutil
+from tempfile import mkdtemp
+from checkpoint import Checkpointer, pair_key, read_finished_pairs
+
+fieldnames = ['concordance', 'num_markers_used', 'num_total_markers', 'tumor', 'normal', 'tumor_filename', 'normal_filename']
+header = '\t'.join(fieldnames) + '\n'
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.output_file = os.path.join(self.tmpdir, "concordance.tsv")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_output(self, text):
+        with open(self.output_file, "w") as fout:
+            fout.write(text)
+
+    def test_no_output_to_resume(self):
+        """
+        Test that a missing or empty output file means the run starts from scratch
+        """
+        self.assertEqual(read_finished_pairs(self.output_file, fieldnames), None)
+        self.write_output('')
+        self.assertEqual(read_finished_pairs(self.output_file, fieldnames), None)
+        # interrupted while writing the header
+        self.write_output('concordance\tnum_mark')
+        self.assertEqual(read_finished_pairs(self.output_file, fieldnames), None)
+        self.assertEqual(os.path.getsize(self.output_file), 0)
+
+    def test_read_finished_pairs(self):
+        """
+        Test that finished pairs are read back and a partly written last row is dropped
+        """
+        self.write_output(header +
+            '0.99\t10\t7387\tt1\tn1\tt1.pileup\tn1.pileup\n' +
+            '\t\t\tt1\tn2\tt1.pileup\tn2.pileup\n' +
+            '0.5\t10\t73')
+        finished = read_finished_pairs(self.output_file, fieldnames)
+        self.assertEqual(finished, set([
+            pair_key('/data/t1.pileup', '/data/n1.pileup', 't1', 'n1'),
+            pair_key('/data/t1.pileup', '/data/n2.pileup', 't1', 'n2')
+            ]))
+        with open(self.output_file) as fin:
+            self.assertTrue(fin.read().endswith('n2.pileup\n'))
+
+    def test_failed_pairs_are_not_finished(self):
+        """
+        Test that the rows of comparisons that timed out or failed are dropped so that those pairs are run again
+        """
+        status_header = '\t'.join(fieldnames + ['status']) + '\n'
+        ok_row = '0.99\t10\t7387\tt1\tn1\tt1.pileup\tn1.pileup\tok\n'
+        self.write_output(status_header + ok_row +
+            '\t\t\tt1\tn2\tt1.pileup\tn2.pileup\ttimeout\n' +
+            '\t\t\tt2\tn1\tt2.pileup\tn1.pileup\tfailed: ValueError: bad line\n')
+        finished = read_finished_pairs(self.output_file, fieldnames + ['status'])
+        self.assertEqual(finished, set([ pair_key('/data/t1.pileup', '/data/n1.pileup', 't1', 'n1') ]))
+        with open(self.output_file) as fin:
+            self.assertEqual(fin.read(), status_header + ok_row)
+
+    def test_different_columns(self):
+        """
+        Test that an output file with other columns is not resumed
+        """
+        self.write_output(header)
+        self.assertRaises(Exception, read_finished_pairs, self.output_file, fieldnames + ['tumor_filepath', 'normal_filepath'])
+
+    def test_checkpointer(self):
+        """
+        Test that rows are on disk after a checkpoint
+        """
+        fout = open(self.output_file, "w")
+        checkpointer = Checkpointer(fout, interval = 0)
+        fout.write(header)
+        checkpointer.update()
+        self.assertEqual(os.path.getsize(self.output_file), len(header))
+        fout.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
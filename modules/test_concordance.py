@@ -5,8 +5,12 @@ Unit tests for the concordance module
 """
 import os
 import unittest
-from concordance import concordance
-from ContaminationMarker import get_markers
+import pickle
+import threading
+import concordance as concordance_module
+from concordance import concordance, load_genotype_likelihoods, compare_genotype_likelihoods, sequential_compare_genotype_likelihoods, sequential_marker_order, init_sequential_worker
+from ContaminationMarker import get_markers, genotype_likelihoods_for_markers
+from genotype_likelihoods import GenotypeLikelihoods
 import tempfile
 import shutil
 
@@ -89,9 +93,131 @@ class TestCocordance(unittest.TestCase):
         self.assertEqual(num_markers_used, 7363)
         self.assertEqual(num_total_markers, 7387)
 
+    @unittest.skipIf(not hasattr(os, 'mkfifo'), "named pipes are not available")
+    def test_load_pickle_from_fifo(self):
+        """
+        Test that likelihoods pickled into a named pipe are recognized from their contents and used for concordance
+        """
+        pileup = os.path.join(PILEUP_DIR, 'NA12878_normal40x.gatk.pileup.10lines.txt')
+        markers_data = get_markers(marker_file)
+        likelihoods = genotype_likelihoods_for_markers(markers_data, pileup, min_map_quality=10, min_base_quality=20)
+
+        tmpdirpath = tempfile.mkdtemp()
+        fifo = os.path.join(tmpdirpath, "likelihoods.fifo")
+        os.mkfifo(fifo)
+        def writer():
+            with open(fifo, 'wb') as fout:
+                pickle.dump(likelihoods, fout)
+        thread = threading.Thread(target = writer)
+        thread.start()
+        loaded = load_genotype_likelihoods(fifo, markers_data)
+        thread.join()
+        shutil.rmtree(tmpdirpath)
+        self.assertEqual(loaded, likelihoods)
+
+        concordance_val, num_markers_used, num_total_markers = concordance(tumor_pileup = loaded, normal_pileup = pileup, markers_data = markers_data, min_cov = 1)
+        self.assertEqual(concordance_val, 1.0)
+        self.assertEqual(num_markers_used, 10)
+        self.assertEqual(num_total_markers, 7387)
+
+
+
+class TestSequentialConcordance(unittest.TestCase):
+    def setUp(self):
+        self.markers_data = get_markers(marker_file)
+        self.genotypes = [ [0.8, 0.1, 0.1], [0.1, 0.8, 0.1], [0.1, 0.1, 0.8] ]
+
+    def make_likelihoods(self, genotype_of_marker, coverage = 20):
+        """
+        Make fake genotype likelihoods with the given most likely genotype index for each marker
+        """
+        return(dict([ (m, {'coverage': coverage, 'likelihoods': self.genotypes[genotype_of_marker(i)]}) for i, m in enumerate(self.markers_data) ]))
 
+    def test_marker_order(self):
+        """
+        Test that the marker order is a fixed shuffle of all the markers
+        """
+        order = sequential_marker_order(self.markers_data)
+        self.assertEqual(order, sequential_marker_order(self.markers_data))
+        self.assertEqual(sorted(order), sorted(self.markers_data.keys()))
+        self.assertNotEqual(order, list(self.markers_data.keys()))
+        self.assertNotEqual(order, sequential_marker_order(self.markers_data, seed = 1))
 
+    def test_match_gets_exact_concordance(self):
+        """
+        Test that a match is decided early and its concordance is computed over all the markers
+        """
+        tumor = self.make_likelihoods(lambda i: i % 3)
+        normal = self.make_likelihoods(lambda i: i % 3 if i % 100 else (i + 1) % 3)
+        concordance_val, num_markers_used, num_total_markers, markers_consumed, decision = sequential_compare_genotype_likelihoods(tumor, normal, self.markers_data)
+        self.assertEqual(decision, "match")
+        self.assertTrue(markers_consumed < 100)
+        self.assertEqual((concordance_val, num_markers_used, num_total_markers), compare_genotype_likelihoods(tumor, normal, self.markers_data))
+
+    def test_nonmatch_stops_early(self):
+        """
+        Test that samples from different individuals are decided after a few markers
+        """
+        tumor = self.make_likelihoods(lambda i: i % 3)
+        normal = self.make_likelihoods(lambda i: (i // 3) % 3)
+        concordance_val, num_markers_used, num_total_markers, markers_consumed, decision = sequential_compare_genotype_likelihoods(tumor, normal, self.markers_data, error_rate = 0.0001)
+        self.assertEqual(decision, "nonmatch")
+        self.assertTrue(markers_consumed < 100)
+        self.assertEqual(num_markers_used, markers_consumed)
+        self.assertEqual(num_total_markers, 7387)
+        self.assertTrue(concordance_val < 0.6)
 
+    def test_undecided(self):
+        """
+        Test that a pair is undecided when the markers run out first, and that no usable markers raises ZeroDivisionError
+        """
+        tumor = self.make_likelihoods(lambda i: 0)
+        normal = self.make_likelihoods(lambda i: 0, coverage = 5)
+        self.assertRaises(ZeroDivisionError, sequential_compare_genotype_likelihoods, tumor, normal, self.markers_data, min_cov = 10)
+        normal = self.make_likelihoods(lambda i: 0)
+        for m in list(normal)[2:]:
+            normal[m] = None
+        self.assertEqual(sequential_compare_genotype_likelihoods(tumor, normal, self.markers_data), (1.0, 2, 7387, 2, "undecided"))
+
+    def test_genotype_likelihoods_same_as_dicts(self):
+        """
+        Test that the sequential test on GenotypeLikelihoods arrays gives the same results as on the dicts, stopping at the same marker
+        """
+        tumor = self.make_likelihoods(lambda i: i % 3)
+        normals = [
+            self.make_likelihoods(lambda i: i % 3 if i % 100 else (i + 1) % 3),
+            self.make_likelihoods(lambda i: (i // 3) % 3),
+            self.make_likelihoods(lambda i: i % 3 if i % 2 else (i + 1) % 3)
+            ]
+        normals[2][list(normals[2])[0]] = None
+        block_size = concordance_module.SEQUENTIAL_BLOCK_SIZE
+        try:
+            # small blocks so that the test also crosses its bounds in later blocks
+            for concordance_module.SEQUENTIAL_BLOCK_SIZE in [block_size, 1, 3]:
+                for normal in normals:
+                    for normal_homozygous_markers_only in [False, True]:
+                        expected = sequential_compare_genotype_likelihoods(tumor, normal, self.markers_data, normal_homozygous_markers_only = normal_homozygous_markers_only)
+                        tumor_arrays = GenotypeLikelihoods.from_dict(tumor, self.markers_data)
+                        normal_arrays = GenotypeLikelihoods.from_dict(normal, self.markers_data)
+                        self.assertEqual(sequential_compare_genotype_likelihoods(tumor_arrays, normal_arrays, self.markers_data, normal_homozygous_markers_only = normal_homozygous_markers_only), expected)
+                        self.assertEqual(sequential_compare_genotype_likelihoods(tumor_arrays, normal, self.markers_data, normal_homozygous_markers_only = normal_homozygous_markers_only), expected)
+        finally:
+            concordance_module.SEQUENTIAL_BLOCK_SIZE = block_size
+
+    def test_worker_marker_order(self):
+        """
+        Test that a pool process uses the marker order from its initializer when none is given
+        """
+        tumor = GenotypeLikelihoods.from_dict(self.make_likelihoods(lambda i: i % 3), self.markers_data)
+        normal = GenotypeLikelihoods.from_dict(self.make_likelihoods(lambda i: (i // 3) % 3), self.markers_data)
+        marker_order = sequential_marker_order(self.markers_data, seed = 1)
+        expected = sequential_compare_genotype_likelihoods(tumor, normal, self.markers_data, marker_order = marker_order)
+        self.assertNotEqual(expected, sequential_compare_genotype_likelihoods(tumor, normal, self.markers_data))
+        init_sequential_worker(self.markers_data, marker_order)
+        try:
+            self.assertEqual(sequential_compare_genotype_likelihoods(tumor, normal, self.markers_data), expected)
+        finally:
+            concordance_module._worker_marker_order = None
 
 
 if __name__ == "__main__":
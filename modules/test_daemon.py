@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the daemon module
+"""
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+# the daemon module uses package relative imports
+sys.path.insert(0, PARENT_DIR)
+from modules.daemon import ConcordanceService, ConcordanceServer, remove_stale_socket
+from modules.daemon_client import send_request
+from modules.ContaminationMarker import get_markers
+PILEUP_DIR = os.path.join(PARENT_DIR, "data", "example", "pileup")
+pileup_10lines = os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt")
+marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+markers_data = get_markers(marker_file)
+
+class TestConcordanceService(unittest.TestCase):
+    def setUp(self):
+        self.service = ConcordanceService(markers_data, min_cov = 1, cache_size = 1)
+
+    def test_concordance(self):
+        """
+        Test that a sample compared to itself by path and by loaded name is fully concordant
+        """
+        response = self.service.handle({'command': 'concordance', 'tumor': pileup_10lines, 'normal': pileup_10lines})
+        self.assertEqual(response, {'ok': True, 'concordance': 1.0, 'num_markers_used': 10, 'num_total_markers': 7387})
+        self.service.handle({'command': 'load', 'pileup': pileup_10lines, 'name': 'NA12878'})
+        response = self.service.handle({'command': 'concordance', 'tumor': pileup_10lines, 'normal': 'NA12878'})
+        self.assertEqual(response['concordance'], 1.0)
+
+    def test_no_shared_markers(self):
+        """
+        Test that a pair without markers over the minimum coverage has no values instead of an error
+        """
+        response = self.service.handle({'command': 'concordance', 'tumor': pileup_10lines, 'normal': pileup_10lines, 'min_cov': 10000})
+        self.assertEqual(response, {'ok': True, 'concordance': None, 'num_markers_used': None, 'num_total_markers': None})
+
+    def test_match(self):
+        """
+        Test that matches are sorted with the best first and limited to the top
+        """
+        self.service.add_reference(pileup_10lines, name = 'NA12878', likelihoods = self.service.likelihoods(pileup_10lines))
+        self.service.add_reference(pileup_10lines, name = 'empty', likelihoods = dict( (marker, None) for marker in markers_data ))
+        response = self.service.handle({'command': 'match', 'sample': pileup_10lines, 'top': 2})
+        self.assertEqual([ match['name'] for match in response['matches'] ], ['NA12878', 'empty'])
+        self.assertEqual(response['matches'][0]['concordance'], 1.0)
+        self.assertEqual(response['matches'][1]['concordance'], None)
+        response = self.service.handle({'command': 'match', 'sample': 'NA12878'})
+        self.assertEqual(len(response['matches']), 1)
+
+    def test_cache(self):
+        """
+        Test that a file is loaded once while it is cached and not modified
+        """
+        likelihoods = self.service.likelihoods(pileup_10lines)
+        self.assertTrue(self.service.likelihoods(pileup_10lines) is likelihoods)
+        self.assertEqual(list(self.service.cache.keys()), [pileup_10lines])
+
+    def test_errors(self):
+        """
+        Test that bad requests get an error response
+        """
+        response = self.service.handle({'command': 'foo'})
+        self.assertEqual(response, {'ok': False, 'error': 'Unknown command: foo'})
+        response = self.service.handle({'command': 'concordance', 'tumor': pileup_10lines})
+        self.assertEqual(response, {'ok': False, 'error': 'Missing argument: normal'})
+        response = self.service.handle({'command': 'concordance', 'tumor': 'NA12878', 'normal': pileup_10lines})
+        self.assertFalse(response['ok'])
+        response = self.service.handle({'command': 'unload', 'name': 'NA12878'})
+        self.assertFalse(response['ok'])
+
+class TestConcordanceServer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmpdir, "conpair.sock")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_requests(self):
+        """
+        Test requests over the socket of a running server, up to a shutdown
+        """
+        service = ConcordanceService(markers_data, min_cov = 1)
+        server = ConcordanceServer(self.socket_path, service)
+        thread = threading.Thread(target = server.serve_forever)
+        thread.start()
+        try:
+            # only the owner can connect
+            self.assertEqual(os.stat(self.socket_path).st_mode & 0o777, 0o600)
+            response = send_request(self.socket_path, {'command': 'load', 'pileup': pileup_10lines, 'name': 'NA12878'}, timeout = 30)
+            self.assertEqual(response, {'ok': True, 'name': 'NA12878'})
+            response = send_request(self.socket_path, {'command': 'concordance', 'tumor': pileup_10lines, 'normal': 'NA12878'}, timeout = 30)
+            self.assertEqual(response['concordance'], 1.0)
+            response = send_request(self.socket_path, {'command': 'status'}, timeout = 30)
+            self.assertEqual(response['references'], [{'name': 'NA12878', 'pileup': pileup_10lines}])
+            self.assertRaises(Exception, remove_stale_socket, self.socket_path)
+            response = send_request(self.socket_path, {'command': 'shutdown'}, timeout = 30)
+            self.assertEqual(response, {'ok': True})
+            thread.join(30)
+            self.assertFalse(thread.is_alive())
+        finally:
+            if thread.is_alive():
+                server.shutdown()
+            server.server_close()
+        self.assertFalse(os.path.exists(self.socket_path))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the distributed module
+"""
+import unittest
+import threading
+from distributed import Coordinator, make_batches, connect, run_worker
+
+authkey = b'test'
+
+def execute(pairs, config):
+    if any(pair[2] == 'bad' for pair in pairs):
+        raise ValueError("bad pair")
+    return([ pair + (config['value'],) for pair in pairs ])
+
+class TestDistributed(unittest.TestCase):
+    def setUp(self):
+        self.pairs = [ ('t{0}.pileup'.format(i), 'n.pileup', 't{0}'.format(i), 'n') for i in range(10) ]
+
+    def start_worker(self, address, results):
+        thread = threading.Thread(target = lambda: results.append(run_worker(address, authkey, execute, timeout = 10)))
+        thread.start()
+        return(thread)
+
+    def test_make_batches(self):
+        """
+        Test splitting the pairs into batches
+        """
+        self.assertEqual([ len(batch) for batch in make_batches(self.pairs, 4) ], [4, 4, 2])
+        self.assertEqual(make_batches([], 4), [])
+
+    def test_coordinator(self):
+        """
+        Test that the results of all the batches come back from several workers
+        """
+        coordinator = Coordinator(self.pairs, {'value': 1}, authkey = authkey, batch_size = 3)
+        coordinator.start()
+        num_batches = []
+        workers = [ self.start_worker(coordinator.address, num_batches) for i in range(2) ]
+        results = list(coordinator.results())
+        for worker in workers:
+            worker.join()
+        self.assertEqual(sorted(results), sorted([ pair + (1,) for pair in self.pairs ]))
+        self.assertEqual(sum(num_batches), 4)
+
+    def test_lost_worker(self):
+        """
+        Test that the batch of a worker that disconnects goes to another worker
+        """
+        coordinator = Coordinator(self.pairs, {'value': 1}, authkey = authkey, batch_size = 3)
+        coordinator.start()
+        # take a batch and leave without doing it
+        conn = connect(coordinator.address, authkey)
+        conn.recv()
+        conn.send(('ready',))
+        message = conn.recv()
+        self.assertEqual(message[0], 'batch')
+        conn.close()
+        num_batches = []
+        worker = self.start_worker(coordinator.address, num_batches)
+        results = list(coordinator.results())
+        worker.join()
+        self.assertEqual(sorted(results), sorted([ pair + (1,) for pair in self.pairs ]))
+        self.assertEqual(num_batches, [4])
+
+    def test_failed_batch(self):
+        """
+        Test that a batch that keeps failing is given up on without taking down the workers
+        """
+        pairs = self.pairs[0:3] + [('bad.pileup', 'n.pileup', 'bad', 'n')] + self.pairs[3:]
+        coordinator = Coordinator(pairs, {'value': 1}, authkey = authkey, batch_size = 3, max_attempts = 2)
+        coordinator.start()
+        num_batches = []
+        workers = [ self.start_worker(coordinator.address, num_batches) for i in range(2) ]
+        results = list(coordinator.results())
+        for worker in workers:
+            worker.join()
+        # the second batch has the bad pair
+        self.assertEqual(sorted(results), sorted([ pair + (1,) for pair in pairs[0:3] + pairs[6:] ]))
+        self.assertEqual([ batch_id for batch_id, error in coordinator.failed ], [1])
+        self.assertEqual(coordinator.failed[0][1], "ValueError: bad pair")
+        self.assertEqual(sum(num_batches), 3)
+
+    def test_idle_timeout(self):
+        """
+        Test that the coordinator stops waiting when no worker is connected
+        """
+        coordinator = Coordinator(self.pairs, {'value': 1}, authkey = authkey, batch_size = 3, idle_timeout = 0.5)
+        coordinator.start()
+        self.assertRaises(Exception, list, coordinator.results())
+        self.assertTrue(coordinator.finished.is_set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the genotype_likelihoods module
+"""
+import os
+import random
+import pickle
+import unittest
+from genotype_likelihoods import GenotypeLikelihoods, get_panel
+from concordance import compare_genotype_likelihoods
+from ContaminationMarker import get_markers, genotype_likelihoods_for_markers
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+PILEUP_DIR = os.path.join(PARENT_DIR, "data", "example", "pileup")
+pileup_10lines = os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt")
+marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+
+class TestGenotypeLikelihoods(unittest.TestCase):
+    def setUp(self):
+        self.markers_data = get_markers(marker_file)
+        # ties between genotypes, missing markers and a range of coverage around the minimum
+        genotypes = [ [0.8, 0.1, 0.1], [0.1, 0.8, 0.1], [0.1, 0.1, 0.8], [0.4, 0.4, 0.2], [0.0, 0.0, 0.0] ]
+        rand = random.Random(0)
+        def fake_likelihoods():
+            return(dict([ (m, None if rand.random() < 0.2 else {'coverage': rand.randint(0, 20), 'likelihoods': rand.choice(genotypes)}) for m in self.markers_data ]))
+        self.tumor = fake_likelihoods()
+        self.normal = fake_likelihoods()
+
+    def test_from_dict(self):
+        """
+        Test that the arrays hold the same values as the dict and can be read back as one
+        """
+        likelihoods = genotype_likelihoods_for_markers(self.markers_data, pileup_10lines, min_map_quality = 10, min_base_quality = 20)
+        arrays = GenotypeLikelihoods.from_dict(likelihoods, self.markers_data)
+        self.assertEqual(arrays, likelihoods)
+        self.assertEqual(arrays.to_dict(), likelihoods)
+        self.assertEqual(len(arrays), len(self.markers_data))
+        self.assertEqual(int(arrays.present.sum()), 10)
+        for m, value in likelihoods.items():
+            self.assertEqual(arrays[m], value)
+        self.assertEqual(arrays.get('foo:1', 'missing'), 'missing')
+        self.assertRaises(KeyError, lambda: arrays['foo:1'])
+
+    def test_calls(self):
+        """
+        Test that the calls are the first most likely genotype, or -1 for missing markers
+        """
+        arrays = GenotypeLikelihoods.from_dict(self.tumor, self.markers_data)
+        for i, m in enumerate(self.markers_data):
+            if self.tumor[m] is None:
+                self.assertEqual(arrays.calls[i], -1)
+            else:
+                self.assertEqual(arrays.calls[i], self.tumor[m]['likelihoods'].index(max(self.tumor[m]['likelihoods'])))
+
+    def test_compare(self):
+        """
+        Test that the vectorized comparison gives the same values as comparing one marker at a time, on the whole panel and on a subset
+        """
+        tumor = GenotypeLikelihoods.from_dict(self.tumor, self.markers_data)
+        normal = GenotypeLikelihoods.from_dict(self.normal, self.markers_data)
+        subset = dict( (m, self.markers_data[m]) for m in list(self.markers_data)[::7] )
+        for markers_data in [self.markers_data, subset]:
+            for normal_homozygous_markers_only in [False, True]:
+                for min_cov in [0, 10]:
+                    expected = compare_genotype_likelihoods(self.tumor, self.normal, markers_data, normal_homozygous_markers_only = normal_homozygous_markers_only, min_cov = min_cov)
+                    result = compare_genotype_likelihoods(tumor, normal, markers_data, normal_homozygous_markers_only = normal_homozygous_markers_only, min_cov = min_cov)
+                    self.assertEqual(result, expected)
+        # a sample loaded against a subset of the markers is compared on its own positions
+        subset_normal = GenotypeLikelihoods.from_dict(self.normal, subset)
+        self.assertEqual(compare_genotype_likelihoods(tumor, subset_normal, subset), compare_genotype_likelihoods(self.tumor, self.normal, subset))
+
+    def test_no_shared_markers(self):
+        """
+        Test that a pair without any markers to use raises a ZeroDivisionError like the dict comparison
+        """
+        tumor = GenotypeLikelihoods.from_dict(self.tumor, self.markers_data)
+        empty = GenotypeLikelihoods.from_dict({}, self.markers_data)
+        self.assertRaises(ZeroDivisionError, compare_genotype_likelihoods, tumor, empty, self.markers_data)
+
+    def test_pickle(self):
+        """
+        Test that pickled likelihoods are loaded back equal, and share the marker panel of the process
+        """
+        arrays = GenotypeLikelihoods.from_dict(self.tumor, self.markers_data)
+        loaded = pickle.loads(pickle.dumps(arrays, 2))
+        self.assertEqual(loaded, arrays)
+        self.assertTrue(loaded.panel is arrays.panel)
+        self.assertTrue(get_panel(self.markers_data) is arrays.panel)
+
+if __name__ == "__main__":
+    unittest.main()
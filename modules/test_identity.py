@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the identity module
+"""
+import os
+import unittest
+from collections import OrderedDict
+from ContaminationMarker import get_markers
+from concordance import compare_genotype_likelihoods
+from identity import make_blocks, default_block_size, run_parallel_identity, group_samples, find_unexpected_groupings
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+
+class TestIdentity(unittest.TestCase):
+    def setUp(self):
+        # a few hundred markers are enough to tell the individuals apart
+        self.markers_data = OrderedDict(list(get_markers(marker_file).items())[0:300])
+        genotypes = [ [0.8, 0.1, 0.1], [0.1, 0.8, 0.1], [0.1, 0.1, 0.8] ]
+        # samples 0, 2 and 4 are one individual, 1 and 3 another one, and 5 a third one
+        individual_genotypes = [ lambda i: i % 3, lambda i: (i // 3) % 3, lambda i: (i // 9) % 3 ]
+        self.samples = []
+        for individual in [0, 1, 0, 1, 0, 2]:
+            self.samples.append(dict([ (m, {'coverage': 20, 'likelihoods': genotypes[individual_genotypes[individual](i)]}) for i, m in enumerate(self.markers_data) ]))
+
+    def test_blocks(self):
+        """
+        Test splitting the samples into blocks
+        """
+        self.assertEqual(make_blocks(5, 2), [(0, 2), (2, 4), (4, 5)])
+        self.assertEqual(make_blocks(5, 5), [(0, 5)])
+        self.assertEqual(default_block_size(100, 1), 50)
+        self.assertEqual(default_block_size(100, 4), 25)
+        self.assertEqual(default_block_size(2, 8), 1)
+
+    def test_upper_triangle(self):
+        """
+        Test that every pair of different samples is compared exactly once, whatever the block size
+        """
+        expected = []
+        for i in range(len(self.samples)):
+            for j in range(i + 1, len(self.samples)):
+                expected.append((i, j) + compare_genotype_likelihoods(self.samples[i], self.samples[j], self.markers_data))
+        for block_size in [1, 2, 4, None]:
+            results = list(run_parallel_identity(self.samples, self.markers_data, 2, 10, False, 10, 20, block_size = block_size))
+            self.assertEqual(sorted(results), expected)
+
+    def test_group_samples(self):
+        """
+        Test that samples are grouped with union-find at the concordance threshold
+        """
+        results = list(run_parallel_identity(self.samples, self.markers_data, 2, 10, False, 10, 20))
+        self.assertEqual(group_samples(len(self.samples), results, threshold = 0.8), [1, 2, 1, 2, 1, 3])
+        # groups are joined through a chain of matching pairs
+        chain = [(0, 1, 0.9, 100, 100), (1, 2, 0.9, 100, 100), (2, 3, 0.4, 100, 100), (0, 3, None, None, None)]
+        self.assertEqual(group_samples(4, chain, threshold = 0.8), [1, 1, 1, 2])
+
+    def test_unexpected_groupings(self):
+        """
+        Test that mixed groups and split individuals are reported
+        """
+        names = ['a_tumor', 'a_normal', 'b_tumor', 'b_normal']
+        individuals = {'a_tumor': 'a', 'a_normal': 'a', 'b_tumor': 'b', 'b_normal': 'b'}
+        self.assertEqual(find_unexpected_groupings(names, [1, 1, 2, 2], individuals), ['', '', '', ''])
+        # b_tumor matches a
+        problems = find_unexpected_groupings(names, [1, 1, 1, 2], individuals)
+        self.assertEqual(problems[0], "group has individuals a,b")
+        self.assertEqual(problems[2], "group has individuals a,b; individual is in groups 1,2")
+        self.assertEqual(problems[3], "individual is in groups 1,2")
+        # without expected individuals, every sample is its own individual
+        self.assertEqual(find_unexpected_groupings(names, [1, 2, 3, 3]), ['', '', 'group has individuals b_normal,b_tumor', 'group has individuals b_normal,b_tumor'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,7 +8,8 @@ import json
 import unittest
 import shutil
 from tempfile import mkdtemp
-from loader import load_comparisons
+import loader
+from loader import load_comparisons, load_samples, LabeledPairs, FilteredPairs, pair_inputs
 
 # need to get the path to some sample files
 THIS_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -36,7 +37,7 @@ class TestLoadComparisons(unittest.TestCase):
             "NA12878_tumor80x",
             "NA12878_normal40x"
             )]
-        self.assertEqual(labeled_pairs, expected_pairs)
+        self.assertEqual(list(labeled_pairs), expected_pairs)
         self.assertEqual(num_tumors_loaded, 1)
         self.assertEqual(num_normals_loaded, 1)
 
@@ -51,7 +52,7 @@ class TestLoadComparisons(unittest.TestCase):
             (tumor_file, os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt"), "NA12878_tumor80x", "NA12878_normal40x"),
             (tumor_file, os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.txt"), "NA12878_tumor80x", "NA12878_normal40x"),
             ]
-        self.assertEqual(labeled_pairs, expected_pairs)
+        self.assertEqual(list(labeled_pairs), expected_pairs)
         self.assertEqual(num_tumors_loaded, 1)
         self.assertEqual(num_normals_loaded, 2)
 
@@ -84,7 +85,7 @@ class TestLoadComparisons(unittest.TestCase):
                 "NA12878-2_tumor80x",
                 "NA12878_normal40x"),
             ]
-        self.assertEqual(labeled_pairs, expected_pairs)
+        self.assertEqual(list(labeled_pairs), expected_pairs)
         self.assertEqual(num_tumors_loaded, 2)
         self.assertEqual(num_normals_loaded, 2)
 
@@ -101,7 +102,7 @@ class TestLoadComparisons(unittest.TestCase):
         expected_pairs = [
             (tumor_file, os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt"), "NA12878_tumor80x", "NA12878_normal40x"),
             ]
-        self.assertEqual(labeled_pairs, expected_pairs)
+        self.assertEqual(list(labeled_pairs), expected_pairs)
         self.assertEqual(num_tumors_loaded, 1)
         self.assertEqual(num_normals_loaded, 1)
 
@@ -120,7 +121,7 @@ class TestLoadComparisons(unittest.TestCase):
             (tumor_file, os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt"), "NA12878_tumor80x", "NA12878_normal40x"),
             (tumor_file, os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.txt"), "NA12878_tumor80x", "NA12878_normal40x"),
             ]
-        self.assertEqual(labeled_pairs, expected_pairs)
+        self.assertEqual(list(labeled_pairs), expected_pairs)
         self.assertEqual(num_tumors_loaded, 1)
         self.assertEqual(num_normals_loaded, 2)
 
@@ -136,7 +137,7 @@ class TestLoadComparisons(unittest.TestCase):
             "NA12878",
             "NA12878_normal40x"
             )]
-        self.assertEqual(labeled_pairs, expected_pairs)
+        self.assertEqual(list(labeled_pairs), expected_pairs)
         self.assertEqual(num_tumors_loaded, 1)
         self.assertEqual(num_normals_loaded, 1)
 
@@ -158,10 +159,82 @@ class TestLoadComparisons(unittest.TestCase):
             "NA12878_foo",
             "NA12878_normal40x"
             )]
-        self.assertEqual(labeled_pairs, expected_pairs)
+        self.assertEqual(list(labeled_pairs), expected_pairs)
         self.assertEqual(num_tumors_loaded, 1)
         self.assertEqual(num_normals_loaded, 1)
 
+    def test_load_stdin1(self):
+        """
+        Load the tumor from stdin, which is passed through as "-"
+        """
+        normal_file = os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt")
+        labeled_pairs, num_tumors_loaded, num_normals_loaded = load_comparisons(tumor = "-", normal = normal_file)
+        expected_pairs = [("-",
+            normal_file,
+            "-",
+            "NA12878_normal40x"
+            )]
+        self.assertEqual(list(labeled_pairs), expected_pairs)
+        self.assertEqual(num_tumors_loaded, 1)
+        self.assertEqual(num_normals_loaded, 1)
+
+    def test_load_names_once1(self):
+        """
+        Each file's sample name is resolved only once, and the pairs are made lazily
+        """
+        tumors_list = os.path.join(self.tmpdir, "tumors.txt")
+        normals_list = os.path.join(self.tmpdir, "normals.txt")
+        tumor_files = [ os.path.join(self.tmpdir, "tumor{0}.pileup".format(i)) for i in range(3) ]
+        normal_files = [ os.path.join(self.tmpdir, "normal{0}.pileup".format(i)) for i in range(4) ]
+        with open(tumors_list, "w") as fout:
+            fout.write('\n'.join(tumor_files + normal_files[0:1]))
+        with open(normals_list, "w") as fout:
+            fout.write('\n'.join(normal_files))
+        calls = []
+        get_sample_name = loader.get_sample_name
+        def counting_get_sample_name(filepath, **kwargs):
+            calls.append(filepath)
+            return(get_sample_name(filepath, **kwargs))
+        loader.get_sample_name = counting_get_sample_name
+        try:
+            labeled_pairs, num_tumors_loaded, num_normals_loaded = load_comparisons(tumors_list = tumors_list, normals_list = normals_list, use_manifests = True)
+        finally:
+            loader.get_sample_name = get_sample_name
+        self.assertEqual(sorted(calls), sorted(tumor_files + normal_files))
+        self.assertEqual(len(labeled_pairs), 16)
+        self.assertEqual(num_tumors_loaded, 4)
+        self.assertEqual(num_normals_loaded, 4)
+        pairs = list(labeled_pairs)
+        self.assertEqual(pairs, list(labeled_pairs))
+        self.assertEqual(pairs[0], (tumor_files[0], normal_files[0], "tumor0", "normal0"))
+        self.assertEqual(pairs[-1], (normal_files[0], normal_files[3], "normal0", "normal3"))
+
+    def test_filtered_pairs1(self):
+        """
+        Filtered pairs are made lazily, can be iterated more than once, and list their inputs without going through every pair
+        """
+        labeled_pairs = LabeledPairs([("t1", "T1"), ("t2", "T2")], [("n1", "N1"), ("n2", "N2"), ("n3", "N3")])
+        self.assertEqual(list(pair_inputs(labeled_pairs)), ["t1", "t2", "n1", "n2", "n3"])
+        filtered_pairs = FilteredPairs(labeled_pairs, lambda pair: pair[1] != "n2")
+        self.assertEqual(len(filtered_pairs), 4)
+        self.assertEqual(list(filtered_pairs), [("t1", "n1", "T1", "N1"), ("t1", "n3", "T1", "N3"), ("t2", "n1", "T2", "N1"), ("t2", "n3", "T2", "N3")])
+        self.assertEqual(list(filtered_pairs), list(filtered_pairs))
+        self.assertEqual(len(FilteredPairs(filtered_pairs, lambda pair: pair[0] == "t2")), 2)
+        self.assertEqual(list(pair_inputs(filtered_pairs))[0:4], ["t1", "n1", "t1", "n3"])
+
+    def test_load_samples1(self):
+        """
+        Load a single list of samples from a file list
+        """
+        samples_list = os.path.join(self.tmpdir, "samples.txt")
+        tumor_file = os.path.join(PILEUP_DIR, "NA12878_tumor80x.gatk.pileup.txt")
+        normal_file = os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.txt")
+        with open(samples_list, "w") as fout:
+            fout.write(tumor_file + '\n\n' + normal_file + '\n')
+        samples = load_samples(samples_list = samples_list)
+        self.assertEqual(samples, [(tumor_file, "NA12878_tumor80x"), (normal_file, "NA12878_normal40x")])
+        self.assertEqual(load_samples(samples_list = samples_list, num_samples = '1'), samples[0:1])
+        self.assertRaises(Exception, load_samples)
 
 
 
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the matrix module
+"""
+import os
+import unittest
+import shutil
+from tempfile import mkdtemp
+import numpy as np
+from matrix import ConcordanceMatrix
+
+class TestMatrix(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.pairs = [ ('/data/{0}.pileup'.format(tumor), '/data/{0}.pileup'.format(normal), tumor, normal) for tumor in ['t1', 't2'] for normal in ['n1', 'n2', 'n3'] ]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_from_pairs(self):
+        """
+        Test that the rows and columns follow the order of the pairs
+        """
+        matrix = ConcordanceMatrix.from_pairs(self.pairs)
+        self.assertEqual(matrix.tumors, [('/data/t1.pileup', 't1'), ('/data/t2.pileup', 't2')])
+        self.assertEqual([ name for pileup, name in matrix.normals ], ['n1', 'n2', 'n3'])
+        self.assertEqual(matrix.concordance.shape, (2, 3))
+        self.assertFalse(matrix.computed.any())
+
+    def test_save_and_load(self):
+        """
+        Test that the results written to a file come back the same, by row, and that pairs without values keep None
+        """
+        matrix = ConcordanceMatrix.from_pairs(self.pairs)
+        results = [
+            self.pairs[4] + (0.25, 100, 7387),
+            self.pairs[0] + (0.98, 120, 7387),
+            self.pairs[2] + (None, None, None)
+        ]
+        for result in results:
+            matrix.add(*result)
+        output_file = os.path.join(self.tmpdir, 'concordance.npz')
+        matrix.save(output_file)
+        self.assertTrue(os.path.exists(output_file))
+
+        loaded = ConcordanceMatrix.load(output_file)
+        self.assertEqual(loaded.tumors, matrix.tumors)
+        self.assertEqual(loaded.normals, matrix.normals)
+        self.assertEqual(list(loaded.results()), [results[1], results[2], results[0]])
+        self.assertEqual(int(loaded.computed.sum()), 3)
+        self.assertTrue(np.isnan(loaded.concordance[0, 2]))
+
+    def test_not_a_matrix(self):
+        """
+        Test that other .npz files are rejected
+        """
+        other_file = os.path.join(self.tmpdir, 'other.npz')
+        with open(other_file, "wb") as fout:
+            np.savez(fout, values = np.zeros(3))
+        self.assertRaises(Exception, ConcordanceMatrix.load, other_file)
+
+
+if __name__ == "__main__":
+    unittest.main()
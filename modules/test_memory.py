@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the memory module
+"""
+import unittest
+from multiprocessing import Pool
+import memory
+
+def allocate(num_bytes):
+    data = bytearray(num_bytes)
+    return(len(data))
+
+class TestMemory(unittest.TestCase):
+    def test_parse_size(self):
+        """
+        Test reading memory sizes with and without units
+        """
+        self.assertEqual(memory.parse_size('1000'), 1000)
+        self.assertEqual(memory.parse_size('16G'), 16 * 1024 ** 3)
+        self.assertEqual(memory.parse_size('1.5m'), int(1.5 * 1024 ** 2))
+        self.assertEqual(memory.parse_size('512MB'), 512 * 1024 ** 2)
+        self.assertRaises(ValueError, memory.parse_size, '16 gigs')
+        self.assertEqual(memory.format_size(3 * 1024 ** 3), '3.0G')
+
+    def test_peak_rss(self):
+        """
+        Test that the peak of the workers is measured once they have exited
+        """
+        if memory.peak_rss() is None:
+            self.skipTest("getrusage is not available")
+        self.assertTrue(memory.peak_rss() > 0)
+        pool = Pool(1)
+        pool.apply(allocate, (200 * 1024 ** 2, ))
+        pool.close()
+        pool.join()
+        self.assertTrue(memory.peak_worker_rss() >= 200 * 1024 ** 2)
+        self.assertTrue(memory.peak_total_rss(2) >= memory.peak_rss() + 2 * 200 * 1024 ** 2)
+
+    def test_plan_workers(self):
+        """
+        Test that the number of workers is limited by the budget, but is at least one
+        """
+        num_markers = 10000
+        per_worker = memory.worker_bytes(num_markers, 2)
+        used = memory.peak_rss() or 0
+        self.assertEqual(memory.plan_workers(used + 3 * per_worker, 8, num_markers, 2), 3)
+        self.assertEqual(memory.plan_workers(used + 3 * per_worker, 2, num_markers, 2), 2)
+        self.assertEqual(memory.plan_workers(used, 8, num_markers, 2), 1)
+
+    def test_plan_resident_sets(self):
+        """
+        Test the number of likelihood sets that fit
+        """
+        num_markers = 10000
+        self.assertEqual(memory.plan_resident_sets(10 * memory.likelihoods_bytes(num_markers), num_markers), 10)
+        self.assertEqual(memory.plan_resident_sets(-1, num_markers, minimum = 2), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
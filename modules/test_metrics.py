@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the metrics module
+"""
+import os
+import json
+import unittest
+import shutil
+from tempfile import mkdtemp
+import metrics
+from ContaminationMarker import get_markers, genotype_likelihoods_for_markers
+from concordance import concordance
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+PILEUP_DIR = os.path.join(PARENT_DIR, "data", "example", "pileup")
+marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+pileup_10lines = os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt")
+
+def add(a, b):
+    metrics.count('test.calls')
+    return(a + b)
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        metrics.reset()
+
+    def tearDown(self):
+        metrics.enable(False)
+        metrics.reset()
+        shutil.rmtree(self.tmpdir)
+
+    def test_disabled(self):
+        """
+        Test that nothing is recorded when metrics are off
+        """
+        metrics.enable(False)
+        with metrics.timer('test.block'):
+            pass
+        metrics.Stopwatch().lap('test.lap')
+        genotype_likelihoods_for_markers(get_markers(marker_file), pileup_10lines)
+        self.assertEqual(metrics.snapshot(), {'timers': {}, 'timer_counts': {}, 'counters': {}})
+
+    def test_hot_paths(self):
+        """
+        Test that parsing a pileup and comparing two samples records their timers and counters
+        """
+        metrics.enable()
+        markers_data = get_markers(marker_file)
+        concordance(pileup_10lines, pileup_10lines, markers_data, min_cov = 1)
+        snapshot = metrics.snapshot()
+        for name in ['pileup.read', 'pileup.parse_line', 'pileup.genotype_likelihood', 'concordance.load_pileup', 'concordance.compare']:
+            self.assertTrue(name in snapshot['timers'])
+        self.assertEqual(snapshot['timer_counts']['concordance.load_pileup'], 2)
+        self.assertEqual(snapshot['counters']['pileup.lines'], 20)
+        self.assertEqual(snapshot['counters']['concordance.pairs'], 1)
+        self.assertEqual(snapshot['counters']['genotypes.likelihoods'], 20)
+
+    def test_run_task(self):
+        """
+        Test that a task returns its metrics to be merged, and dumps its profile
+        """
+        value, task_metrics = metrics.run_task(add, (1, 2), {}, profile_dir = self.tmpdir)
+        self.assertEqual(value, 3)
+        self.assertEqual(task_metrics['counters'], {'test.calls': 1})
+        self.assertEqual(task_metrics['timer_counts'], {'worker.task': 1})
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'worker.{0}.prof'.format(os.getpid()))))
+
+        metrics.reset()
+        metrics.count('test.calls', 2)
+        metrics.merge(task_metrics)
+        metrics.merge(task_metrics)
+        self.assertEqual(metrics.counters['test.calls'], 4)
+        self.assertEqual(metrics.timer_counts['worker.task'], 2)
+
+    def test_write_metrics(self):
+        """
+        Test writing the metrics as JSON lines
+        """
+        metrics.enable()
+        metrics.add_time('b.timer', 1.5)
+        metrics.add_time('a.timer', 0.5)
+        metrics.count('c.counter', 3)
+        metrics_file = os.path.join(self.tmpdir, 'metrics.jsonl')
+        with open(metrics_file, "w") as fout:
+            metrics.write_metrics(fout, {'command': 'test'})
+        with open(metrics_file) as fin:
+            lines = [ json.loads(line) for line in fin ]
+        self.assertEqual(lines[0], {'type': 'run', 'command': 'test'})
+        self.assertEqual([ line['name'] for line in lines[1:] ], ['a.timer', 'b.timer', 'c.counter'])
+        self.assertEqual(lines[2], {'type': 'timer', 'name': 'b.timer', 'seconds': 1.5, 'count': 1})
+        self.assertEqual(lines[3], {'type': 'counter', 'name': 'c.counter', 'value': 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the pair module
+"""
+import os
+import sys
+import unittest
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+# the pair and contamination modules use package relative imports
+sys.path.insert(0, PARENT_DIR)
+from modules.pair import PAIR_FIELDS, check_pair
+from modules import contamination
+from modules.concordance import concordance
+from modules.ContaminationMarker import get_markers, quality_histograms_for_markers
+PILEUP_DIR = os.path.join(PARENT_DIR, "data", "example", "pileup")
+pileup_10lines = os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt")
+marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+markers_data = get_markers(marker_file)
+
+class TestPair(unittest.TestCase):
+    def test_histogram_base_qualities(self):
+        """
+        Test that the base qualities from the histograms are the same as from parsing the pileup, in sorted order
+        """
+        histograms = quality_histograms_for_markers(markers_data, pileup_10lines, mapq_bins = [10])
+        expected = [ (marker.chrom, marker.pos, sorted(ref_basequals), sorted(alt_basequals))
+            for marker, ref_basequals, alt_basequals in contamination.pileup_base_qualities(pileup_10lines, markers_data, min_mapping_quality = 10) ]
+        base_qualities = [ (marker.chrom, marker.pos, ref_basequals, alt_basequals)
+            for marker, ref_basequals, alt_basequals in contamination.histogram_base_qualities(markers_data, histograms, min_mapq_bin = 1) ]
+        self.assertEqual(sorted(base_qualities), sorted(expected))
+        self.assertEqual(len(base_qualities), 10)
+
+    def test_check_pair(self):
+        """
+        Test that a pair check gets the same values as the separate concordance and contamination estimates
+        """
+        record = check_pair(pileup_10lines, pileup_10lines, markers_data, min_cov = 1)
+        self.assertEqual(list(record.keys()), PAIR_FIELDS)
+        concordance_val, num_markers_used, num_total_markers = concordance(tumor_pileup = pileup_10lines, normal_pileup = pileup_10lines, markers_data = markers_data, min_cov = 1)
+        self.assertEqual(record['concordance'], concordance_val)
+        self.assertEqual(record['num_markers_used'], num_markers_used)
+        self.assertEqual(record['num_total_markers'], num_total_markers)
+        normal_contamination, tumor_contamination = contamination.estimate_contamination(pileup_10lines, pileup_10lines, markers_data)
+        self.assertAlmostEqual(record['normal_contamination'], normal_contamination, places = 6)
+        self.assertAlmostEqual(record['tumor_contamination'], tumor_contamination, places = 6)
+
+    def test_check_pair_no_shared_markers(self):
+        """
+        Test that a pair without markers over the minimum coverage has no concordance values but still gets its contamination
+        """
+        record = check_pair(pileup_10lines, pileup_10lines, markers_data, min_cov = 10000)
+        self.assertEqual([ record[field] for field in PAIR_FIELDS[0:3] ], [None, None, None])
+        self.assertTrue(record['tumor_contamination'] is not None)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the pileup_io module
+"""
+import os
+import gzip
+import unittest
+import shutil
+import subprocess
+import threading
+from tempfile import mkdtemp
+import pileup_io
+from pileup_io import open_pileup, detect_compression, get_compression, is_stream
+from ContaminationMarker import get_markers, genotype_likelihoods_for_markers
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+PILEUP_DIR = os.path.join(PARENT_DIR, "data", "example", "pileup")
+marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+pileup_10lines = os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt")
+
+class TestOpenPileup(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        with open(pileup_10lines) as fin:
+            self.lines = fin.readlines()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_gzip_members(self, filename, num_members):
+        """
+        Write the example pileup as several concatenated gzip members, like a bgzip file
+        """
+        filepath = os.path.join(self.tmpdir, filename)
+        chunk_size = len(self.lines) // num_members + 1
+        with open(filepath, 'wb') as fout:
+            for i in range(0, len(self.lines), chunk_size):
+                member = gzip.GzipFile(fileobj = fout, mode = 'wb')
+                member.write(''.join(self.lines[i:i + chunk_size]).encode('latin-1'))
+                member.close()
+        return(filepath)
+
+    def read_lines(self, filepath):
+        f = open_pileup(filepath)
+        lines = [ line for line in f ]
+        f.close()
+        return(lines)
+
+    def test_detect_compression(self):
+        """
+        Test that the compression type is detected from the magic bytes
+        """
+        bgzf_header = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00'
+        self.assertEqual(detect_compression(bgzf_header), 'bgzip')
+        self.assertEqual(detect_compression(b'\x1f\x8b\x08\x00\x00\x00\x00\x00'), 'gzip')
+        self.assertEqual(detect_compression(b'\x28\xb5\x2f\xfd\x00'), 'zstd')
+        self.assertEqual(detect_compression(b'1 881627 G AAAA'), None)
+        self.assertEqual(get_compression(pileup_10lines), None)
+
+    def test_read_plain(self):
+        """
+        Test that a plain text pileup is read as is
+        """
+        self.assertEqual(self.read_lines(pileup_10lines), self.lines)
+
+    def test_read_gzip_in_process(self):
+        """
+        Test reading a multi-member gzip file without an external decompression program
+        """
+        filepath = self.write_gzip_members("example.pileup.gz", 3)
+        self.assertEqual(get_compression(filepath), 'gzip')
+        decompression_command = pileup_io.decompression_command
+        pileup_io.decompression_command = lambda *args, **kwargs: None
+        try:
+            self.assertEqual(self.read_lines(filepath), self.lines)
+        finally:
+            pileup_io.decompression_command = decompression_command
+
+    def test_read_gzip(self):
+        """
+        Test reading a gzip file with whichever decompression method is available
+        """
+        filepath = self.write_gzip_members("example.pileup.gz", 1)
+        self.assertEqual(self.read_lines(filepath), self.lines)
+
+    @unittest.skipIf(pileup_io.which('zstd') is None, "zstd program is not available")
+    def test_read_zstd(self):
+        """
+        Test reading a zstd compressed pileup
+        """
+        filepath = os.path.join(self.tmpdir, "example.pileup.zst")
+        subprocess.check_call(['zstd', '--quiet', '-o', filepath, pileup_10lines])
+        self.assertEqual(get_compression(filepath), 'zstd')
+        self.assertEqual(self.read_lines(filepath), self.lines)
+
+    def write_large_pileup(self):
+        """
+        Write a pileup that is larger than the read buffer and the pipe buffer together, so that the decompressor is still writing when the reader is closed
+        """
+        filepath = os.path.join(self.tmpdir, "large.pileup")
+        data = ''.join(self.lines)
+        with open(filepath, 'w') as fout:
+            for i in range(pileup_io.BUFFER_SIZE // len(data) + 100):
+                fout.write(data)
+        return(filepath)
+
+    def read_first_line(self, filepath):
+        f = open_pileup(filepath)
+        line = next(iter(f))
+        f.close()
+        return(line)
+
+    @unittest.skipIf(pileup_io.which('zstd') is None, "zstd program is not available")
+    def test_close_zstd_early(self):
+        """
+        Test that closing a zstd pileup before its end does not count as a failure of the decompression program
+        """
+        filepath = self.write_large_pileup()
+        subprocess.check_call(['zstd', '--quiet', '--rm', '-o', filepath + '.zst', filepath])
+        self.assertEqual(self.read_first_line(filepath + '.zst'), self.lines[0])
+
+    @unittest.skipIf(pileup_io.which('gzip') is None, "gzip program is not available")
+    def test_close_gzip_early(self):
+        """
+        Test that closing a gzip pileup before its end does not count as a failure of the decompression program
+        """
+        filepath = self.write_large_pileup()
+        subprocess.check_call(['gzip', filepath])
+        decompression_command = pileup_io.decompression_command
+        pileup_io.decompression_command = lambda compression, filepath, num_threads = 1: ['gzip', '--decompress', '--stdout', filepath]
+        try:
+            self.assertEqual(self.read_first_line(filepath + '.gz'), self.lines[0])
+        finally:
+            pileup_io.decompression_command = decompression_command
+
+    def test_likelihoods_from_gzip(self):
+        """
+        Test that the genotype likelihoods from a compressed pileup match those from the plain text pileup
+        """
+        markers_data = get_markers(marker_file)
+        filepath = self.write_gzip_members("example.pileup.gz", 2)
+        expected = genotype_likelihoods_for_markers(markers_data, pileup_10lines, min_map_quality=10, min_base_quality=20)
+        likelihoods = genotype_likelihoods_for_markers(markers_data, filepath, min_map_quality=10, min_base_quality=20, num_threads=2)
+        self.assertEqual(likelihoods, expected)
+
+    def write_to_fifo(self, data):
+        """
+        Make a named pipe and start writing data to it in the background
+        """
+        fifo = os.path.join(self.tmpdir, "pileup.fifo")
+        os.mkfifo(fifo)
+        def writer():
+            with open(fifo, 'wb') as fout:
+                fout.write(data)
+        thread = threading.Thread(target = writer)
+        thread.start()
+        return(fifo, thread)
+
+    @unittest.skipIf(not hasattr(os, 'mkfifo'), "named pipes are not available")
+    def test_likelihoods_from_fifo(self):
+        """
+        Test that the genotype likelihoods can be read from a gzip compressed pileup streamed through a named pipe
+        """
+        markers_data = get_markers(marker_file)
+        gzip_filepath = self.write_gzip_members("example.pileup.gz", 2)
+        with open(gzip_filepath, 'rb') as fin:
+            fifo, thread = self.write_to_fifo(fin.read())
+        self.assertTrue(is_stream(fifo))
+        self.assertTrue(is_stream('-'))
+        self.assertFalse(is_stream(pileup_10lines))
+        expected = genotype_likelihoods_for_markers(markers_data, pileup_10lines, min_map_quality=10, min_base_quality=20)
+        likelihoods = genotype_likelihoods_for_markers(markers_data, fifo, min_map_quality=10, min_base_quality=20, num_threads=2)
+        thread.join()
+        self.assertEqual(likelihoods, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the progress module
+"""
+import os
+import time
+import unittest
+import shutil
+from tempfile import mkdtemp
+import metrics
+from progress import ProgressReporter, write_textfile, format_duration
+
+class TestProgress(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        metrics.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.enable(False)
+        metrics.reset()
+        shutil.rmtree(self.tmpdir)
+
+    def test_status(self):
+        """
+        Test the counts, rate and estimated time left
+        """
+        progress = ProgressReporter(10, "test", stream = None)
+        progress.start_time = progress.last_time = time.time() - 2.0
+        progress.update(4)
+        status = progress.status()
+        self.assertEqual((status['done'], status['total']), (4, 10))
+        self.assertAlmostEqual(status['rate'], 2.0, places = 1)
+        self.assertAlmostEqual(status['eta'], 3.0, places = 1)
+        self.assertEqual(format_duration(3725.4), '1:02:05')
+        self.assertEqual(format_duration(None), 'NA')
+
+    def test_bottleneck(self):
+        """
+        Test that the bottleneck is the stage that grew the most, and is kept while no timers grow
+        """
+        metrics.add_time('run.load_markers', 5.0)
+        progress = ProgressReporter(10, "test", interval = 60, stream = None).start()
+        self.assertEqual(progress.status()['bottleneck'], None)
+        metrics.add_time('worker.task', 3.0)
+        metrics.add_time('concordance.load_pileup', 2.0)
+        metrics.add_time('concordance.compare', 1.0)
+        self.assertEqual(progress.status()['bottleneck'], 'concordance.load_pileup')
+        metrics.add_time('concordance.compare', 1.5)
+        metrics.add_time('concordance.load_pileup', 1.0)
+        self.assertEqual(progress.status()['bottleneck'], 'concordance.compare')
+        self.assertEqual(progress.status()['bottleneck'], 'concordance.compare')
+        progress.stop()
+
+    def test_report(self):
+        """
+        Test the report lines and the final report when stopped
+        """
+        report_file = os.path.join(self.tmpdir, 'progress.txt')
+        with open(report_file, "w") as fout:
+            progress = ProgressReporter(3, "test", interval = 0.05, stream = fout).start()
+            for i in range(3):
+                progress.update()
+                time.sleep(0.06)
+            progress.stop()
+        with open(report_file) as fin:
+            lines = fin.readlines()
+        self.assertTrue(len(lines) >= 2)
+        self.assertTrue(lines[-1].startswith('[test] 3/3 pairs (100.0%)'))
+
+    def test_write_textfile(self):
+        """
+        Test writing the progress in the Prometheus text format
+        """
+        textfile = os.path.join(self.tmpdir, 'conpair.prom')
+        status = {'done': 4, 'total': 10, 'elapsed': 2.0, 'rate': 2.0, 'eta': None, 'bottleneck': 'concordance.compare',
+            'stages': {'concordance.compare': 1.5, 'pool.wait': 2.0}, 'time': 100.0}
+        write_textfile(textfile, 'concordance', status)
+        with open(textfile) as fin:
+            lines = fin.read().splitlines()
+        self.assertTrue('conpair_comparisons_done_total{command="concordance"} 4.0' in lines)
+        self.assertTrue('conpair_stage_seconds_total{command="concordance",stage="concordance.compare"} 1.5' in lines)
+        self.assertTrue('conpair_bottleneck{command="concordance",stage="concordance.compare"} 1.0' in lines)
+        self.assertEqual(len([ line for line in lines if line.startswith('# TYPE conpair_stage_seconds_total ') ]), 1)
+        self.assertFalse(any(line.startswith('conpair_eta_seconds') for line in lines))
+        self.assertFalse(os.path.exists(textfile + '.tmp'))
+
+
+if __name__ == "__main__":
+    unittest.main()
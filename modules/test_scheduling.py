@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the scheduling module
+"""
+import os
+import gzip
+import pickle
+import unittest
+import shutil
+from tempfile import mkdtemp
+from scheduling import estimate_input_cost, estimate_pair_costs, largest_first, predict_makespan
+
+class TestScheduling(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        data = b'1 881627 G AAAA\n' * 10000
+        self.inputs = {}
+        for name, opener in [('plain.pileup', open), ('compressed.pileup.gz', gzip.open), ('likelihoods.pickle', open)]:
+            self.inputs[name] = os.path.join(self.tmpdir, name)
+            fout = opener(self.inputs[name], 'wb')
+            fout.write(data if name != 'likelihoods.pickle' else pickle.dumps(data))
+            fout.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_input_costs(self):
+        """
+        Test that a pileup costs more than a pickle of the same size, and a compressed pileup more per byte than a plain one
+        """
+        plain_cost = estimate_input_cost(self.inputs['plain.pileup'])
+        pickle_cost = estimate_input_cost(self.inputs['likelihoods.pickle'])
+        compressed_cost = estimate_input_cost(self.inputs['compressed.pileup.gz'])
+        compressed_size = os.path.getsize(self.inputs['compressed.pileup.gz'])
+        plain_size = os.path.getsize(self.inputs['plain.pileup'])
+        self.assertTrue(pickle_cost < plain_cost)
+        self.assertTrue(compressed_cost / compressed_size > plain_cost / plain_size)
+        self.assertEqual(estimate_input_cost('-'), 0.0)
+        self.assertEqual(estimate_input_cost({}), 0.0)
+
+    def test_pair_costs(self):
+        """
+        Test that preloaded inputs cost nothing to load again
+        """
+        plain = self.inputs['plain.pileup']
+        pickled = self.inputs['likelihoods.pickle']
+        pairs = [(plain, pickled, 'a', 'b'), (pickled, pickled, 'b', 'b')]
+        costs = estimate_pair_costs(pairs)
+        self.assertTrue(costs[0] > costs[1])
+        self.assertEqual(estimate_pair_costs(pairs, {plain: {}})[0], costs[1] - estimate_input_cost(pickled))
+
+    def test_largest_first(self):
+        """
+        Test that the most expensive pairs go first and the makespan is shorter for it
+        """
+        pairs = [ ('t{0}'.format(i), 'n', 't{0}'.format(i), 'n') for i in range(5) ]
+        costs = [1.0, 1.0, 1.0, 1.0, 4.0]
+        ordered_pairs, ordered_costs = largest_first(pairs, costs)
+        self.assertEqual(ordered_costs, [4.0, 1.0, 1.0, 1.0, 1.0])
+        self.assertEqual(ordered_pairs, [pairs[4]] + pairs[0:4])
+        self.assertEqual(predict_makespan(costs, 2), 6.0)
+        self.assertEqual(predict_makespan(ordered_costs, 2), 4.0)
+        self.assertEqual(predict_makespan(ordered_costs, 1), 8.0)
+        self.assertEqual(predict_makespan([], 4), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
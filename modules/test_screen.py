@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the screen module
+"""
+import os
+import unittest
+from ContaminationMarker import get_markers
+from screen import select_screening_markers, top_candidates, run_parallel_screen
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+PILEUP_DIR = os.path.join(PARENT_DIR, "data", "example", "pileup")
+marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+pileup_10lines = os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt")
+
+def minor_allele_frequency(marker):
+    return(min(marker.RAF, 1.0 - marker.RAF))
+
+class TestScreen(unittest.TestCase):
+    def setUp(self):
+        self.markers_data = get_markers(marker_file)
+
+    def test_select_screening_markers(self):
+        """
+        Test that the screening markers are a small, high frequency subset from every chromosome
+        """
+        screening_markers = select_screening_markers(self.markers_data, fraction = 0.05)
+        self.assertTrue(abs(len(screening_markers) - 0.05 * len(self.markers_data)) < 25)
+        self.assertEqual(set([ marker.chrom for marker in screening_markers.values() ]), set([ marker.chrom for marker in self.markers_data.values() ]))
+        self.assertTrue(all(m in self.markers_data for m in screening_markers))
+        mean_maf = sum([ minor_allele_frequency(marker) for marker in self.markers_data.values() ]) / len(self.markers_data)
+        mean_screening_maf = sum([ minor_allele_frequency(marker) for marker in screening_markers.values() ]) / len(screening_markers)
+        self.assertTrue(mean_screening_maf > mean_maf)
+
+    def test_top_candidates(self):
+        """
+        Test that the best screening pairs are kept for each tumor
+        """
+        screen_results = [
+            ('t1.pileup', 'n1.pileup', 't1', 'n1', 0.5, 300, 369),
+            ('t1.pileup', 'n2.pileup', 't1', 'n2', 0.99, 300, 369),
+            ('t1.pileup', 'n3.pileup', 't1', 'n3', None, None, None),
+            ('t2.pileup', 'n1.pileup', 't2', 'n1', None, None, None),
+            ('t2.pileup', 'n2.pileup', 't2', 'n2', 0.4, 300, 369)
+        ]
+        self.assertEqual(top_candidates(screen_results, top = 1), [
+            ('t1.pileup', 'n2.pileup', 't1', 'n2'),
+            ('t2.pileup', 'n2.pileup', 't2', 'n2')
+            ])
+        self.assertEqual(len(top_candidates(screen_results, top = 2)), 4)
+
+    def test_run_parallel_screen(self):
+        """
+        Test that the screening only uses the screening markers
+        """
+        screening_markers = select_screening_markers(self.markers_data, fraction = 0.5)
+        pairs = [(pileup_10lines, pileup_10lines, "tumor", "normal")]
+        results = run_parallel_screen(pairs, screening_markers, 2, 10, False, 1, 20)
+        self.assertEqual(results, [(pileup_10lines, pileup_10lines, "tumor", "normal", 1.0, 5, len(screening_markers))])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the shard module
+"""
+import os
+import io
+import unittest
+import shutil
+from tempfile import mkdtemp
+from loader import LabeledPairs
+from shard import parse_shard, shard_of_pair, select_shard, merge_outputs
+
+fieldnames = ['concordance', 'num_markers_used', 'num_total_markers', 'tumor', 'normal', 'tumor_filename', 'normal_filename']
+
+class TestShard(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        tumors = [ ('/data/tumor{0}.pileup'.format(i), 'tumor{0}'.format(i)) for i in range(20) ]
+        normals = [ ('/data/normal{0}.pileup'.format(i), 'normal{0}'.format(i)) for i in range(3) ]
+        self.pairs = LabeledPairs(tumors, normals)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_output(self, filename, pairs):
+        filepath = os.path.join(self.tmpdir, filename)
+        with open(filepath, "w") as fout:
+            fout.write('\t'.join(fieldnames) + '\n')
+            for tumor_pileup, normal_pileup, tumor_name, normal_name in pairs:
+                fout.write('\t'.join(['1.0', '10', '7387', tumor_name, normal_name, os.path.basename(tumor_pileup), os.path.basename(normal_pileup)]) + '\n')
+        return(filepath)
+
+    def test_parse_shard(self):
+        """
+        Test parsing shards given as i/n
+        """
+        self.assertEqual(parse_shard("1/4"), (1, 4))
+        self.assertEqual(parse_shard("4/4"), (4, 4))
+        for value in ["0/4", "5/4", "1", "a/4", "1/0"]:
+            self.assertRaises(ValueError, parse_shard, value)
+
+    def test_shards_split_all_pairs(self):
+        """
+        Test that every pair is in exactly one shard, whatever order the pairs come in
+        """
+        shards = [ list(select_shard(self.pairs, i, 4)) for i in range(1, 5) ]
+        self.assertEqual(sorted(sum(shards, [])), sorted(self.pairs))
+        self.assertTrue(all(len(shard) > 0 for shard in shards))
+        for pair in reversed(list(self.pairs)):
+            self.assertEqual(shard_of_pair(pair, 4), [ i for i, shard in enumerate(shards) if pair in shard ][0] + 1)
+
+    def test_merge_outputs(self):
+        """
+        Test that merging the shard outputs gives all the pairs, and that missing and duplicated pairs are reported
+        """
+        shard_files = [ self.write_output("shard{0}.tsv".format(i), select_shard(self.pairs, i, 3)) for i in range(1, 4) ]
+        fout = io.StringIO() if str is not bytes else io.BytesIO()
+        problems = merge_outputs(shard_files, fout, expected_pairs = self.pairs)
+        self.assertEqual(problems, {'duplicated': [], 'missing': [], 'unexpected': []})
+        lines = fout.getvalue().splitlines()
+        self.assertEqual(len(lines), len(self.pairs) + 1)
+
+        fout = io.StringIO() if str is not bytes else io.BytesIO()
+        problems = merge_outputs(shard_files[0:2] + shard_files[0:1], fout, expected_pairs = self.pairs)
+        self.assertEqual(len(problems['duplicated']), len(list(select_shard(self.pairs, 1, 3))))
+        self.assertEqual(len(problems['missing']), len(list(select_shard(self.pairs, 3, 3))))
+        self.assertEqual(problems['unexpected'], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the store module
+"""
+import os
+import unittest
+import shutil
+from tempfile import mkdtemp
+from store import ResultsStore, file_fingerprint, make_params_key, split_stored_pairs, store_results
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+PILEUP_DIR = os.path.join(PARENT_DIR, "data", "example", "pileup")
+marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+pileup_10lines = os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt")
+
+class TestResultsStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, "results.db")
+        self.params = make_params_key(marker_file, 10, 20, 10, False)
+        self.pileups = {}
+        for name in ['tumor1', 'normal1', 'normal2']:
+            self.pileups[name] = os.path.join(self.tmpdir, name + ".pileup")
+            shutil.copy(pileup_10lines, self.pileups[name])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def make_result(self, tumor, normal, concordance_val):
+        return((self.pileups[tumor], self.pileups[normal], tumor, normal, concordance_val, 10, 7387))
+
+    def test_params_key(self):
+        """
+        Test that different settings give different keys
+        """
+        self.assertEqual(self.params, make_params_key(marker_file, 10, 20, 10, False))
+        self.assertNotEqual(self.params, make_params_key(marker_file, 10, 20, 10, True))
+        self.assertNotEqual(self.params, make_params_key(marker_file, 0, 20, 10, False))
+
+    def test_only_new_pairs_are_pending(self):
+        """
+        Test that stored results are reused and only the comparisons that are not in the store are left to compute
+        """
+        store = ResultsStore(self.db_path)
+        results = [ self.make_result('tumor1', 'normal1', 0.99), self.make_result('tumor1', 'normal2', None) ]
+        self.assertEqual(list(store_results(results, store, self.params, batch_size = 1)), results)
+        store.close()
+
+        store = ResultsStore(self.db_path)
+        pairs = [ self.make_result(tumor, normal, None)[0:4] for tumor, normal in [('tumor1', 'normal1'), ('tumor1', 'normal2'), ('normal1', 'normal2')] ]
+        stored_results, pending_pairs = split_stored_pairs(pairs, store, self.params)
+        self.assertEqual(list(stored_results), results)
+        self.assertEqual(list(pending_pairs), pairs[2:])
+        self.assertEqual(len(pending_pairs), 1)
+
+        # other settings are computed again
+        stored_results, pending_pairs = split_stored_pairs(pairs, store, make_params_key(marker_file, 0, 20, 10, False))
+        self.assertEqual(list(stored_results), [])
+        self.assertEqual(list(pending_pairs), pairs)
+        store.close()
+
+    def test_changed_file_is_pending(self):
+        """
+        Test that a comparison is computed again after one of its files changes
+        """
+        store = ResultsStore(self.db_path)
+        list(store_results([ self.make_result('tumor1', 'normal1', 0.99) ], store, self.params))
+        fingerprint = file_fingerprint(self.pileups['normal1'])
+        with open(self.pileups['normal1'], "a") as fout:
+            fout.write("\n")
+        self.assertNotEqual(fingerprint, file_fingerprint(self.pileups['normal1']))
+        pairs = [ self.make_result('tumor1', 'normal1', None)[0:4] ]
+        stored_results, pending_pairs = split_stored_pairs(pairs, store, self.params)
+        self.assertEqual(list(stored_results), [])
+        self.assertEqual(list(pending_pairs), pairs)
+        store.close()
+
+    def test_stream_inputs_are_not_stored(self):
+        """
+        Test that comparisons with stdin inputs are always computed and never saved
+        """
+        self.assertEqual(file_fingerprint('-'), None)
+        store = ResultsStore(self.db_path)
+        list(store_results([ ('-', self.pileups['normal1'], 'stdin', 'normal1', 0.99, 10, 7387) ], store, self.params))
+        self.assertEqual(store.best_matches(self.params, tumor = 'stdin'), [])
+        store.close()
+
+    def test_failed_results_are_not_stored(self):
+        """
+        Test that supervised comparisons that timed out are passed through but not saved
+        """
+        store = ResultsStore(self.db_path)
+        results = [ self.make_result('tumor1', 'normal1', None) + ('timeout',), self.make_result('tumor1', 'normal2', 0.99) + ('ok',) ]
+        self.assertEqual(list(store_results(results, store, self.params)), results)
+        self.assertEqual(store.get('tumor1', file_fingerprint(self.pileups['tumor1']), 'normal1', file_fingerprint(self.pileups['normal1']), self.params), None)
+        self.assertEqual(store.get('tumor1', file_fingerprint(self.pileups['tumor1']), 'normal2', file_fingerprint(self.pileups['normal2']), self.params), (0.99, 10, 7387))
+        store.close()
+
+    def test_best_matches(self):
+        """
+        Test looking up the best normals for a tumor and the best tumors for a normal
+        """
+        store = ResultsStore(self.db_path)
+        list(store_results([
+            self.make_result('tumor1', 'normal1', 0.6),
+            self.make_result('tumor1', 'normal2', 0.99),
+            self.make_result('normal1', 'normal2', None)
+            ], store, self.params))
+        matches = store.best_matches(self.params, tumor = 'tumor1', limit = 5)
+        self.assertEqual([ (m['normal'], m['concordance']) for m in matches ], [('normal2', 0.99), ('normal1', 0.6)])
+        self.assertEqual(matches[0]['tumor_filepath'], self.pileups['tumor1'])
+        matches = store.best_matches(self.params, normal = 'normal2')
+        self.assertEqual([ (m['tumor'], m['concordance']) for m in matches ], [('tumor1', 0.99)])
+        self.assertRaises(Exception, store.best_matches, self.params)
+        store.close()
+
+    def test_best_matches_newest_fingerprint(self):
+        """
+        Test that the results for the old fingerprint of a rewritten file are not ranked
+        """
+        store = ResultsStore(self.db_path)
+        store.put([
+            ('tumor1', '1:1.0', 'normal1', '1:1.0', 0.99, 10, 7387, self.pileups['tumor1'], self.pileups['normal1']),
+            ('tumor1', '1:1.0', 'normal2', '1:1.0', 0.7, 10, 7387, self.pileups['tumor1'], self.pileups['normal2'])
+            ], self.params)
+        # normal1 was rewritten and is no longer a match
+        store.put([('tumor1', '1:1.0', 'normal1', '2:2.0', 0.5, 10, 7387, self.pileups['tumor1'], self.pileups['normal1'])], self.params)
+        matches = store.best_matches(self.params, tumor = 'tumor1', limit = 5)
+        self.assertEqual([ (m['normal'], m['concordance']) for m in matches ], [('normal2', 0.7), ('normal1', 0.5)])
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the summary module
+"""
+import unittest
+from summary import BestMatches
+
+def make_result(tumor, normal, concordance_val):
+    return(('/data/{0}.pileup'.format(tumor), '/data/{0}.pileup'.format(normal), tumor, normal, concordance_val, 100, 7387))
+
+class TestSummary(unittest.TestCase):
+    def setUp(self):
+        values = {
+            ('t1', 'n1'): 0.95, ('t1', 'n2'): 0.40, ('t1', 'n3'): 0.50,
+            ('t2', 'n1'): 0.45, ('t2', 'n2'): 0.42, ('t2', 'n3'): None,
+            ('t3', 'n1'): 0.85, ('t3', 'n2'): 0.30, ('t3', 'n3'): 0.92
+        }
+        self.results = [ make_result(tumor, normal, values[(tumor, normal)]) for tumor in ['t1', 't2', 't3'] for normal in ['n1', 'n2', 'n3'] ]
+
+    def summarize(self, **kwargs):
+        summary = BestMatches(**kwargs)
+        for result in self.results:
+            summary.add(result)
+        return(dict( (row[0][2:4], row[1:]) for row in summary.rows() ))
+
+    def test_top_k(self):
+        """
+        Test that each tumor and each normal keeps its best matches, with their ranks
+        """
+        rows = self.summarize(top_k = 1)
+        self.assertEqual(rows, {
+            ('t1', 'n1'): (1, 1, False),
+            ('t2', 'n1'): (1, None, False),
+            ('t3', 'n3'): (1, 1, False),
+            ('t2', 'n2'): (None, 1, False)
+        })
+        rows = self.summarize(top_k = 2)
+        self.assertEqual(rows[('t3', 'n1')], (2, 2, False))
+        self.assertEqual(rows[('t2', 'n2')], (2, 1, False))
+        self.assertEqual(rows[('t1', 'n2')], (None, 2, False))
+        self.assertEqual(len(rows), 7)
+
+    def test_min_concordance(self):
+        """
+        Test that every pair above the threshold is kept, also when it is not one of the best matches
+        """
+        rows = self.summarize(min_concordance = 0.8)
+        self.assertEqual(sorted(rows), [('t1', 'n1'), ('t3', 'n1'), ('t3', 'n3')])
+        self.assertEqual(rows[('t3', 'n1')], (None, None, True))
+
+        rows = self.summarize(top_k = 1, min_concordance = 0.8)
+        self.assertEqual(rows[('t1', 'n1')], (1, 1, True))
+        self.assertEqual(rows[('t3', 'n1')], (None, None, True))
+        self.assertEqual(rows[('t2', 'n1')], (1, None, False))
+
+    def test_ties_and_missing_values(self):
+        """
+        Test that ties keep the earlier result, and that pairs without a concordance value are ranked last
+        """
+        summary = BestMatches(top_k = 1)
+        summary.add(make_result('t1', 'n1', None))
+        summary.add(make_result('t1', 'n2', 0.5))
+        summary.add(make_result('t1', 'n3', 0.5))
+        rows = summary.rows()
+        self.assertEqual(rows[0][0][3], 'n2')
+        self.assertEqual([ row[0][3] for row in rows ], ['n2', 'n1', 'n3'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the supervisor module
+"""
+import os
+import time
+import unittest
+import shutil
+from tempfile import mkdtemp
+from supervisor import supervised_map, median, RunningMedian
+
+def square(value, delay = 0.0):
+    time.sleep(delay)
+    return(value * value)
+
+def divide(value):
+    return(1.0 / value)
+
+def fail_once(marker_file):
+    # fails the first time it is run, then succeeds
+    if not os.path.exists(marker_file):
+        open(marker_file, "w").close()
+        raise ValueError("first try")
+    return('done')
+
+def exit_process(value):
+    # the process ends without sending a result, as when it is killed from outside
+    os._exit(3)
+
+def slow_once(value, delay = 0.1):
+    # the first copy writes its pid to the file and hangs, later copies finish quickly; other values are squared after the delay
+    if not isinstance(value, str):
+        return(square(value, delay))
+    if not os.path.exists(value):
+        with open(value, "w") as fout:
+            fout.write(str(os.getpid()))
+        time.sleep(60)
+    return('done')
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return(False)
+    return(True)
+
+def statuses(results):
+    return(dict( (task_id, (status, value)) for task_id, status, value in results ))
+
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_median(self):
+        self.assertEqual(median([3, 1, 2]), 2)
+        self.assertEqual(median([4, 1, 2, 3]), 2.5)
+
+    def test_running_median(self):
+        values = [5, 1, 4, 4, 9, 0, 7, 3, 8, 2, 6]
+        running_median = RunningMedian()
+        for i, value in enumerate(values):
+            running_median.add(value)
+            self.assertEqual(len(running_median), i + 1)
+            self.assertEqual(running_median.median(), median(values[0:i + 1]))
+
+    def test_window(self):
+        """
+        Test that the tasks are read lazily, a window at a time
+        """
+        read = []
+        def tasks():
+            for i in range(20):
+                read.append(i)
+                yield(((i,), {}))
+        results = supervised_map(square, tasks(), 1, timeout = 30, window = 3)
+        task_id, status, value = next(results)
+        self.assertTrue(len(read) <= 4)
+        results = statuses([(task_id, status, value)] + list(results))
+        self.assertEqual(results, dict( (i, ('ok', i * i)) for i in range(20) ))
+
+    def test_all_ok(self):
+        """
+        Test that every task is run once and its result yielded
+        """
+        tasks = [ ((i,), {}) for i in range(6) ]
+        results = statuses(supervised_map(square, tasks, 2, timeout = 30))
+        self.assertEqual(results, dict( (i, ('ok', i * i)) for i in range(6) ))
+
+    def test_timeout(self):
+        """
+        Test that a task that hangs is killed and reported, without holding up the other tasks
+        """
+        tasks = [ ((2,), {'delay': 60}), ((3,), {}), ((4,), {}) ]
+        start = time.time()
+        results = statuses(supervised_map(square, tasks, 2, timeout = 0.5, max_retries = 1))
+        self.assertTrue(time.time() - start < 30)
+        self.assertEqual(results[0], ('timeout', None))
+        self.assertEqual(results[1], ('ok', 9))
+        self.assertEqual(results[2], ('ok', 16))
+
+    def test_retry(self):
+        """
+        Test that a failed task is tried again, and reported as failed once it runs out of retries
+        """
+        marker_file = os.path.join(self.tmpdir, 'marker')
+        results = statuses(supervised_map(fail_once, [ ((marker_file,), {}) ], 1, timeout = 30, max_retries = 1))
+        self.assertEqual(results[0], ('ok', 'done'))
+
+        os.remove(marker_file)
+        results = statuses(supervised_map(fail_once, [ ((marker_file,), {}) ], 1, timeout = 30, max_retries = 0))
+        self.assertEqual(results[0][0], 'failed')
+        self.assertTrue(isinstance(results[0][1], ValueError))
+
+    def test_final_exceptions(self):
+        """
+        Test that exceptions that are part of the result are not tried again
+        """
+        results = statuses(supervised_map(divide, [ ((0,), {}), ((2,), {}) ], 2, timeout = 30, final_exceptions = (ZeroDivisionError,)))
+        self.assertEqual(results[0][0], 'failed')
+        self.assertTrue(isinstance(results[0][1], ZeroDivisionError))
+        self.assertEqual(results[1], ('ok', 0.5))
+
+    def test_process_exit(self):
+        """
+        Test that a task whose process exits without a result is reported as failed, and does not hold up the other tasks
+        """
+        results = statuses(supervised_map(exit_process, [ ((1,), {}) ], 1, timeout = 30, max_retries = 1))
+        self.assertEqual(results[0][0], 'failed')
+        self.assertTrue('exited with code 3' in str(results[0][1]))
+        results = statuses(supervised_map(square, [ ((2,), {}), ((3,), {}) ], 1, timeout = 30))
+        self.assertEqual(results, {0: ('ok', 4), 1: ('ok', 9)})
+
+    def test_speculative(self):
+        """
+        Test that a second copy of a slow task is started, and the run does not wait for the slow copy
+        """
+        marker_file = os.path.join(self.tmpdir, 'slow')
+        tasks = [ ((marker_file,), {}) ] + [ ((i,), {'delay': 0.1}) for i in range(5) ]
+        start = time.time()
+        results = {}
+        for task_id, status, value in supervised_map(slow_once, tasks, 2, speculative_factor = 3, min_finished = 3):
+            results[task_id] = (status, value)
+            if task_id == 0:
+                # the process of the slow copy is killed as soon as the other copy finishes
+                with open(marker_file) as fin:
+                    pid = int(fin.read())
+                for i in range(100):
+                    if not is_running(pid):
+                        break
+                    time.sleep(0.1)
+                self.assertFalse(is_running(pid))
+        self.assertTrue(time.time() - start < 30)
+        self.assertEqual(results[0], ('ok', 'done'))
+        self.assertEqual(results[3], ('ok', 4))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the sweep module
+"""
+import os
+import shutil
+import unittest
+from tempfile import mkdtemp
+from ContaminationMarker import get_markers, genotype_likelihoods_for_markers, quality_histograms_for_markers, genotype_likelihoods_from_histograms
+from concordance import concordance
+from sweep import run_parallel_sweep, sweep_batches
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+PILEUP_DIR = os.path.join(PARENT_DIR, "data", "example", "pileup")
+marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+pileup_10lines = os.path.join(PILEUP_DIR, "NA12878_normal40x.gatk.pileup.10lines.txt")
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.markers_data = get_markers(marker_file)
+
+    def test_likelihoods_from_histograms(self):
+        """
+        Test that applying the thresholds to the histograms gives the same likelihoods as applying them while parsing
+        """
+        mapq_bins = [0, 10, 61]
+        histograms = quality_histograms_for_markers(self.markers_data, pileup_10lines, mapq_bins = mapq_bins)
+        self.assertEqual(len(histograms), 10)
+        for min_mapping_quality in mapq_bins:
+            for min_base_quality in [0, 20, 35]:
+                expected = genotype_likelihoods_for_markers(self.markers_data, pileup_10lines, min_map_quality = min_mapping_quality, min_base_quality = min_base_quality)
+                likelihoods = genotype_likelihoods_from_histograms(self.markers_data, histograms, mapq_bins = mapq_bins, min_map_quality = min_mapping_quality, min_base_quality = min_base_quality)
+                self.assertEqual(sorted(likelihoods.keys()), sorted(expected.keys()))
+                for m in expected:
+                    if expected[m] is None:
+                        self.assertEqual(likelihoods[m], None)
+                        continue
+                    self.assertEqual(likelihoods[m]['coverage'], expected[m]['coverage'])
+                    # the histograms do not keep the read order, so the products can differ by rounding
+                    for value, expected_value in zip(likelihoods[m]['likelihoods'], expected[m]['likelihoods']):
+                        self.assertAlmostEqual(value / expected_value, 1.0, places = 12)
+
+    def test_mapping_quality_must_be_a_bin(self):
+        """
+        Test that only the mapping qualities used as bin edges can be applied to the histograms
+        """
+        histograms = quality_histograms_for_markers(self.markers_data, pileup_10lines, mapq_bins = [10])
+        self.assertRaises(ValueError, genotype_likelihoods_from_histograms, self.markers_data, histograms, mapq_bins = [10], min_map_quality = 20)
+
+    def test_run_parallel_sweep(self):
+        """
+        Test that the sweep gives the same concordance as separate concordance runs for each setting
+        """
+        pairs = [(pileup_10lines, pileup_10lines, "tumor", "normal")]
+        results = list(run_parallel_sweep(pairs, self.markers_data, 2, [0, 10], [20, 30], [1, 50]))
+        self.assertEqual(len(results), 8)
+        for tumor_pileup, normal_pileup, tumor_name, normal_name, min_mapping_quality, min_base_quality, min_cov, concordance_val, num_markers_used, num_total_markers in results:
+            try:
+                expected = concordance(tumor_pileup, normal_pileup, self.markers_data, min_mapping_quality = min_mapping_quality, min_cov = min_cov, min_base_quality = min_base_quality)
+            except ZeroDivisionError:
+                expected = (None, None, None)
+            self.assertEqual((concordance_val, num_markers_used, num_total_markers), expected)
+            self.assertEqual((tumor_name, normal_name), ("tumor", "normal"))
+
+    def test_sweep_batches(self):
+        """
+        Test that each batch needs at most the resident number of pileups and that every pair is in one batch
+        """
+        pairs = [ ('t{0}'.format(i), 'n{0}'.format(j), 'tumor', 'normal') for i in range(5) for j in range(4) ]
+        self.assertEqual(sweep_batches(pairs), [pairs])
+        self.assertEqual(sweep_batches(pairs, 9), [pairs])
+        batches = sweep_batches(pairs, 4)
+        self.assertEqual(len(batches), 3 * 2)
+        for batch in batches:
+            self.assertTrue(len(set([ pair[0] for pair in batch ] + [ pair[1] for pair in batch ])) <= 4)
+        self.assertEqual(sorted(pair for batch in batches for pair in batch), sorted(pairs))
+        self.assertEqual(sweep_batches([]), [])
+
+    def test_run_parallel_sweep_batches(self):
+        """
+        Test that a sweep in batches gives the same results as a sweep with every pileup loaded at once
+        """
+        tmpdir = mkdtemp()
+        try:
+            pileups = []
+            for i in range(3):
+                pileups.append(os.path.join(tmpdir, 'sample{0}.pileup'.format(i)))
+                shutil.copy(pileup_10lines, pileups[-1])
+            pairs = [ (tumor, normal, os.path.basename(tumor), os.path.basename(normal)) for tumor in pileups for normal in pileups ]
+            expected = list(run_parallel_sweep(pairs, self.markers_data, 2, [10], [20], [1]))
+            results = list(run_parallel_sweep(pairs, self.markers_data, 2, [10], [20], [1], max_resident = 2))
+            self.assertEqual(sorted(results), sorted(expected))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    unittest.main()
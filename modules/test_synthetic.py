@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Unit tests for the synthetic module
+"""
+import os
+import random
+import unittest
+import shutil
+from tempfile import mkdtemp
+from ContaminationMarker import get_markers, genotype_likelihoods_for_markers, parse_mpileup_line, parse_samtools_mpileup_line
+from concordance import compare_genotype_likelihoods
+from synthetic import subset_markers, simulate_genotypes, simulate_reads, gatk_pileup_line, samtools_pileup_line, make_cohort
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+
+class TestSynthetic(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = mkdtemp()
+        self.markers_data = subset_markers(get_markers(marker_file), 300)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_subset_markers(self):
+        """
+        Test that the subset is spread over the panel and keeps its order
+        """
+        self.assertEqual(len(self.markers_data), 300)
+        all_markers = list(get_markers(marker_file).keys())
+        keys = list(self.markers_data.keys())
+        self.assertEqual(keys[0], all_markers[0])
+        self.assertEqual(keys, sorted(keys, key = all_markers.index))
+        self.assertEqual(len(subset_markers(self.markers_data, None)), 300)
+
+    def test_pileup_lines(self):
+        """
+        Test that the same reads parse to the same base qualities from both pileup formats
+        """
+        rng = random.Random(0)
+        marker = list(self.markers_data.values())[0]
+        reads = simulate_reads(marker, 1, 40, rng)
+        gatk = parse_mpileup_line(gatk_pileup_line(marker, reads), min_map_quality = 10, min_base_quality = 20)
+        samtools = parse_samtools_mpileup_line(samtools_pileup_line(marker, reads), min_map_quality = 10, min_base_quality = 20)
+        for base in ['A', 'C', 'G', 'T']:
+            self.assertEqual(sorted(gatk.Quals[base]), sorted(samtools.Quals[base]))
+        self.assertTrue(len(gatk.Quals[marker.ref]) > 0)
+        self.assertTrue(len(gatk.Quals[marker.alt]) > 0)
+        self.assertEqual(samtools_pileup_line(marker, []).split('\t')[3], '0')
+
+    def test_genotypes(self):
+        """
+        Test that the genotypes follow the allele frequencies and are the same for the same seed
+        """
+        genotypes = simulate_genotypes(self.markers_data, random.Random(1))
+        self.assertEqual(genotypes, simulate_genotypes(self.markers_data, random.Random(1)))
+        self.assertEqual(set(genotypes.values()), set([0, 1, 2]))
+
+    def test_cohort(self):
+        """
+        Test that tumors match the normals of the individuals they were made from, including swapped tumors
+        """
+        truth = make_cohort(self.tmpdir, self.markers_data, num_samples = 3, depth = 30, swap_rate = 0.5, seed = 1)
+        self.assertEqual(len(truth), 3)
+        with open(os.path.join(self.tmpdir, 'tumors.txt')) as fin:
+            self.assertEqual([ line.strip() for line in fin ], [ row['tumor_pileup'] for row in truth ])
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'truth.tsv')))
+
+        normals = dict( (row['individual'], genotype_likelihoods_for_markers(self.markers_data, row['normal_pileup'], 10, 20)) for row in truth )
+        for row in truth:
+            tumor = genotype_likelihoods_for_markers(self.markers_data, row['tumor_pileup'], 10, 20)
+            for individual, normal in normals.items():
+                concordance_val = compare_genotype_likelihoods(tumor, normal, self.markers_data)[0]
+                if individual == row['tumor_individual']:
+                    self.assertTrue(concordance_val > 0.95)
+                else:
+                    self.assertTrue(concordance_val < 0.8)
+
+    def test_samtools_cohort(self):
+        """
+        Test that a samtools cohort has the same genotypes as a GATK cohort with the same seed
+        """
+        gatk = make_cohort(os.path.join(self.tmpdir, 'gatk'), self.markers_data, num_samples = 1, seed = 2)
+        samtools = make_cohort(os.path.join(self.tmpdir, 'samtools'), self.markers_data, num_samples = 1, pileup_format = 'samtools', seed = 2)
+        self.assertTrue(samtools[0]['normal_pileup'].endswith('.mpileup'))
+        gatk_likelihoods = genotype_likelihoods_for_markers(self.markers_data, gatk[0]['normal_pileup'], 10, 20)
+        samtools_likelihoods = genotype_likelihoods_for_markers(self.markers_data, samtools[0]['normal_pileup'], 10, 20)
+        for m in self.markers_data:
+            if gatk_likelihoods[m] is None:
+                self.assertEqual(samtools_likelihoods[m], None)
+                continue
+            self.assertEqual(gatk_likelihoods[m]['coverage'], samtools_likelihoods[m]['coverage'])
+            for gatk_likelihood, samtools_likelihood in zip(gatk_likelihoods[m]['likelihoods'], samtools_likelihoods[m]['likelihoods']):
+                self.assertAlmostEqual(gatk_likelihood / samtools_likelihood, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,14 +5,37 @@
 import sys
 import os
 import csv
+import json
 import glob
+import time
 import datetime
 import itertools
+import collections
 import argparse
-from multiprocessing import Pool
+import binascii
+import cProfile
+import functools
+from multiprocessing import Pool, Process
 from modules.ContaminationMarker import get_markers
-from modules.concordance import concordance
-from modules.loader import load_comparisons
+from modules.concordance import concordance, load_genotype_likelihoods, sequential_concordance, sequential_marker_order, init_sequential_worker
+from modules.loader import load_comparisons, load_samples, get_sample_name, FilteredPairs, pair_inputs
+from modules.pileup_io import is_stream
+from modules.sweep import run_parallel_sweep
+from modules.screen import select_screening_markers, top_candidates, run_parallel_screen
+from modules.identity import run_parallel_identity, group_samples, load_individuals, find_unexpected_groupings, default_block_size
+from modules.shard import parse_shard, shard_of_pair, merge_outputs
+from modules.distributed import Coordinator, run_worker
+from modules.scheduling import estimate_pair_costs, iter_pair_costs, largest_first, predict_makespan
+from modules.checkpoint import Checkpointer, pair_key, read_finished_pairs
+from modules.store import ResultsStore, make_params_key, split_stored_pairs, store_results
+from modules.supervisor import supervised_map
+from modules import metrics
+from modules import memory
+from modules.progress import ProgressReporter
+from modules.matrix import ConcordanceMatrix
+from modules.summary import BestMatches
+from modules.daemon import ConcordanceService, serve
+from modules.pair import marker_statistics, check_pair_statistics
 
 # get the path to the included default margers; Conpair-GRCh37-default
 THIS_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -27,53 +50,224 @@ def run_parallel_concordance(
     min_mapping_quality,
     normal_homozygous_markers_only,
     min_cov,
-    min_base_quality):
+    min_base_quality,
+    preloaded_likelihoods = None,
+    sequential_args = None,
+    task_timeout = None,
+    max_retries = 1,
+    speculative_factor = None,
+    profile_dir = None,
+    on_done = None):
     """
     Run all the parallel instances of concordance comparisons and yield the results
+    preloaded_likelihoods is an optional dict of genotype likelihoods keyed by input path, to use in place of reading those inputs again
+    sequential_args is an optional dict of keyword arguments for `concordance.sequential_concordance`; when it is given the comparisons use the sequential test
+    and each result also has the markers consumed and the decision
+    When task_timeout or speculative_factor is given the comparisons are supervised (see `supervisor.supervised_map`): results are yielded as they finish,
+    and each one ends with a status of 'ok', 'timeout' or 'failed: <error>' instead of a failed comparison stopping the run
+    When metrics are enabled the workers send back their metrics with each result, and with profile_dir they also dump their cProfile stats there
+    on_done is called with no arguments as each comparison finishes, which can be before its result is yielded, for progress reporting
     """
-    # start multiprocessing pool
-    pool = Pool(int(num_threads))
-
-    # generate the aysnc result instances
-    results = []
-    for tumor_pileup, normal_pileup, tumor_name, normal_name in pairs:
-        result = pool.apply_async(concordance, args=(
-            tumor_pileup,
-            normal_pileup,
+    if preloaded_likelihoods is None:
+        preloaded_likelihoods = {}
+    concordance_func = concordance
+    empty_values = (None, None, None)
+    initializer = None
+    initargs = ()
+    if sequential_args is not None:
+        concordance_func = sequential_concordance
+        empty_values = (None, None, None, None, None)
+        # send the marker order to each process once instead of with every pair
+        sequential_args = dict(sequential_args)
+        marker_order = sequential_args.pop('marker_order', None)
+        if marker_order is None:
+            marker_order = sequential_marker_order(markers_data)
+        initializer = init_sequential_worker
+        initargs = (markers_data, marker_order)
+    collect_metrics = metrics.ENABLED
+    task_func = metrics.run_task if collect_metrics else concordance_func
+
+    def make_task(tumor_pileup, normal_pileup):
+        # -> (args, kwds) of task_func
+        args = (
+            preloaded_likelihoods.get(tumor_pileup, tumor_pileup),
+            preloaded_likelihoods.get(normal_pileup, normal_pileup),
             markers_data,
             min_mapping_quality,
             normal_homozygous_markers_only,
             min_cov,
             min_base_quality
             )
-        )
-        result_tup = (tumor_pileup, normal_pileup, tumor_name, normal_name, result)
-        results.append(result_tup)
+        if collect_metrics:
+            return((concordance_func, args, sequential_args or {}, profile_dir), {})
+        return(args, sequential_args or {})
 
-    # get each result
-    for result_tup in results:
-        tumor_pileup, normal_pileup, tumor_name, normal_name, result = result_tup
+    def task_values(value):
+        if collect_metrics:
+            value, task_metrics = value
+            metrics.merge(task_metrics)
+        return(tuple(value))
+
+    if task_timeout is not None or speculative_factor is not None:
+        # the supervisor reads the tasks lazily, a window at a time; keep the pairs it has read until their results come back
+        in_flight = {} # task index -> pair
+        def make_tasks():
+            for task_id, pair in enumerate(pairs):
+                in_flight[task_id] = pair
+                yield(make_task(pair[0], pair[1]))
+        supervised_results = supervised_map(task_func, make_tasks(), num_threads,
+            timeout = task_timeout,
+            max_retries = max_retries,
+            speculative_factor = speculative_factor,
+            final_exceptions = (ZeroDivisionError,),
+            initializer = initializer,
+            initargs = initargs)
+        for task_id, status, value in supervised_results:
+            values = empty_values
+            if status == 'ok':
+                values = task_values(value)
+            elif isinstance(value, ZeroDivisionError):
+                # no shared markers that meet the coverage requirements; not a failure of the task
+                status = 'ok'
+            elif status == 'failed':
+                status = 'failed: {0}: {1}'.format(type(value).__name__, ' '.join(str(value).split()))
+            pair = in_flight.pop(task_id)
+            if on_done is not None:
+                on_done()
+            if status != 'ok':
+                sys.stderr.write("Comparison of {0} and {1} did not finish: {2}\n".format(pair[2], pair[3], status))
+            yield(tuple(pair) + values + (status,))
+        return
+
+    # start multiprocessing pool
+    pool = Pool(int(num_threads), initializer = initializer, initargs = initargs)
+
+    # keep a bounded window of async results in the pool and submit the next pair as each result is taken in order,
+    # so that the pairs are read lazily and only the results of the window are queued up
+    window_size = int(num_threads) * 8
+    pair_iter = iter(pairs)
+    pending = collections.deque()
+    # count the comparisons as they finish in the pool rather than as they are taken in order;
+    # Python 2 has no error_callback, so there the comparisons without shared markers are counted when they are taken
+    async_kwds = {}
+    count_errors_in_order = False
+    if on_done is not None:
+        async_kwds['callback'] = lambda value: on_done()
+        if sys.version_info[0] >= 3:
+            async_kwds['error_callback'] = lambda error: on_done()
+        else:
+            count_errors_in_order = True
+    while True:
+        for tumor_pileup, normal_pileup, tumor_name, normal_name in itertools.islice(pair_iter, window_size - len(pending)):
+            args, kwds = make_task(tumor_pileup, normal_pileup)
+            result = pool.apply_async(task_func, args = args, kwds = kwds, **async_kwds)
+            pending.append((tumor_pileup, normal_pileup, tumor_name, normal_name, result))
+        if not pending:
+            break
+        tumor_pileup, normal_pileup, tumor_name, normal_name, result = pending.popleft()
         try:
-            concordance_val, num_markers_used, num_total_markers = result.get()
+            with metrics.timer('pool.wait'):
+                values = task_values(result.get())
         except ZeroDivisionError:
             # if concordant+discordant == 0:
             #     print('WARNING: There are no shared markers between the tumor and the normal samples that meet the specified coverage requirements ({0})\nIs the coverage of your samples high enough?\nExiting...'.format(min_cov))
             #     sys.exit(0)
-            concordance_val = None
-            num_markers_used = None
-            num_total_markers = None
-        yield(tumor_pileup, normal_pileup, tumor_name, normal_name, concordance_val, num_markers_used, num_total_markers)
+            values = empty_values
+            if count_errors_in_order:
+                on_done()
+        yield((tumor_pileup, normal_pileup, tumor_name, normal_name) + tuple(values))
+    # wait for the workers to exit so that their peak memory is counted in `memory.peak_worker_rss`
+    pool.close()
+    pool.join()
 
-def save_benchmarks_to_file(benchmarks_file, num_threads, num_pairs, num_tumors, num_normals, action):
+def preload_streams(pairs, markers_data, min_mapping_quality, min_base_quality):
+    """
+    Load the genotype likelihoods of the inputs of the pairs that are stdin or named pipes, keyed by input path; each input is checked only once
+    """
+    preloaded_likelihoods = {}
+    checked = set()
+    for pileup in pair_inputs(pairs):
+        if pileup in checked:
+            continue
+        checked.add(pileup)
+        if is_stream(pileup):
+            preloaded_likelihoods[pileup] = load_genotype_likelihoods(pileup, markers_data, min_mapping_quality = min_mapping_quality, min_base_quality = min_base_quality)
+    return(preloaded_likelihoods)
+
+def save_benchmarks_to_file(benchmarks_file, num_threads, num_pairs, num_tumors, num_normals, action, predicted_makespan = None, achieved_makespan = None):
     """
     Append benchmark metrics to a file
+    the predicted and achieved makespans are the estimated and actual seconds taken to compute the pairs, or NA if they were not measured;
+    they are followed by the peak memory in MB of the main process, of the largest worker, and the estimated total of the main process and all the workers
     """
     timestop = datetime.datetime.now()
     time_taken = (timestop - timestart).seconds
+    makespans = [ 'NA' if v is None else '{0:.1f}'.format(v) for v in [predicted_makespan, achieved_makespan] ]
+    peak_rss = [ 'NA' if v is None else '{0:.1f}'.format(v / 1024.0 ** 2) for v in [memory.peak_rss(), memory.peak_worker_rss(), memory.peak_total_rss(num_threads)] ]
     with open(benchmarks_file, 'a') as fout:
-        line = '\t'.join([str(num_threads), str(time_taken), str(num_pairs), str(num_tumors), str(num_normals), str(action)]) + '\n'
+        line = '\t'.join([str(num_threads), str(time_taken), str(num_pairs), str(num_tumors), str(num_normals), str(action)] + makespans + peak_rss) + '\n'
         fout.write(line)
 
+def start_metrics(collect_metrics, profile_dir):
+    """
+    Enable the metrics for a run; with a profile_dir the main process is profiled as well, and the profiler is returned
+    collect_metrics is also set for progress reports, which use the timers to find the bottleneck stage
+    """
+    if profile_dir is None:
+        metrics.enable(collect_metrics)
+        return(None)
+    metrics.enable()
+    if not os.path.exists(profile_dir):
+        os.makedirs(profile_dir)
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return(profiler)
+
+def finish_metrics(command, output_file, metrics_file, profile_dir, profiler, write_metrics = True, **run_info):
+    """
+    Write the metrics of a run as JSON lines, by default next to the output file, and the cProfile stats of the main process
+    with write_metrics False the metrics are only written for a profiled run; metrics enabled just for progress reports are not
+    """
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(os.path.join(profile_dir, 'main.prof'))
+    if not metrics.ENABLED or not (write_metrics or profile_dir is not None):
+        return
+    if metrics_file is None:
+        metrics_file = '-' if output_file is None or output_file == '-' else output_file + '.metrics.jsonl'
+    run_info.update({
+        'command': command,
+        'started': timestart.isoformat(),
+        'wall_seconds': (datetime.datetime.now() - timestart).total_seconds(),
+        'python': sys.version.split()[0],
+        'argv': sys.argv,
+        'peak_rss_bytes': memory.peak_rss(),
+        'peak_worker_rss_bytes': memory.peak_worker_rss()
+    })
+    if metrics_file == '-':
+        metrics.write_metrics(sys.stderr, run_info)
+    else:
+        with open(metrics_file, "w") as fout:
+            metrics.write_metrics(fout, run_info)
+
+def concordance_row(tumor_pileup, normal_pileup, tumor_name, normal_name, concordance_val, num_markers_used, num_total_markers, print_filepath = False):
+    """
+    Make the concordance output row of a result
+    """
+    row = {
+    'tumor_filename': os.path.basename(tumor_pileup),
+    'normal_filename': os.path.basename(normal_pileup),
+    'tumor': tumor_name,
+    'normal': normal_name,
+    'concordance': concordance_val,
+    'num_markers_used': num_markers_used,
+    'num_total_markers': num_total_markers
+    }
+    if print_filepath:
+        row["tumor_filepath"] = tumor_pileup
+        row["normal_filepath"] = normal_pileup
+    return(row)
+
 def run_concordance(**kwargs):
     """
     Main control function for running concordance in parallel for a list of tumors and normals
@@ -96,7 +290,44 @@ def run_concordance(**kwargs):
     print_filepath = kwargs.pop('print_filepath')
     use_manifests = kwargs.pop('use_manifests', False)
     manifest_dir = kwargs.pop('manifest_dir', None)
+    store_file = kwargs.pop('store_file', None)
+    resume = kwargs.pop('resume', False)
+    checkpoint_interval = kwargs.pop('checkpoint_interval', 60)
+    schedule = kwargs.pop('schedule', 'input-order')
+    shard = kwargs.pop('shard', None)
+    sequential = kwargs.pop('sequential', False)
+    match_discordance = kwargs.pop('match_discordance', 0.1)
+    nonmatch_discordance = kwargs.pop('nonmatch_discordance', 0.5)
+    error_rate = kwargs.pop('error_rate', 0.001)
+    task_timeout = kwargs.pop('task_timeout', None)
+    max_retries = kwargs.pop('max_retries', 1)
+    speculative_factor = kwargs.pop('speculative_factor', None)
+    supervised = task_timeout is not None or speculative_factor is not None
+    collect_metrics = kwargs.pop('collect_metrics', False)
+    metrics_file = kwargs.pop('metrics_file', None)
+    profile_dir = kwargs.pop('profile_dir', None)
+    memory_budget = kwargs.pop('memory_budget', None)
+    show_progress = kwargs.pop('show_progress', False)
+    progress_interval = kwargs.pop('progress_interval', 30.0)
+    progress_textfile = kwargs.pop('progress_textfile', None)
+    report_progress = show_progress or progress_textfile is not None
+    output_format = kwargs.pop('output_format', 'tsv')
+    top_k = kwargs.pop('top_k', None)
+    min_concordance = kwargs.pop('min_concordance', None)
+    summarize = top_k is not None or min_concordance is not None
 
+    profiler = start_metrics(collect_metrics or report_progress, profile_dir)
+    stopwatch = metrics.Stopwatch()
+
+    if sequential and store_file:
+        raise Exception("--store does not keep the results of the --sequential test")
+    if output_format == 'matrix':
+        if output_file is None or output_file == '-':
+            raise Exception("--output-format matrix needs an --output-file to write to")
+        if resume or sequential:
+            raise Exception("--output-format matrix can not be used with --resume or --sequential")
+    if summarize and (resume or output_format == 'matrix'):
+        raise Exception("--top-k and --min-concordance write the summary at the end of the run, so they can not be used with --resume or --output-format matrix")
 
     # load all comparisons of each tumor vs each normal
     pairs, num_tumors_loaded, num_normals_loaded = load_comparisons(
@@ -110,18 +341,593 @@ def run_concordance(**kwargs):
         manifest_dir = manifest_dir
         )
 
+    # keep only the pairs of this shard
+    if shard is not None:
+        shard_index, num_shards = shard
+        pairs = FilteredPairs(pairs, lambda pair: shard_of_pair(pair, num_shards) == shard_index)
+    stopwatch.lap('run.load_comparisons')
+
+    # the matrix has a row for every tumor and a column for every normal, including the pairs that are skipped below
+    matrix = None
+    if output_format == 'matrix':
+        matrix = ConcordanceMatrix.from_pairs(pairs)
+
+    conc_fieldnames = ['concordance', 'num_markers_used', 'num_total_markers', 'tumor', 'normal', 'tumor_filename', 'normal_filename']
+    if print_filepath:
+        conc_fieldnames.append("tumor_filepath")
+        conc_fieldnames.append("normal_filepath")
+    if sequential:
+        conc_fieldnames.append("markers_consumed")
+        conc_fieldnames.append("decision")
+    if supervised:
+        conc_fieldnames.append("status")
+    if summarize:
+        conc_fieldnames.extend(["tumor_rank", "normal_rank", "above_min_concordance"])
+
+    # skip the comparisons that are already in the output file of an interrupted run
+    finished_pairs = None
+    if resume:
+        if output_file is None or output_file == '-':
+            raise Exception("--resume needs an --output-file to resume from")
+        finished_pairs = read_finished_pairs(output_file, conc_fieldnames)
+        if finished_pairs:
+            pairs = FilteredPairs(pairs, lambda pair: pair_key(*pair) not in finished_pairs)
+
+    # skip the comparisons that are already in the results store
+    stored_results = []
+    if store_file:
+        store = ResultsStore(store_file)
+        params = make_params_key(markers, min_mapping_quality, min_base_quality, min_cov, normal_homozygous_markers_only)
+        stored_results, pairs = split_stored_pairs(pairs, store, params)
+        if supervised:
+            stored_results = ( result + ('ok',) for result in stored_results )
+
     num_pairs = len(pairs)
+    stopwatch.lap('run.skip_finished')
 
     # load the data for the markers
     markers_data = get_markers(markers)
+    stopwatch.lap('run.load_markers')
 
-    # open output file for writing
-    if output_file is None or output_file == '-':
+    sequential_args = None
+    if sequential:
+        sequential_args = {
+            'match_discordance': match_discordance,
+            'nonmatch_discordance': nonmatch_discordance,
+            'error_rate': error_rate,
+            'marker_order': sequential_marker_order(markers_data)
+        }
+
+    # inputs from stdin or named pipes can only be read once, so load them up front and share them between all their comparisons
+    preloaded_likelihoods = preload_streams(pairs, markers_data, min_mapping_quality, min_base_quality)
+    stopwatch.lap('run.preload_streams')
+
+    # fit the workers in the memory budget; each one holds the likelihoods of the two samples it compares
+    if memory_budget is not None:
+        num_threads = memory.plan_workers(memory_budget, num_threads, len(markers_data), 2)
+
+    # open output file for writing; a resumed run appends to the rows that are already there
+    # the matrix is kept in memory and written at the end instead
+    if matrix is not None:
+        fout = None
+    elif output_file is None or output_file == '-':
         fout = sys.stdout
+    elif finished_pairs is not None:
+        fout = open(output_file, "a")
     else:
         fout = open(output_file, "w")
 
     # initialize the output file writer
+    if fout is not None:
+        conc_writer = csv.DictWriter(fout, delimiter = '\t', fieldnames = conc_fieldnames, lineterminator='\n')
+        if finished_pairs is None:
+            conc_writer.writeheader()
+        checkpointer = Checkpointer(fout, interval = checkpoint_interval)
+        checkpointer.sync()
+
+    # with --schedule largest-first, start the most expensive comparisons first so that large inputs are not left for the end; this needs all the pairs in a list
+    # the predicted makespan is only made for the benchmarks, since estimating the costs looks at every input
+    costs = None
+    if schedule == 'largest-first':
+        pairs, costs = largest_first(pairs, estimate_pair_costs(pairs, preloaded_likelihoods))
+    predicted_makespan = None
+    if save_benchmarks:
+        if costs is None:
+            costs = iter_pair_costs(pairs, preloaded_likelihoods)
+        predicted_makespan = predict_makespan(costs, num_threads)
+    stopwatch.lap('run.schedule')
+
+    def make_row(result):
+        row = concordance_row(*result[0:7], print_filepath = print_filepath)
+        if sequential:
+            row["markers_consumed"], row["decision"] = result[7:9]
+        if supervised:
+            row["status"] = result[-1]
+        return(row)
+
+    # a summary keeps only the best matches of each sample and the pairs above the threshold as the results stream in, and is written at the end
+    summary = None
+    if summarize:
+        summary = BestMatches(top_k = top_k, min_concordance = min_concordance)
+
+    # run all the comparisons in parallel and write their concordance outputs as they arrive
+    progress = None
+    if report_progress:
+        progress = ProgressReporter(num_pairs, "concordance", interval = progress_interval, stream = sys.stderr if show_progress else None, textfile = progress_textfile).start()
+    compute_start = time.time()
+    # progress counts the comparisons as they finish, and not the stored results
+    on_done = progress.update if progress is not None else None
+    results = run_parallel_concordance(pairs, markers_data, num_threads, min_mapping_quality, normal_homozygous_markers_only, min_cov, min_base_quality, preloaded_likelihoods = preloaded_likelihoods, sequential_args = sequential_args, task_timeout = task_timeout, max_retries = max_retries, speculative_factor = speculative_factor, profile_dir = profile_dir, on_done = on_done)
+    if store_file:
+        results = itertools.chain(stored_results, store_results(results, store, params))
+    for result in results:
+        if matrix is not None:
+            with metrics.timer('run.write_output'):
+                matrix.add(*result[0:7])
+            continue
+        if summary is not None:
+            with metrics.timer('run.summarize'):
+                summary.add(result)
+            continue
+        with metrics.timer('run.write_output'):
+            conc_writer.writerow(make_row(result))
+            checkpointer.update()
+    achieved_makespan = time.time() - compute_start
+    if progress is not None:
+        progress.stop()
+    if summary is not None:
+        with metrics.timer('run.write_output'):
+            for result, tumor_rank, normal_rank, above_min_concordance in summary.rows():
+                row = make_row(result)
+                row["tumor_rank"] = tumor_rank
+                row["normal_rank"] = normal_rank
+                row["above_min_concordance"] = above_min_concordance
+                conc_writer.writerow(row)
+    if matrix is not None:
+        with metrics.timer('run.write_output'):
+            matrix.save(output_file)
+    else:
+        checkpointer.sync()
+        fout.close()
+    stopwatch.lap('run.compute')
+
+    if store_file:
+        store.close()
+
+    if save_benchmarks:
+        save_benchmarks_to_file(benchmarks_file = benchmarks_file, num_threads = num_threads, num_pairs = num_pairs, num_tumors = num_tumors_loaded, num_normals = num_normals_loaded, action = "concordance", predicted_makespan = predicted_makespan, achieved_makespan = achieved_makespan)
+
+    finish_metrics("concordance", output_file, metrics_file, profile_dir, profiler, write_metrics = collect_metrics, num_pairs = num_pairs, num_threads = num_threads)
+
+def run_sweep(**kwargs):
+    """
+    Main control function for running concordance for a list of tumors and normals over a grid of quality and coverage thresholds
+    """
+    tumor = kwargs.pop('tumor', None)
+    normal = kwargs.pop('normal', None)
+    output_file = kwargs.pop('output_file', None) # 'sweep.tsv'
+    num_normals = kwargs.pop('num_normals', 'all')
+    num_tumors = kwargs.pop('num_tumors', 'all')
+    normals_list = kwargs.pop('normals_list', None) # "normals.txt"
+    tumors_list = kwargs.pop('tumors_list', None) # "tumors.txt"
+    markers = kwargs.pop('markers', default_marker_file)
+    num_threads = kwargs.pop('num_threads', 4)
+    min_mapping_qualities = kwargs.pop('min_mapping_qualities', [10])
+    min_base_qualities = kwargs.pop('min_base_qualities', [20])
+    min_covs = kwargs.pop('min_covs', [10])
+    normal_homozygous_markers_only = kwargs.pop('normal_homozygous_markers_only', False)
+    print_filepath = kwargs.pop('print_filepath', False)
+    use_manifests = kwargs.pop('use_manifests', False)
+    manifest_dir = kwargs.pop('manifest_dir', None)
+    collect_metrics = kwargs.pop('collect_metrics', False)
+    metrics_file = kwargs.pop('metrics_file', None)
+    profile_dir = kwargs.pop('profile_dir', None)
+    memory_budget = kwargs.pop('memory_budget', None)
+    show_progress = kwargs.pop('show_progress', False)
+    progress_interval = kwargs.pop('progress_interval', 30.0)
+    progress_textfile = kwargs.pop('progress_textfile', None)
+    report_progress = show_progress or progress_textfile is not None
+
+    profiler = start_metrics(collect_metrics or report_progress, profile_dir)
+    stopwatch = metrics.Stopwatch()
+
+    pairs, num_tumors_loaded, num_normals_loaded = load_comparisons(
+        tumor = tumor,
+        normal = normal,
+        normals_list = normals_list,
+        tumors_list = tumors_list,
+        num_tumors = num_tumors,
+        num_normals = num_normals,
+        use_manifests = use_manifests,
+        manifest_dir = manifest_dir
+        )
+    stopwatch.lap('run.load_comparisons')
+    markers_data = get_markers(markers)
+    stopwatch.lap('run.load_markers')
+
+    # fit the workers and the loaded pileups in the memory budget; each worker parses one pileup at a time into its histograms
+    # and a likelihood set for each quality setting, and the main process keeps the likelihood sets of the pileups of the current batch
+    max_resident = None
+    if memory_budget is not None:
+        num_settings = len(min_mapping_qualities) * len(min_base_qualities)
+        num_threads = memory.plan_workers(memory_budget, num_threads, len(markers_data), num_settings + 1)
+        workers_bytes = num_threads * memory.worker_bytes(len(markers_data), num_settings + 1)
+        max_resident = memory.plan_resident_sets(memory.available_bytes(memory_budget, workers_bytes), len(markers_data), minimum = 2 * num_settings) // num_settings
+
+    if output_file is None or output_file == '-':
+        fout = sys.stdout
+    else:
+        fout = open(output_file, "w")
+
+    fieldnames = ['min_mapping_quality', 'min_base_quality', 'min_cov', 'concordance', 'num_markers_used', 'num_total_markers', 'tumor', 'normal', 'tumor_filename', 'normal_filename']
+    if print_filepath:
+        fieldnames.append("tumor_filepath")
+        fieldnames.append("normal_filepath")
+    writer = csv.DictWriter(fout, delimiter = '\t', fieldnames = fieldnames, lineterminator='\n')
+    writer.writeheader()
+
+    progress = None
+    if report_progress:
+        num_comparisons = len(pairs) * len(min_mapping_qualities) * len(min_base_qualities) * len(min_covs)
+        progress = ProgressReporter(num_comparisons, "sweep", unit = 'comparisons', interval = progress_interval, stream = sys.stderr if show_progress else None, textfile = progress_textfile).start()
+    for tumor_pileup, normal_pileup, tumor_name, normal_name, min_mapping_quality, min_base_quality, min_cov, concordance_val, num_markers_used, num_total_markers in run_parallel_sweep(pairs, markers_data, num_threads, min_mapping_qualities, min_base_qualities, min_covs, normal_homozygous_markers_only = normal_homozygous_markers_only, profile_dir = profile_dir, max_resident = max_resident):
+        row = {
+        'min_mapping_quality': min_mapping_quality,
+        'min_base_quality': min_base_quality,
+        'min_cov': min_cov,
+        'tumor_filename': os.path.basename(tumor_pileup),
+        'normal_filename': os.path.basename(normal_pileup),
+        'tumor': tumor_name,
+        'normal': normal_name,
+        'concordance': concordance_val,
+        'num_markers_used': num_markers_used,
+        'num_total_markers': num_total_markers
+        }
+        if print_filepath:
+            row["tumor_filepath"] = tumor_pileup
+            row["normal_filepath"] = normal_pileup
+        writer.writerow(row)
+        if progress is not None:
+            progress.update()
+    if progress is not None:
+        progress.stop()
+    fout.close()
+    stopwatch.lap('run.compute')
+
+    finish_metrics("sweep", output_file, metrics_file, profile_dir, profiler, write_metrics = collect_metrics, num_pairs = len(pairs), num_threads = num_threads)
+
+def run_screen(**kwargs):
+    """
+    Main control function for screening all pairs of a list of tumors and normals on a subset of the markers,
+    then running the full concordance for the best candidate normals of each tumor
+    """
+    tumor = kwargs.pop('tumor', None)
+    normal = kwargs.pop('normal', None)
+    output_file = kwargs.pop('output_file', None) # 'screen.tsv'
+    num_normals = kwargs.pop('num_normals', 'all')
+    num_tumors = kwargs.pop('num_tumors', 'all')
+    normals_list = kwargs.pop('normals_list', None) # "normals.txt"
+    tumors_list = kwargs.pop('tumors_list', None) # "tumors.txt"
+    markers = kwargs.pop('markers', default_marker_file)
+    num_threads = kwargs.pop('num_threads', 4)
+    min_mapping_quality = kwargs.pop('min_mapping_quality', 10)
+    normal_homozygous_markers_only = kwargs.pop('normal_homozygous_markers_only', False)
+    min_cov = kwargs.pop('min_cov', 10)
+    min_base_quality = kwargs.pop('min_base_quality', 20)
+    screen_fraction = kwargs.pop('screen_fraction', 0.05)
+    top = kwargs.pop('top', 3)
+    print_filepath = kwargs.pop('print_filepath', False)
+    use_manifests = kwargs.pop('use_manifests', False)
+    manifest_dir = kwargs.pop('manifest_dir', None)
+
+    pairs, num_tumors_loaded, num_normals_loaded = load_comparisons(
+        tumor = tumor,
+        normal = normal,
+        normals_list = normals_list,
+        tumors_list = tumors_list,
+        num_tumors = num_tumors,
+        num_normals = num_normals,
+        use_manifests = use_manifests,
+        manifest_dir = manifest_dir
+        )
+    markers_data = get_markers(markers)
+    screening_markers = select_screening_markers(markers_data, fraction = screen_fraction)
+
+    # inputs from stdin or named pipes can only be read once, so load them in full up front for both stages
+    preloaded_likelihoods = preload_streams(pairs, markers_data, min_mapping_quality, min_base_quality)
+
+    if output_file is None or output_file == '-':
+        fout = sys.stdout
+    else:
+        fout = open(output_file, "w")
+
+    fieldnames = ['stage', 'concordance', 'num_markers_used', 'num_total_markers', 'tumor', 'normal', 'tumor_filename', 'normal_filename']
+    if print_filepath:
+        fieldnames.append("tumor_filepath")
+        fieldnames.append("normal_filepath")
+    writer = csv.DictWriter(fout, delimiter = '\t', fieldnames = fieldnames, lineterminator='\n')
+    writer.writeheader()
+
+    def write_results(results, stage):
+        for tumor_pileup, normal_pileup, tumor_name, normal_name, concordance_val, num_markers_used, num_total_markers in results:
+            row = {
+            'stage': stage,
+            'tumor_filename': os.path.basename(tumor_pileup),
+            'normal_filename': os.path.basename(normal_pileup),
+            'tumor': tumor_name,
+            'normal': normal_name,
+            'concordance': concordance_val,
+            'num_markers_used': num_markers_used,
+            'num_total_markers': num_total_markers
+            }
+            if print_filepath:
+                row["tumor_filepath"] = tumor_pileup
+                row["normal_filepath"] = normal_pileup
+            writer.writerow(row)
+
+    # compare all pairs on the screening markers, then the best candidates for each tumor on all the markers
+    screen_results = run_parallel_screen(pairs, screening_markers, num_threads, min_mapping_quality, normal_homozygous_markers_only, min_cov, min_base_quality, preloaded_likelihoods = preloaded_likelihoods)
+    write_results(screen_results, "screen")
+    candidates = top_candidates(screen_results, top = top)
+    write_results(run_parallel_concordance(candidates, markers_data, num_threads, min_mapping_quality, normal_homozygous_markers_only, min_cov, min_base_quality, preloaded_likelihoods = preloaded_likelihoods), "full")
+    fout.close()
+
+def run_identity(**kwargs):
+    """
+    Main control function for comparing every sample in a single list against every other one and grouping them into individuals
+    """
+    samples = kwargs.pop('samples', None)
+    samples_list = kwargs.pop('samples_list', None) # "samples.txt"
+    num_samples = kwargs.pop('num_samples', 'all')
+    output_file = kwargs.pop('output_file', None) # 'identity.tsv'
+    groups_file = kwargs.pop('groups_file', None) # 'groups.tsv'
+    individuals_file = kwargs.pop('individuals_file', None)
+    threshold = kwargs.pop('threshold', 0.8)
+    block_size = kwargs.pop('block_size', None)
+    markers = kwargs.pop('markers', default_marker_file)
+    num_threads = kwargs.pop('num_threads', 4)
+    min_mapping_quality = kwargs.pop('min_mapping_quality', 10)
+    normal_homozygous_markers_only = kwargs.pop('normal_homozygous_markers_only', False)
+    min_cov = kwargs.pop('min_cov', 10)
+    min_base_quality = kwargs.pop('min_base_quality', 20)
+    print_filepath = kwargs.pop('print_filepath', False)
+    use_manifests = kwargs.pop('use_manifests', False)
+    manifest_dir = kwargs.pop('manifest_dir', None)
+    memory_budget = kwargs.pop('memory_budget', None)
+
+    sample_files = load_samples(
+        samples = samples,
+        samples_list = samples_list,
+        num_samples = num_samples,
+        use_manifests = use_manifests,
+        manifest_dir = manifest_dir
+        )
+    pileups = [ pileup for pileup, name in sample_files ]
+    names = [ name for pileup, name in sample_files ]
+    markers_data = get_markers(markers)
+    individuals = None
+    if individuals_file:
+        individuals = load_individuals(individuals_file)
+
+    # inputs from stdin or named pipes can only be read once, so load them up front
+    samples_data = [ load_genotype_likelihoods(pileup, markers_data, min_mapping_quality = min_mapping_quality, min_base_quality = min_base_quality) if is_stream(pileup) else pileup for pileup in pileups ]
+
+    # fit the workers in the memory budget; each task holds the likelihoods of two blocks of samples, so the blocks are sized to the share of each worker
+    if memory_budget is not None:
+        num_threads = memory.plan_workers(memory_budget, num_threads, len(markers_data), 2)
+        if block_size is None:
+            worker_budget = memory.available_bytes(memory_budget) / num_threads - memory.worker_bytes(len(markers_data), 0)
+            block_size = min(memory.plan_resident_sets(worker_budget, len(markers_data), minimum = 2) // 2, default_block_size(len(pileups), num_threads))
+
+    if output_file is None or output_file == '-':
+        fout = sys.stdout
+    else:
+        fout = open(output_file, "w")
+
+    fieldnames = ['concordance', 'num_markers_used', 'num_total_markers', 'sample1', 'sample2', 'sample1_filename', 'sample2_filename']
+    if print_filepath:
+        fieldnames.append("sample1_filepath")
+        fieldnames.append("sample2_filepath")
+    writer = csv.DictWriter(fout, delimiter = '\t', fieldnames = fieldnames, lineterminator='\n')
+    writer.writeheader()
+
+    def write_results(results):
+        for i, j, concordance_val, num_markers_used, num_total_markers in results:
+            row = {
+            'sample1_filename': os.path.basename(pileups[i]),
+            'sample2_filename': os.path.basename(pileups[j]),
+            'sample1': names[i],
+            'sample2': names[j],
+            'concordance': concordance_val,
+            'num_markers_used': num_markers_used,
+            'num_total_markers': num_total_markers
+            }
+            if print_filepath:
+                row["sample1_filepath"] = pileups[i]
+                row["sample2_filepath"] = pileups[j]
+            writer.writerow(row)
+            yield((i, j, concordance_val, num_markers_used, num_total_markers))
+
+    # write each pair as it comes in and fold it into the groups of individuals, without keeping all the pairs in memory
+    results = run_parallel_identity(samples_data, markers_data, num_threads, min_mapping_quality, normal_homozygous_markers_only, min_cov, min_base_quality, block_size = block_size)
+    sample_groups = group_samples(len(pileups), write_results(results), threshold = threshold)
+    fout.close()
+
+    # check the groups against the expected individuals
+    problems = find_unexpected_groupings(names, sample_groups, individuals = individuals)
+    if groups_file:
+        with open(groups_file, "w") as fout:
+            groups_writer = csv.writer(fout, delimiter = '\t', lineterminator='\n')
+            groups_writer.writerow(['group', 'sample', 'individual', 'filename', 'unexpected'])
+            for i in sorted(range(len(pileups)), key = lambda i: sample_groups[i]):
+                individual = names[i] if individuals is None else individuals.get(names[i], names[i])
+                groups_writer.writerow([sample_groups[i], names[i], individual, os.path.basename(pileups[i]), problems[i]])
+    for i, problem in enumerate(problems):
+        if problem:
+            sys.stderr.write("Unexpected grouping of sample {0} (group {1}): {2}\n".format(names[i], sample_groups[i], problem))
+
+def run_matrix_to_tsv(**kwargs):
+    """
+    Main control function for writing a concordance matrix file back out as the concordance TSV output
+    """
+    input_file = kwargs.pop('input_file')
+    output_file = kwargs.pop('output_file', None)
+    print_filepath = kwargs.pop('print_filepath', False)
+
+    matrix = ConcordanceMatrix.load(input_file)
+    if output_file is None or output_file == '-':
+        fout = sys.stdout
+    else:
+        fout = open(output_file, "w")
+    fieldnames = ['concordance', 'num_markers_used', 'num_total_markers', 'tumor', 'normal', 'tumor_filename', 'normal_filename']
+    if print_filepath:
+        fieldnames.append("tumor_filepath")
+        fieldnames.append("normal_filepath")
+    writer = csv.DictWriter(fout, delimiter = '\t', fieldnames = fieldnames, lineterminator='\n')
+    writer.writeheader()
+    for result in matrix.results():
+        writer.writerow(concordance_row(*result, print_filepath = print_filepath))
+    fout.close()
+
+def run_merge(**kwargs):
+    """
+    Main control function for merging the concordance outputs of several shards and checking that all the pairs were run once
+    """
+    input_files = kwargs.pop('input_files')
+    output_file = kwargs.pop('output_file', None)
+    tumor = kwargs.pop('tumor', None)
+    normal = kwargs.pop('normal', None)
+    tumors_list = kwargs.pop('tumors_list', None)
+    normals_list = kwargs.pop('normals_list', None)
+    num_tumors = kwargs.pop('num_tumors', 'all')
+    num_normals = kwargs.pop('num_normals', 'all')
+    use_manifests = kwargs.pop('use_manifests', False)
+    manifest_dir = kwargs.pop('manifest_dir', None)
+
+    # load the pairs that the shards should cover, if the inputs of the run were given
+    expected_pairs = None
+    if (tumor or tumors_list) and (normal or normals_list):
+        expected_pairs, num_tumors_loaded, num_normals_loaded = load_comparisons(
+            tumor = tumor,
+            normal = normal,
+            normals_list = normals_list,
+            tumors_list = tumors_list,
+            num_tumors = num_tumors,
+            num_normals = num_normals,
+            use_manifests = use_manifests,
+            manifest_dir = manifest_dir
+            )
+
+    if output_file is None or output_file == '-':
+        fout = sys.stdout
+    else:
+        fout = open(output_file, "w")
+    problems = merge_outputs(input_files, fout, expected_pairs = expected_pairs)
+    fout.close()
+
+    for problem in ['duplicated', 'missing', 'unexpected']:
+        for key in problems[problem]:
+            sys.stderr.write("{0} pair: tumor {1}, normal {2} ({3}, {4})\n".format(problem, *key))
+    if any(problems.values()):
+        sys.stderr.write("Shard outputs have {0} duplicated, {1} missing and {2} unexpected pairs\n".format(len(problems['duplicated']), len(problems['missing']), len(problems['unexpected'])))
+        sys.exit(1)
+
+def execute_concordance_batch(pairs, config, num_threads = 4):
+    """
+    Compute a batch of pairs handed out by a coordinator on this node, with the settings sent by the coordinator
+    """
+    return(run_parallel_concordance(
+        pairs,
+        config['markers_data'],
+        num_threads,
+        config['min_mapping_quality'],
+        config['normal_homozygous_markers_only'],
+        config['min_cov'],
+        config['min_base_quality']
+        ))
+
+def get_authkey(authkey):
+    """
+    Get the shared key for the coordinator and workers from the command line or the CONPAIR_AUTHKEY environment variable
+    """
+    authkey = authkey or os.environ.get('CONPAIR_AUTHKEY')
+    if authkey is None:
+        return(None)
+    return(authkey.encode('utf-8'))
+
+def run_coordinator(**kwargs):
+    """
+    Main control function for handing out the pairs of a list of tumors and normals to workers on other nodes and writing their results
+    """
+    tumor = kwargs.pop('tumor', None)
+    normal = kwargs.pop('normal', None)
+    output_file = kwargs.pop('output_file', None) # 'concordance.tsv'
+    num_normals = kwargs.pop('num_normals', 'all')
+    num_tumors = kwargs.pop('num_tumors', 'all')
+    normals_list = kwargs.pop('normals_list', None) # "normals.txt"
+    tumors_list = kwargs.pop('tumors_list', None) # "tumors.txt"
+    markers = kwargs.pop('markers', default_marker_file)
+    min_mapping_quality = kwargs.pop('min_mapping_quality', 10)
+    normal_homozygous_markers_only = kwargs.pop('normal_homozygous_markers_only', False)
+    min_cov = kwargs.pop('min_cov', 10)
+    min_base_quality = kwargs.pop('min_base_quality', 20)
+    print_filepath = kwargs.pop('print_filepath', False)
+    use_manifests = kwargs.pop('use_manifests', False)
+    manifest_dir = kwargs.pop('manifest_dir', None)
+    host = kwargs.pop('host', 'localhost')
+    port = kwargs.pop('port', 0)
+    authkey = get_authkey(kwargs.pop('authkey', None))
+    batch_size = kwargs.pop('batch_size', 100)
+    max_attempts = kwargs.pop('max_attempts', 3)
+    idle_timeout = kwargs.pop('idle_timeout', 600)
+    local_workers = kwargs.pop('local_workers', 0)
+    num_threads = kwargs.pop('num_threads', 4)
+
+    if authkey is None:
+        if not local_workers:
+            raise Exception("The workers need a shared key; use --authkey or set CONPAIR_AUTHKEY")
+        # only the local workers need to know it
+        authkey = binascii.hexlify(os.urandom(16))
+
+    pairs, num_tumors_loaded, num_normals_loaded = load_comparisons(
+        tumor = tumor,
+        normal = normal,
+        normals_list = normals_list,
+        tumors_list = tumors_list,
+        num_tumors = num_tumors,
+        num_normals = num_normals,
+        use_manifests = use_manifests,
+        manifest_dir = manifest_dir
+        )
+    for pair in [ pairs.tumors, pairs.normals ]:
+        for pileup, name in pair:
+            if is_stream(pileup):
+                raise Exception("Workers cannot read inputs from stdin or named pipes: " + pileup)
+
+    config = {
+        'markers_data': get_markers(markers),
+        'min_mapping_quality': min_mapping_quality,
+        'normal_homozygous_markers_only': normal_homozygous_markers_only,
+        'min_cov': min_cov,
+        'min_base_quality': min_base_quality
+    }
+    pairs, costs = largest_first(pairs, estimate_pair_costs(pairs))
+    coordinator = Coordinator(pairs, config, address = (host, port), authkey = authkey, batch_size = batch_size, max_attempts = max_attempts, idle_timeout = idle_timeout)
+    coordinator.start()
+    sys.stderr.write("Coordinator listening on {0}:{1} with {2} batches\n".format(coordinator.address[0], coordinator.address[1], len(coordinator.batches)))
+
+    # start workers on this node, e.g. for testing
+    workers = []
+    for i in range(local_workers):
+        worker = Process(target = run_worker, args = (coordinator.address, authkey, functools.partial(execute_concordance_batch, num_threads = num_threads)))
+        worker.start()
+        workers.append(worker)
+
+    if output_file is None or output_file == '-':
+        fout = sys.stdout
+    else:
+        fout = open(output_file, "w")
+
     conc_fieldnames = ['concordance', 'num_markers_used', 'num_total_markers', 'tumor', 'normal', 'tumor_filename', 'normal_filename']
     if print_filepath:
         conc_fieldnames.append("tumor_filepath")
@@ -129,8 +935,7 @@ def run_concordance(**kwargs):
     conc_writer = csv.DictWriter(fout, delimiter = '\t', fieldnames = conc_fieldnames, lineterminator='\n')
     conc_writer.writeheader()
 
-    # run all the comparisons in parallel and write their concordance outputs as they arrive
-    for tumor_pileup, normal_pileup, tumor_name, normal_name, concordance_val, num_markers_used, num_total_markers in run_parallel_concordance(pairs, markers_data, num_threads, min_mapping_quality, normal_homozygous_markers_only, min_cov, min_base_quality):
+    for tumor_pileup, normal_pileup, tumor_name, normal_name, concordance_val, num_markers_used, num_total_markers in coordinator.results():
         row = {
         'tumor_filename': os.path.basename(tumor_pileup),
         'normal_filename': os.path.basename(normal_pileup),
@@ -146,8 +951,190 @@ def run_concordance(**kwargs):
         conc_writer.writerow(row)
     fout.close()
 
-    if save_benchmarks:
-        save_benchmarks_to_file(benchmarks_file = benchmarks_file, num_threads = num_threads, num_pairs = num_pairs, num_tumors = num_tumors_loaded, num_normals = num_tumors_loaded, action = "concordance")
+    for worker in workers:
+        worker.join()
+
+    if coordinator.failed:
+        sys.stderr.write("{0} batches failed and their pairs have no results\n".format(len(coordinator.failed)))
+        sys.exit(1)
+
+def run_worker_command(**kwargs):
+    """
+    Main control function for a worker that computes batches of pairs from a coordinator
+    """
+    host = kwargs.pop('host')
+    port = kwargs.pop('port')
+    authkey = get_authkey(kwargs.pop('authkey', None))
+    num_threads = kwargs.pop('num_threads', 4)
+    connect_timeout = kwargs.pop('connect_timeout', 60)
+    if authkey is None:
+        raise Exception("The worker needs the coordinator's shared key; use --authkey or set CONPAIR_AUTHKEY")
+    num_batches = run_worker((host, port), authkey, functools.partial(execute_concordance_batch, num_threads = num_threads), timeout = connect_timeout)
+    sys.stderr.write("Worker finished {0} batches\n".format(num_batches))
+
+def run_pair(**kwargs):
+    """
+    Main control function for getting the concordance and the contamination of a tumor-normal pair from a single parse of each pileup
+    """
+    tumor = kwargs.pop('tumor')
+    normal = kwargs.pop('normal')
+    output_file = kwargs.pop('output_file', None)
+    output_format = kwargs.pop('output_format', 'tsv')
+    markers = kwargs.pop('markers', default_marker_file)
+    num_threads = kwargs.pop('num_threads', 2)
+    min_mapping_quality = kwargs.pop('min_mapping_quality', 10)
+    contamination_min_mapping_quality = kwargs.pop('contamination_min_mapping_quality', None)
+    min_base_quality = kwargs.pop('min_base_quality', 20)
+    min_cov = kwargs.pop('min_cov', 10)
+    normal_homozygous_markers_only = kwargs.pop('normal_homozygous_markers_only', False)
+    grid_precision = kwargs.pop('grid_precision', 0.01)
+    print_filepath = kwargs.pop('print_filepath', False)
+    use_manifests = kwargs.pop('use_manifests', False)
+    manifest_dir = kwargs.pop('manifest_dir', None)
+
+    if contamination_min_mapping_quality is None:
+        contamination_min_mapping_quality = min_mapping_quality
+    markers_data = get_markers(markers)
+    mapq_bins = [min_mapping_quality, contamination_min_mapping_quality]
+
+    # parse the tumor and the normal at the same time
+    if int(num_threads) > 1:
+        pool = Pool(2)
+        results = [ pool.apply_async(marker_statistics, args = (pileup, markers_data, mapq_bins)) for pileup in [tumor, normal] ]
+        tumor_histograms, normal_histograms = [ result.get() for result in results ]
+        pool.close()
+        pool.join()
+    else:
+        tumor_histograms, normal_histograms = [ marker_statistics(pileup, markers_data, mapq_bins) for pileup in [tumor, normal] ]
+
+    record = check_pair_statistics(
+        tumor_histograms,
+        normal_histograms,
+        markers_data,
+        min_mapping_quality = min_mapping_quality,
+        min_base_quality = min_base_quality,
+        min_cov = min_cov,
+        normal_homozygous_markers_only = normal_homozygous_markers_only,
+        contamination_min_mapping_quality = contamination_min_mapping_quality,
+        grid_precision = grid_precision)
+    record['tumor'] = get_sample_name(tumor, use_manifests = use_manifests, manifest_dir = manifest_dir)
+    record['normal'] = get_sample_name(normal, use_manifests = use_manifests, manifest_dir = manifest_dir)
+    record['tumor_filename'] = os.path.basename(tumor)
+    record['normal_filename'] = os.path.basename(normal)
+    if print_filepath:
+        record['tumor_filepath'] = tumor
+        record['normal_filepath'] = normal
+
+    if output_file is None or output_file == '-':
+        fout = sys.stdout
+    else:
+        fout = open(output_file, "w")
+    if output_format == 'json':
+        fout.write(json.dumps(record, indent = 4, separators = (',', ': ')) + '\n')
+    else:
+        writer = csv.DictWriter(fout, delimiter = '\t', fieldnames = list(record.keys()), lineterminator='\n')
+        writer.writeheader()
+        writer.writerow(record)
+    if fout is not sys.stdout:
+        fout.close()
+
+def run_daemon(**kwargs):
+    """
+    Main control function for running Conpair as a daemon that keeps the markers and reference samples loaded and answers requests over a Unix socket
+    """
+    socket_path = kwargs.pop('socket_path')
+    socket_mode = kwargs.pop('socket_mode', 0o600)
+    samples = kwargs.pop('samples', None)
+    samples_list = kwargs.pop('samples_list', None)
+    markers = kwargs.pop('markers', default_marker_file)
+    num_threads = kwargs.pop('num_threads', 4)
+    min_mapping_quality = kwargs.pop('min_mapping_quality', 10)
+    normal_homozygous_markers_only = kwargs.pop('normal_homozygous_markers_only', False)
+    min_cov = kwargs.pop('min_cov', 10)
+    min_base_quality = kwargs.pop('min_base_quality', 20)
+    cache_size = kwargs.pop('cache_size', 100)
+    use_manifests = kwargs.pop('use_manifests', False)
+    manifest_dir = kwargs.pop('manifest_dir', None)
+
+    markers_data = get_markers(markers)
+    service = ConcordanceService(markers_data,
+        min_mapping_quality = min_mapping_quality,
+        min_base_quality = min_base_quality,
+        min_cov = min_cov,
+        normal_homozygous_markers_only = normal_homozygous_markers_only,
+        cache_size = cache_size)
+
+    # load the reference samples in parallel before any requests are taken
+    if samples or samples_list:
+        reference_files = load_samples(samples = samples, samples_list = samples_list, use_manifests = use_manifests, manifest_dir = manifest_dir)
+        pool = Pool(int(num_threads))
+        results = [ pool.apply_async(load_genotype_likelihoods, args = (pileup, markers_data), kwds = {'min_mapping_quality': min_mapping_quality, 'min_base_quality': min_base_quality}) for pileup, name in reference_files ]
+        for (pileup, name), result in zip(reference_files, results):
+            service.add_reference(pileup, name = name, likelihoods = result.get())
+        pool.close()
+        pool.join()
+        sys.stderr.write("Loaded {0} reference samples\n".format(len(reference_files)))
+
+    serve(socket_path, service, socket_mode = socket_mode)
+
+def run_best_matches(**kwargs):
+    """
+    Main control function for looking up the best matching samples for a tumor or normal in a results store
+    """
+    store_file = kwargs.pop('store_file')
+    tumor = kwargs.pop('tumor', None)
+    normal = kwargs.pop('normal', None)
+    top = kwargs.pop('top', 1)
+    output_file = kwargs.pop('output_file', None)
+    markers = kwargs.pop('markers', default_marker_file)
+    min_mapping_quality = kwargs.pop('min_mapping_quality', 10)
+    normal_homozygous_markers_only = kwargs.pop('normal_homozygous_markers_only', False)
+    min_cov = kwargs.pop('min_cov', 10)
+    min_base_quality = kwargs.pop('min_base_quality', 20)
+
+    if not os.path.exists(store_file):
+        raise Exception("Results store does not exist: " + store_file)
+    store = ResultsStore(store_file)
+    params = make_params_key(markers, min_mapping_quality, min_base_quality, min_cov, normal_homozygous_markers_only)
+    matches = store.best_matches(params, tumor = tumor, normal = normal, limit = top)
+    store.close()
+
+    if output_file is None or output_file == '-':
+        fout = sys.stdout
+    else:
+        fout = open(output_file, "w")
+    writer = csv.DictWriter(fout, delimiter = '\t', fieldnames = ['concordance', 'num_markers_used', 'num_total_markers', 'tumor', 'normal', 'tumor_filepath', 'normal_filepath'], lineterminator='\n')
+    writer.writeheader()
+    for match in matches:
+        writer.writerow(match)
+    fout.close()
+
+def int_list(value):
+    """
+    Parse a comma separated list of integers from the command line
+    """
+    return([ int(v) for v in value.split(',') if v.strip() != '' ])
+
+def shard_arg(value):
+    """
+    Parse a shard given as i/n from the command line
+    """
+    try:
+        return(parse_shard(value))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def file_mode(value):
+    """
+    Parse octal file permissions such as 600 or 0660
+    """
+    try:
+        mode = int(value, 8)
+    except ValueError:
+        raise argparse.ArgumentTypeError("permissions need to be an octal number such as 600: " + value)
+    if mode < 0 or mode > 0o777:
+        raise argparse.ArgumentTypeError("permissions need to be from 000 to 777: " + value)
+    return(mode)
 
 def parse():
     """
@@ -158,8 +1145,8 @@ def parse():
 
     concordance_parser = subparsers.add_parser('concordance', help = 'Run Conpair concordance')
 
-    concordance_parser.add_argument('tumor', nargs = '?', help = "File path or glob pattern for tumor pileup or likelihoods file")
-    concordance_parser.add_argument('normal', nargs = '?', help = "File path or glob pattern for normal pileup or likelihoods file")
+    concordance_parser.add_argument('tumor', nargs = '?', help = "File path or glob pattern for tumor pileup or likelihoods file; use \"-\" to read it from stdin")
+    concordance_parser.add_argument('normal', nargs = '?', help = "File path or glob pattern for normal pileup or likelihoods file; use \"-\" to read it from stdin")
 
     concordance_parser.add_argument('--tumors-list', dest = 'tumors_list', help = 'File with a list filepaths to the pileups of the tumor samples to use') # , default = "tumors.txt"
     concordance_parser.add_argument('--normals-list', dest = 'normals_list', help = 'File with a list filepaths to the pileups of the normal samples to use') # , default = "normals.txt"
@@ -178,9 +1165,203 @@ def parse():
     concordance_parser.add_argument('--filepath', dest = 'print_filepath', action = "store_true", help = "Print the file path in the output")
     concordance_parser.add_argument('--manifests', dest = 'use_manifests', action = "store_true", help = "Load sample IDs from adjacent .json manifest files for each input file")
     concordance_parser.add_argument('--manifest-dir', dest = 'manifest_dir', default = None, help = "Alternate directory to load manifest files from")
+    concordance_parser.add_argument('--resume', dest = 'resume', default = False, action = "store_true", help = "Resume an interrupted run; pairs that are already in the output file are skipped and the rest are appended to it")
+    concordance_parser.add_argument('--checkpoint-interval', dest = 'checkpoint_interval', default = 60, type = float, help = "Seconds between flushing the finished rows of the output file to disk")
+    concordance_parser.add_argument('--top-k', dest = 'top_k', default = None, type = int, help = "Only write a summary of the best matches; the top K normals of each tumor and the top K tumors of each normal, with their ranks")
+    concordance_parser.add_argument('--min-concordance', dest = 'min_concordance', default = None, type = float, help = "Only write a summary with every pair that has at least this concordance, such as possible swaps; with --top-k the summary has both")
+    concordance_parser.add_argument('--output-format', dest = 'output_format', default = 'tsv', choices = ['tsv', 'matrix'], help = "Format of the output file; matrix writes the concordance and markers used as dense tumor x normal arrays in a NumPy .npz file, which 'matrix-to-tsv' can turn back into the TSV output")
+    concordance_parser.add_argument('--schedule', dest = 'schedule', default = 'input-order', choices = ['largest-first', 'input-order'], help = "Order to start the comparisons in; input-order writes the rows in the order of the input lists. largest-first starts the pairs with the largest estimated cost from their input sizes and types first, which can finish sooner, but the rows are written in that order instead")
+    concordance_parser.add_argument('--shard', dest = 'shard', default = None, type = shard_arg, help = "Only run the pairs of shard i out of n, given as i/n; each pair is assigned to a shard from its sample IDs and file names, so independent jobs with the same inputs split the pairs between them. Combine the outputs with 'run.py merge'")
+    concordance_parser.add_argument('--sequential', dest = 'sequential', default = False, action = "store_true", help = "Decide whether each pair is a match with a sequential probability ratio test that stops testing markers once it can decide at --error-rate, and add its markers_consumed and decision columns; the exact concordance is still computed for matches, while for non-matches it is only over the markers consumed. This does not make runs faster: the inputs are still loaded in full, and the full comparison of loaded likelihoods costs about the same as the test")
+    concordance_parser.add_argument('--match-discordance', dest = 'match_discordance', default = 0.1, type = float, help = "Rate of discordant markers expected between samples of the same individual, for --sequential")
+    concordance_parser.add_argument('--nonmatch-discordance', dest = 'nonmatch_discordance', default = 0.5, type = float, help = "Rate of discordant markers expected between samples of different individuals, for --sequential")
+    concordance_parser.add_argument('--error-rate', dest = 'error_rate', default = 0.001, type = float, help = "Probability of a wrong match or non-match decision, for --sequential")
+    concordance_parser.add_argument('--store', dest = 'store_file', default = None, help = "SQLite database of results; comparisons already in it are not computed again, and new ones are added to it")
+    concordance_parser.add_argument('--task-timeout', dest = 'task_timeout', default = None, type = float, help = "Seconds a comparison can run before its process is killed and it is tried again; adds a status column to the output and writes the rows in the order the comparisons finish")
+    concordance_parser.add_argument('--retries', dest = 'max_retries', default = 1, type = int, help = "Number of times to try a comparison again after it times out or fails, for --task-timeout and --speculative; comparisons that still fail are written with a failed or timeout status")
+    concordance_parser.add_argument('--speculative', dest = 'speculative_factor', default = None, type = float, help = "Start a second copy of a comparison once it has run this many times longer than the median finished comparison, and use whichever copy finishes first; adds a status column to the output")
 
+    concordance_parser.add_argument('--metrics', dest = 'collect_metrics', default = False, action = "store_true", help = "Time the stages of the run and the hot paths of the workers, and write the timers and counters as JSON lines to the --metrics-file")
+    concordance_parser.add_argument('--metrics-file', dest = 'metrics_file', default = None, help = "File to write the --metrics to; defaults to the output file with .metrics.jsonl added, or stderr when the output goes to stdout")
+    concordance_parser.add_argument('--profile', dest = 'profile_dir', default = None, help = "Directory to dump cProfile stats to, as main.prof for the main process and worker.<pid>.prof for each worker process; also turns on --metrics")
+    concordance_parser.add_argument('--memory-budget', dest = 'memory_budget', default = None, type = memory.parse_size, help = "Memory available to the run, such as 16G; the number of threads is reduced so that the workers and the likelihoods they hold fit")
+    concordance_parser.add_argument('--progress', dest = 'show_progress', default = False, action = "store_true", help = "Report the comparisons done, the throughput, the current bottleneck stage and the estimated time left on stderr at a regular interval; also times the stages as with --metrics")
+    concordance_parser.add_argument('--progress-interval', dest = 'progress_interval', default = 30.0, type = float, help = "Seconds between progress reports")
+    concordance_parser.add_argument('--progress-textfile', dest = 'progress_textfile', default = None, help = "File to write the progress to in the Prometheus text format at each report, such as for the textfile collector of a node exporter; its name should end in .prom")
     concordance_parser.set_defaults(func = run_concordance)
 
+    screen_parser = subparsers.add_parser('screen', help = 'Screen all tumor and normal pairs on a subset of the markers, then run the full concordance for the best candidate normals of each tumor')
+    screen_parser.add_argument('tumor', nargs = '?', help = "File path or glob pattern for tumor pileup file")
+    screen_parser.add_argument('normal', nargs = '?', help = "File path or glob pattern for normal pileup file")
+    screen_parser.add_argument('--tumors-list', dest = 'tumors_list', help = 'File with a list filepaths to the pileups of the tumor samples to use')
+    screen_parser.add_argument('--normals-list', dest = 'normals_list', help = 'File with a list filepaths to the pileups of the normal samples to use')
+    screen_parser.add_argument('--num-tumors', dest = 'num_tumors', default = 'all', help = 'The number of tumor samples to use from the list')
+    screen_parser.add_argument('--num-normals', dest = 'num_normals', default = 'all', help = 'The number of normal samples to use from the list')
+    screen_parser.add_argument('--markers', dest = 'markers', default = default_marker_file, help = 'Markers to use for analysis')
+    screen_parser.add_argument('-t', '--threads', dest = 'num_threads', default = 4, type = int, help = 'The number of CPU threads to use')
+    screen_parser.add_argument('--min-mapping-quality', dest = 'min_mapping_quality', default = 10, type = int, help = 'Minimum mapping quality value to use')
+    screen_parser.add_argument('--min-cov', dest = 'min_cov', default = 10, type = int, help = 'Minimum coverage quality value to use')
+    screen_parser.add_argument('--min_base_quality', dest = 'min_base_quality', default = 20, type = int, help = 'Minimum base quality value to use')
+    screen_parser.add_argument('--normal-homozygous-markers-only', dest = 'normal_homozygous_markers_only', default = False, action = "store_true", help = 'Use only homozygous markers')
+    screen_parser.add_argument('--screen-fraction', dest = 'screen_fraction', default = 0.05, type = float, help = 'Fraction of the markers to screen all pairs with')
+    screen_parser.add_argument('--top', dest = 'top', default = 3, type = int, help = 'The number of best screening candidates of each tumor to run the full concordance for')
+    screen_parser.add_argument('--output-file', dest = 'output_file', help = 'File to output the screening and concordance results to. Use "-" for stdout')
+    screen_parser.add_argument('--filepath', dest = 'print_filepath', action = "store_true", help = "Print the file path in the output")
+    screen_parser.add_argument('--manifests', dest = 'use_manifests', action = "store_true", help = "Load sample IDs from adjacent .json manifest files for each input file")
+    screen_parser.add_argument('--manifest-dir', dest = 'manifest_dir', default = None, help = "Alternate directory to load manifest files from")
+    screen_parser.set_defaults(func = run_screen)
+
+    identity_parser = subparsers.add_parser('identity', help = 'Compare every sample in a single list against every other one and group the samples into individuals')
+    identity_parser.add_argument('samples', nargs = '?', help = "File path or glob pattern for sample pileup files")
+    identity_parser.add_argument('--samples-list', dest = 'samples_list', help = 'File with a list filepaths to the pileups of the samples to use')
+    identity_parser.add_argument('--num-samples', dest = 'num_samples', default = 'all', help = 'The number of samples to use from the list')
+    identity_parser.add_argument('--markers', dest = 'markers', default = default_marker_file, help = 'Markers to use for analysis')
+    identity_parser.add_argument('-t', '--threads', dest = 'num_threads', default = 4, type = int, help = 'The number of CPU threads to use')
+    identity_parser.add_argument('--block-size', dest = 'block_size', default = None, type = int, help = 'The number of samples loaded together by each task; by default picked from the number of samples and threads')
+    identity_parser.add_argument('--memory-budget', dest = 'memory_budget', default = None, type = memory.parse_size, help = "Memory available to the run, such as 16G; the number of threads and, without --block-size, the block size are picked to fit")
+    identity_parser.add_argument('--min-mapping-quality', dest = 'min_mapping_quality', default = 10, type = int, help = 'Minimum mapping quality value to use')
+    identity_parser.add_argument('--min-cov', dest = 'min_cov', default = 10, type = int, help = 'Minimum coverage quality value to use')
+    identity_parser.add_argument('--min_base_quality', dest = 'min_base_quality', default = 20, type = int, help = 'Minimum base quality value to use')
+    identity_parser.add_argument('--normal-homozygous-markers-only', dest = 'normal_homozygous_markers_only', default = False, action = "store_true", help = 'Use only markers that are homozygous in the second sample of each pair')
+    identity_parser.add_argument('--threshold', dest = 'threshold', default = 0.8, type = float, help = 'Minimum concordance for two samples to be grouped as the same individual')
+    identity_parser.add_argument('--individuals', dest = 'individuals_file', default = None, help = 'Tab separated file of sample ID and expected individual ID; samples that are not listed are expected to be their own individual')
+    identity_parser.add_argument('--output-file', dest = 'output_file', help = 'File to output the concordance of each pair to. Use "-" for stdout')
+    identity_parser.add_argument('--groups-file', dest = 'groups_file', default = None, help = 'File to output the group of each sample to')
+    identity_parser.add_argument('--filepath', dest = 'print_filepath', action = "store_true", help = "Print the file path in the output")
+    identity_parser.add_argument('--manifests', dest = 'use_manifests', action = "store_true", help = "Load sample IDs from adjacent .json manifest files for each input file")
+    identity_parser.add_argument('--manifest-dir', dest = 'manifest_dir', default = None, help = "Alternate directory to load manifest files from")
+    identity_parser.set_defaults(func = run_identity)
+
+    merge_parser = subparsers.add_parser('merge', help = 'Merge the concordance outputs of shards from --shard and check for missing or duplicated pairs')
+    merge_parser.add_argument('input_files', nargs = '+', help = "Concordance output files of the shards")
+    merge_parser.add_argument('--output-file', dest = 'output_file', help = 'File to output the merged concordance to. Use "-" for stdout')
+    merge_parser.add_argument('--tumor', dest = 'tumor', default = None, help = "File path or glob pattern for the tumor pileups that the shards were run on, to check for missing pairs")
+    merge_parser.add_argument('--normal', dest = 'normal', default = None, help = "File path or glob pattern for the normal pileups that the shards were run on, to check for missing pairs")
+    merge_parser.add_argument('--tumors-list', dest = 'tumors_list', help = 'File with a list filepaths to the tumor pileups that the shards were run on')
+    merge_parser.add_argument('--normals-list', dest = 'normals_list', help = 'File with a list filepaths to the normal pileups that the shards were run on')
+    merge_parser.add_argument('--num-tumors', dest = 'num_tumors', default = 'all', help = 'The number of tumor samples that were used from the list')
+    merge_parser.add_argument('--num-normals', dest = 'num_normals', default = 'all', help = 'The number of normal samples that were used from the list')
+    merge_parser.add_argument('--manifests', dest = 'use_manifests', action = "store_true", help = "Load sample IDs from adjacent .json manifest files for each input file")
+    merge_parser.add_argument('--manifest-dir', dest = 'manifest_dir', default = None, help = "Alternate directory to load manifest files from")
+    merge_parser.set_defaults(func = run_merge)
+
+    matrix_to_tsv_parser = subparsers.add_parser('matrix-to-tsv', help = "Write a concordance matrix file from 'concordance --output-format matrix' as the concordance TSV output")
+    matrix_to_tsv_parser.add_argument('input_file', help = "Concordance matrix .npz file")
+    matrix_to_tsv_parser.add_argument('--output-file', dest = 'output_file', help = 'File to output the concordance to. Use "-" for stdout')
+    matrix_to_tsv_parser.add_argument('--filepath', dest = 'print_filepath', action = "store_true", help = "Print the file path in the output")
+    matrix_to_tsv_parser.set_defaults(func = run_matrix_to_tsv)
+
+    coordinator_parser = subparsers.add_parser('coordinator', help = "Hand out the pairs of a concordance run in batches to workers that connect over TCP, and write their results")
+    coordinator_parser.add_argument('tumor', nargs = '?', help = "File path or glob pattern for tumor pileup file")
+    coordinator_parser.add_argument('normal', nargs = '?', help = "File path or glob pattern for normal pileup file")
+    coordinator_parser.add_argument('--tumors-list', dest = 'tumors_list', help = 'File with a list filepaths to the pileups of the tumor samples to use')
+    coordinator_parser.add_argument('--normals-list', dest = 'normals_list', help = 'File with a list filepaths to the pileups of the normal samples to use')
+    coordinator_parser.add_argument('--num-tumors', dest = 'num_tumors', default = 'all', help = 'The number of tumor samples to use from the list')
+    coordinator_parser.add_argument('--num-normals', dest = 'num_normals', default = 'all', help = 'The number of normal samples to use from the list')
+    coordinator_parser.add_argument('--markers', dest = 'markers', default = default_marker_file, help = 'Markers to use for analysis')
+    coordinator_parser.add_argument('--min-mapping-quality', dest = 'min_mapping_quality', default = 10, type = int, help = 'Minimum mapping quality value to use')
+    coordinator_parser.add_argument('--min-cov', dest = 'min_cov', default = 10, type = int, help = 'Minimum coverage quality value to use')
+    coordinator_parser.add_argument('--min_base_quality', dest = 'min_base_quality', default = 20, type = int, help = 'Minimum base quality value to use')
+    coordinator_parser.add_argument('--normal-homozygous-markers-only', dest = 'normal_homozygous_markers_only', default = False, action = "store_true", help = 'Use only homozygous markers')
+    coordinator_parser.add_argument('--output-file', dest = 'output_file', help = 'File to output concordance to. Use "-" for stdout')
+    coordinator_parser.add_argument('--filepath', dest = 'print_filepath', action = "store_true", help = "Print the file path in the output")
+    coordinator_parser.add_argument('--manifests', dest = 'use_manifests', action = "store_true", help = "Load sample IDs from adjacent .json manifest files for each input file")
+    coordinator_parser.add_argument('--manifest-dir', dest = 'manifest_dir', default = None, help = "Alternate directory to load manifest files from")
+    coordinator_parser.add_argument('--host', dest = 'host', default = 'localhost', help = "Address to listen on for workers; use 0.0.0.0 to accept workers from other nodes")
+    coordinator_parser.add_argument('--port', dest = 'port', default = 0, type = int, help = "Port to listen on for workers; by default a free port is picked and printed")
+    coordinator_parser.add_argument('--authkey', dest = 'authkey', default = None, help = "Key shared with the workers; defaults to the CONPAIR_AUTHKEY environment variable")
+    coordinator_parser.add_argument('--batch-size', dest = 'batch_size', default = 100, type = int, help = "The number of pairs handed to a worker at a time")
+    coordinator_parser.add_argument('--max-attempts', dest = 'max_attempts', default = 3, type = int, help = "The number of times a batch can fail or lose its worker before its pairs are given up on")
+    coordinator_parser.add_argument('--idle-timeout', dest = 'idle_timeout', default = 600, type = float, help = "Seconds to wait for results while no worker is connected before exiting with an error; 0 waits forever")
+    coordinator_parser.add_argument('--local-workers', dest = 'local_workers', default = 0, type = int, help = "The number of workers to also start on this node")
+    coordinator_parser.add_argument('-t', '--threads', dest = 'num_threads', default = 4, type = int, help = 'The number of CPU threads for each local worker to use')
+    coordinator_parser.set_defaults(func = run_coordinator)
+
+    worker_parser = subparsers.add_parser('worker', help = "Compute batches of pairs from a coordinator until there are none left")
+    worker_parser.add_argument('--host', dest = 'host', default = 'localhost', help = "Address of the coordinator")
+    worker_parser.add_argument('--port', dest = 'port', required = True, type = int, help = "Port of the coordinator")
+    worker_parser.add_argument('--authkey', dest = 'authkey', default = None, help = "Key shared with the coordinator; defaults to the CONPAIR_AUTHKEY environment variable")
+    worker_parser.add_argument('-t', '--threads', dest = 'num_threads', default = 4, type = int, help = 'The number of CPU threads to use')
+    worker_parser.add_argument('--connect-timeout', dest = 'connect_timeout', default = 60, type = float, help = "Seconds to keep trying to connect while the coordinator is not up yet")
+    worker_parser.set_defaults(func = run_worker_command)
+
+    best_matches_parser = subparsers.add_parser('best-matches', help = 'Look up the best matching samples for a tumor or normal in a results store')
+    best_matches_parser.add_argument('--store', dest = 'store_file', required = True, help = "SQLite database of results from 'concordance --store'")
+    best_matches_parser.add_argument('--tumor', dest = 'tumor', default = None, help = 'Tumor sample ID to find the best normals for')
+    best_matches_parser.add_argument('--normal', dest = 'normal', default = None, help = 'Normal sample ID to find the best tumors for')
+    best_matches_parser.add_argument('--top', dest = 'top', default = 1, type = int, help = 'The number of matches to report')
+    best_matches_parser.add_argument('--output-file', dest = 'output_file', help = 'File to output the matches to. Use "-" for stdout')
+    best_matches_parser.add_argument('--markers', dest = 'markers', default = default_marker_file, help = 'Markers that were used for analysis')
+    best_matches_parser.add_argument('--min-mapping-quality', dest = 'min_mapping_quality', default = 10, type = int, help = 'Minimum mapping quality value that was used')
+    best_matches_parser.add_argument('--min-cov', dest = 'min_cov', default = 10, type = int, help = 'Minimum coverage quality value that was used')
+    best_matches_parser.add_argument('--min_base_quality', dest = 'min_base_quality', default = 20, type = int, help = 'Minimum base quality value that was used')
+    best_matches_parser.add_argument('--normal-homozygous-markers-only', dest = 'normal_homozygous_markers_only', default = False, action = "store_true", help = 'Whether only homozygous markers were used')
+    best_matches_parser.set_defaults(func = run_best_matches)
+
+    pair_parser = subparsers.add_parser('pair', help = 'Get the concordance, the normal contamination and the tumor contamination of a tumor-normal pair, parsing each pileup only once')
+    pair_parser.add_argument('tumor', help = "File path for tumor pileup file")
+    pair_parser.add_argument('normal', help = "File path for normal pileup file")
+    pair_parser.add_argument('--output-file', dest = 'output_file', default = None, help = 'Output file; stdout by default')
+    pair_parser.add_argument('--output-format', dest = 'output_format', default = 'tsv', choices = ['tsv', 'json'], help = "'tsv' for a header and a row, or 'json' for a single object")
+    pair_parser.add_argument('--markers', dest = 'markers', default = default_marker_file, help = 'Markers to use for analysis')
+    pair_parser.add_argument('-t', '--threads', dest = 'num_threads', default = 2, type = int, help = 'Parse the tumor and the normal at the same time if more than 1')
+    pair_parser.add_argument('--min-mapping-quality', dest = 'min_mapping_quality', default = 10, type = int, help = 'Minimum mapping quality value')
+    pair_parser.add_argument('--contamination-min-mapping-quality', dest = 'contamination_min_mapping_quality', default = None, type = int, help = 'Minimum mapping quality value for the contamination, if different from --min-mapping-quality')
+    pair_parser.add_argument('--min-cov', dest = 'min_cov', default = 10, type = int, help = 'Minimum coverage quality value')
+    pair_parser.add_argument('--min_base_quality', dest = 'min_base_quality', default = 20, type = int, help = 'Minimum base quality value for the concordance')
+    pair_parser.add_argument('--normal-homozygous-markers-only', dest = 'normal_homozygous_markers_only', default = False, action = "store_true", help = 'Use only homozygous markers for the concordance')
+    pair_parser.add_argument('--grid', dest = 'grid_precision', default = 0.01, type = float, help = 'Interval of the contamination grid')
+    pair_parser.add_argument('--filepath', dest = 'print_filepath', action = "store_true", help = "Print the full filepaths in the output")
+    pair_parser.add_argument('--manifests', dest = 'use_manifests', action = "store_true", help = "Load sample IDs from adjacent .json manifest files for each input file")
+    pair_parser.add_argument('--manifest-dir', dest = 'manifest_dir', default = None, help = "Alternate directory to load manifest files from")
+    pair_parser.set_defaults(func = run_pair)
+
+    daemon_parser = subparsers.add_parser('daemon', help = 'Keep the markers and a set of reference samples loaded and answer concordance and contamination requests as JSON lines over a Unix socket')
+    daemon_parser.add_argument('samples', nargs = '?', help = "File path or glob pattern for the pileups of the reference samples to keep loaded")
+    daemon_parser.add_argument('--samples-list', dest = 'samples_list', help = 'File with a list filepaths to the pileups of the reference samples to keep loaded')
+    daemon_parser.add_argument('--socket', dest = 'socket_path', required = True, help = 'Path of the Unix socket to listen on')
+    daemon_parser.add_argument('--socket-mode', dest = 'socket_mode', default = 0o600, type = file_mode, help = "Octal permissions of the socket; the default of 600 only lets the user running the daemon connect, 660 also lets its group connect")
+    daemon_parser.add_argument('--cache-size', dest = 'cache_size', default = 100, type = int, help = 'The number of samples that are not references to keep loaded after a request, most recently used first')
+    daemon_parser.add_argument('--markers', dest = 'markers', default = default_marker_file, help = 'Markers to use for analysis')
+    daemon_parser.add_argument('-t', '--threads', dest = 'num_threads', default = 4, type = int, help = 'The number of CPU threads to use to load the reference samples')
+    daemon_parser.add_argument('--min-mapping-quality', dest = 'min_mapping_quality', default = 10, type = int, help = 'Minimum mapping quality value')
+    daemon_parser.add_argument('--min-cov', dest = 'min_cov', default = 10, type = int, help = 'Default minimum coverage quality value; requests can override it')
+    daemon_parser.add_argument('--min_base_quality', dest = 'min_base_quality', default = 20, type = int, help = 'Minimum base quality value')
+    daemon_parser.add_argument('--normal-homozygous-markers-only', dest = 'normal_homozygous_markers_only', default = False, action = "store_true", help = 'Use only homozygous markers by default; requests can override it')
+    daemon_parser.add_argument('--manifests', dest = 'use_manifests', action = "store_true", help = "Load sample IDs from adjacent .json manifest files for each input file")
+    daemon_parser.add_argument('--manifest-dir', dest = 'manifest_dir', default = None, help = "Alternate directory to load manifest files from")
+    daemon_parser.set_defaults(func = run_daemon)
+
+    sweep_parser = subparsers.add_parser('sweep', help = 'Run Conpair concordance over a grid of quality and coverage thresholds, parsing each pileup only once')
+
+    sweep_parser.add_argument('tumor', nargs = '?', help = "File path or glob pattern for tumor pileup file")
+    sweep_parser.add_argument('normal', nargs = '?', help = "File path or glob pattern for normal pileup file")
+
+    sweep_parser.add_argument('--tumors-list', dest = 'tumors_list', help = 'File with a list filepaths to the pileups of the tumor samples to use')
+    sweep_parser.add_argument('--normals-list', dest = 'normals_list', help = 'File with a list filepaths to the pileups of the normal samples to use')
+
+    sweep_parser.add_argument('--num-tumors', dest = 'num_tumors', default = 'all', help = 'The number of tumor samples to use from the list')
+    sweep_parser.add_argument('--num-normals', dest = 'num_normals', default = 'all', help = 'The number of normal samples to use from the list')
+    sweep_parser.add_argument('--markers', dest = 'markers', default = default_marker_file, help = 'Markers to use for analysis')
+    sweep_parser.add_argument('-t', '--threads', dest = 'num_threads', default = 4, type = int, help = 'The number of CPU threads to use')
+    sweep_parser.add_argument('--min-mapping-qualities', dest = 'min_mapping_qualities', default = [0, 10, 20, 30], type = int_list, help = 'Comma separated minimum mapping quality values to use')
+    sweep_parser.add_argument('--min-base-qualities', dest = 'min_base_qualities', default = [10, 20, 30], type = int_list, help = 'Comma separated minimum base quality values to use')
+    sweep_parser.add_argument('--min-covs', dest = 'min_covs', default = [5, 10, 20], type = int_list, help = 'Comma separated minimum coverage values to use')
+    sweep_parser.add_argument('--normal-homozygous-markers-only', dest = 'normal_homozygous_markers_only', default = False, action = "store_true", help = 'Use only homozygous markers')
+    sweep_parser.add_argument('--output-file', dest = 'output_file', help = 'File to output the sweep table to. Use "-" for stdout')
+    sweep_parser.add_argument('--filepath', dest = 'print_filepath', action = "store_true", help = "Print the file path in the output")
+    sweep_parser.add_argument('--manifests', dest = 'use_manifests', action = "store_true", help = "Load sample IDs from adjacent .json manifest files for each input file")
+    sweep_parser.add_argument('--manifest-dir', dest = 'manifest_dir', default = None, help = "Alternate directory to load manifest files from")
+
+    sweep_parser.add_argument('--metrics', dest = 'collect_metrics', default = False, action = "store_true", help = "Time the stages of the run and the hot paths of the workers, and write the timers and counters as JSON lines to the --metrics-file")
+    sweep_parser.add_argument('--metrics-file', dest = 'metrics_file', default = None, help = "File to write the --metrics to; defaults to the output file with .metrics.jsonl added, or stderr when the output goes to stdout")
+    sweep_parser.add_argument('--profile', dest = 'profile_dir', default = None, help = "Directory to dump cProfile stats to, as main.prof for the main process and worker.<pid>.prof for each worker process; also turns on --metrics")
+    sweep_parser.add_argument('--memory-budget', dest = 'memory_budget', default = None, type = memory.parse_size, help = "Memory available to the run, such as 16G; the number of threads and how many pileups stay loaded at once are picked to fit. When the pileups do not all fit, the pairs are run in batches and the output is grouped by batch")
+    sweep_parser.add_argument('--progress', dest = 'show_progress', default = False, action = "store_true", help = "Report the comparisons done, the throughput, the current bottleneck stage and the estimated time left on stderr at a regular interval; also times the stages as with --metrics")
+    sweep_parser.add_argument('--progress-interval', dest = 'progress_interval', default = 30.0, type = float, help = "Seconds between progress reports")
+    sweep_parser.add_argument('--progress-textfile', dest = 'progress_textfile', default = None, help = "File to write the progress to in the Prometheus text format at each report, such as for the textfile collector of a node exporter; its name should end in .prom")
+    sweep_parser.set_defaults(func = run_sweep)
+
     args = parser.parse_args()
     args.func(**vars(args))
 
@@ -0,0 +1,237 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the stages of Conpair on a synthetic cohort, compared against a saved baseline
+
+Times each stage separately; pileup line parsing, genotype likelihoods, pairwise concordance, cohort sweeps and contamination.
+The cohort is generated with a fixed seed, so every run times the same data, and no network access is needed.
+Each stage is run several times and the fastest run is kept. The times are also divided by the time of a fixed pure Python
+calibration loop, so that a baseline saved on one machine can be compared with runs on another;
+stages that are slower than the baseline by more than the tolerance are flagged as regressions.
+
+Usage:
+    python2 scripts/benchmark.py                   # run and compare against data/benchmarks/baseline.json
+    python2 scripts/benchmark.py --save-baseline   # run and save the results as the new baseline
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import argparse
+import platform
+import itertools
+import subprocess
+from tempfile import mkdtemp
+
+# need to import the module from the other dir
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+sys.path.insert(0, PARENT_DIR)
+from modules.ContaminationMarker import get_markers, parse_mpileup_line, parse_samtools_mpileup_line, genotype_likelihoods_for_markers
+from modules.concordance import compare_genotype_likelihoods
+from modules.sweep import run_parallel_sweep
+from modules.synthetic import make_cohort, subset_markers
+sys.path.pop(0)
+
+default_marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+default_baseline_file = os.path.join(PARENT_DIR, 'data', 'benchmarks', 'baseline.json')
+contamination_script = os.path.join(THIS_DIR, 'estimate_tumor_normal_contamination.py')
+
+def calibrate():
+    """
+    Time a fixed pure Python loop; used to compare times measured on different machines
+    """
+    start = time.time()
+    total = 0
+    for i in range(2000000):
+        total += i % 7
+    return(time.time() - start)
+
+def write_markers(markers_data, output_file):
+    """
+    Write markers in the format read by `ContaminationMarker.get_markers`
+    """
+    with open(output_file, "w") as fout:
+        for marker in markers_data.values():
+            fout.write('\t'.join([marker.chrom, marker.pos, marker.ref, marker.alt, str(marker.RAF)]) + '\n')
+
+def read_lines(pileup):
+    with open(pileup) as fin:
+        return(fin.readlines())
+
+def make_stages(workdir, markers, num_markers, num_samples, depth, contamination_markers):
+    """
+    Generate the cohorts in workdir and get the list of (stage name, function to time)
+    """
+    markers_data = subset_markers(get_markers(markers), num_markers)
+    gatk_cohort = make_cohort(os.path.join(workdir, 'gatk'), markers_data, num_samples = num_samples, depth = depth, swap_rate = 0.2, seed = 1)
+    samtools_cohort = make_cohort(os.path.join(workdir, 'samtools'), markers_data, num_samples = 1, depth = depth, pileup_format = 'samtools', seed = 1)
+
+    # contamination is much slower per marker than the other stages, so it gets its own smaller panel
+    contamination_markers_data = subset_markers(markers_data, contamination_markers)
+    contamination_markers_file = os.path.join(workdir, 'contamination_markers.txt')
+    write_markers(contamination_markers_data, contamination_markers_file)
+    contamination_cohort = make_cohort(os.path.join(workdir, 'contamination'), contamination_markers_data, num_samples = 2, depth = depth, contamination_rate = 1.0, contamination = 0.1, seed = 1)
+
+    gatk_lines = read_lines(gatk_cohort[0]['normal_pileup'])
+    samtools_lines = read_lines(samtools_cohort[0]['normal_pileup'])
+    pileups = [ row['tumor_pileup'] for row in gatk_cohort ] + [ row['normal_pileup'] for row in gatk_cohort ]
+    likelihoods = dict( (pileup, genotype_likelihoods_for_markers(markers_data, pileup, 10, 20)) for pileup in pileups )
+    pairs = [ (tumor['tumor_pileup'], normal['normal_pileup'], tumor['individual'], normal['individual']) for tumor, normal in itertools.product(gatk_cohort, gatk_cohort) ]
+
+    def parse_gatk():
+        for line in gatk_lines:
+            parse_mpileup_line(line, min_map_quality = 10, min_base_quality = 20)
+
+    def parse_samtools():
+        for line in samtools_lines:
+            parse_samtools_mpileup_line(line, min_map_quality = 10, min_base_quality = 20)
+
+    def genotype_likelihoods():
+        for pileup in pileups:
+            genotype_likelihoods_for_markers(markers_data, pileup, 10, 20)
+
+    def pairwise_concordance():
+        for tumor_pileup, normal_pileup, tumor_name, normal_name in pairs:
+            compare_genotype_likelihoods(likelihoods[tumor_pileup], likelihoods[normal_pileup], markers_data, min_cov = 10)
+
+    def cohort_sweep():
+        list(run_parallel_sweep(pairs, markers_data, 1, [0, 10], [0, 20], [5, 10]))
+
+    def contamination():
+        subprocess.check_call([sys.executable, contamination_script,
+            '-D', PARENT_DIR,
+            '-M', contamination_markers_file,
+            '-T', contamination_cohort[0]['tumor_pileup'],
+            '-N', contamination_cohort[0]['normal_pileup'],
+            '-O', os.path.join(workdir, 'contamination.txt')])
+
+    return([
+        ('parse_gatk', parse_gatk),
+        ('parse_samtools', parse_samtools),
+        ('genotype_likelihoods', genotype_likelihoods),
+        ('pairwise_concordance', pairwise_concordance),
+        ('cohort_sweep', cohort_sweep),
+        ('contamination', contamination)
+    ])
+
+def time_stage(func, repeat):
+    """
+    Get the fastest of several runs of a function
+    """
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return(min(times))
+
+def compare(results, baseline, tolerance):
+    """
+    Get the ratio of each stage's normalized time to the baseline, and whether it is a regression
+    """
+    comparison = {}
+    for stage, result in results['stages'].items():
+        if stage not in baseline.get('stages', {}):
+            continue
+        ratio = result['normalized'] / baseline['stages'][stage]['normalized']
+        comparison[stage] = {'ratio': ratio, 'regression': ratio > 1.0 + tolerance}
+    return(comparison)
+
+def main(**kwargs):
+    """
+    Run the benchmarks
+    """
+    markers = kwargs.pop('markers', default_marker_file)
+    num_markers = kwargs.pop('num_markers', 2000)
+    num_samples = kwargs.pop('num_samples', 6)
+    depth = kwargs.pop('depth', 30)
+    contamination_markers = kwargs.pop('contamination_markers', 200)
+    repeat = kwargs.pop('repeat', 3)
+    stages_to_run = kwargs.pop('stages', None)
+    baseline_file = kwargs.pop('baseline_file', default_baseline_file)
+    save_baseline = kwargs.pop('save_baseline', False)
+    tolerance = kwargs.pop('tolerance', 0.25)
+    output_file = kwargs.pop('output_file', None)
+
+    workdir = mkdtemp()
+    try:
+        sys.stderr.write("Generating the synthetic cohort in {0}\n".format(workdir))
+        stages = make_stages(workdir, markers, num_markers, num_samples, depth, contamination_markers)
+        if stages_to_run:
+            stages = [ (name, func) for name, func in stages if name in stages_to_run ]
+
+        calibration = min([ calibrate() for i in range(repeat) ])
+        results = {
+            'python': platform.python_version(),
+            'calibration_seconds': calibration,
+            'settings': {'num_markers': num_markers, 'num_samples': num_samples, 'depth': depth, 'contamination_markers': contamination_markers, 'repeat': repeat},
+            'stages': {}
+        }
+        for name, func in stages:
+            sys.stderr.write("Running {0}\n".format(name))
+            seconds = time_stage(func, repeat)
+            results['stages'][name] = {'seconds': seconds, 'normalized': seconds / calibration}
+    finally:
+        shutil.rmtree(workdir)
+
+    if save_baseline:
+        baseline_dir = os.path.dirname(baseline_file)
+        if baseline_dir and not os.path.exists(baseline_dir):
+            os.makedirs(baseline_dir)
+        with open(baseline_file, "w") as fout:
+            json.dump(results, fout, indent = 4, sort_keys = True, separators = (',', ': '))
+            fout.write('\n')
+        sys.stderr.write("Saved the baseline to {0}\n".format(baseline_file))
+
+    comparison = {}
+    if not save_baseline and os.path.exists(baseline_file):
+        with open(baseline_file) as fin:
+            baseline = json.load(fin)
+        if baseline.get('settings') != results['settings']:
+            sys.stderr.write("WARNING: the baseline was made with different settings: {0}\n".format(baseline.get('settings')))
+        if baseline.get('python', '')[0:1] != results['python'][0:1]:
+            sys.stderr.write("WARNING: the baseline was made with Python {0}\n".format(baseline.get('python')))
+        comparison = compare(results, baseline, tolerance)
+        results['baseline'] = comparison
+
+    print('\t'.join(['stage', 'seconds', 'normalized', 'vs_baseline', 'status']))
+    for name, func in stages:
+        result = results['stages'][name]
+        row = [name, '{0:.4f}'.format(result['seconds']), '{0:.2f}'.format(result['normalized']), 'NA', 'NA']
+        if name in comparison:
+            row[3] = '{0:.2f}'.format(comparison[name]['ratio'])
+            row[4] = 'REGRESSION' if comparison[name]['regression'] else 'ok'
+        print('\t'.join(row))
+
+    if output_file:
+        with open(output_file, "w") as fout:
+            json.dump(results, fout, indent = 4, sort_keys = True, separators = (',', ': '))
+            fout.write('\n')
+
+    if any(stage['regression'] for stage in comparison.values()):
+        sys.exit(1)
+
+def parse():
+    """
+    Parse the command line options
+    """
+    parser = argparse.ArgumentParser(description = 'Benchmark the stages of Conpair on a synthetic cohort')
+    parser.add_argument('--markers', dest = 'markers', default = default_marker_file, help = 'Marker panel to simulate the cohort from')
+    parser.add_argument('--num-markers', dest = 'num_markers', type = int, default = 2000, help = 'Number of markers to use from the panel')
+    parser.add_argument('--num-samples', dest = 'num_samples', type = int, default = 6, help = 'Number of individuals in the cohort; the concordance and sweep stages compare all their tumors and normals')
+    parser.add_argument('--depth', dest = 'depth', type = int, default = 30, help = 'Mean number of reads per marker')
+    parser.add_argument('--contamination-markers', dest = 'contamination_markers', type = int, default = 200, help = 'Number of markers to use for the contamination stage')
+    parser.add_argument('--repeat', dest = 'repeat', type = int, default = 3, help = 'Number of times to run each stage; the fastest run is kept')
+    parser.add_argument('--stage', dest = 'stages', action = 'append', default = None, help = 'Only run this stage; can be given several times')
+    parser.add_argument('--baseline', dest = 'baseline_file', default = default_baseline_file, help = 'Baseline results to compare against')
+    parser.add_argument('--save-baseline', dest = 'save_baseline', action = 'store_true', help = 'Save the results as the new baseline instead of comparing against it')
+    parser.add_argument('--tolerance', dest = 'tolerance', type = float, default = 0.25, help = 'Fraction slower than the baseline that a stage can be before it is flagged as a regression')
+    parser.add_argument('--output-file', dest = 'output_file', default = None, help = 'JSON file to write the results to')
+
+    args = parser.parse_args()
+    main(**vars(args))
+
+if __name__ == '__main__':
+    parse()
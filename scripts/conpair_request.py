@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Send a request to a Conpair daemon started with 'run.py daemon' and print its JSON response
+
+Only the standard library is loaded, so a request takes a fraction of a second.
+
+Usage:
+    python scripts/conpair_request.py --socket conpair.sock concordance --tumor tumor.pileup --normal NORMAL_ID
+    python scripts/conpair_request.py --socket conpair.sock match --sample tumor.pileup --top 3
+"""
+import os
+import sys
+import json
+import argparse
+
+# need to import the module from the other dir
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+sys.path.insert(0, PARENT_DIR)
+from modules.daemon_client import send_request
+sys.path.pop(0)
+
+def main(**kwargs):
+    """
+    Send the request and print the response; exits 1 if the request failed
+    """
+    socket_path = kwargs.pop('socket_path')
+    timeout = kwargs.pop('timeout', None)
+    request = dict( (key, value) for key, value in kwargs.items() if value is not None )
+    # the daemon can run in another directory, so send the full path of the files that are here; other values are names of loaded samples
+    for key in ['tumor', 'normal', 'sample', 'pileup']:
+        if key in request and os.path.exists(request[key]):
+            request[key] = os.path.abspath(request[key])
+    response = send_request(socket_path, request, timeout = timeout)
+    print(json.dumps(response, indent = 4, sort_keys = True, separators = (',', ': ')))
+    if not response.get('ok'):
+        sys.exit(1)
+
+def parse():
+    """
+    Parse the command line options
+    """
+    parser = argparse.ArgumentParser(description = 'Send a request to a Conpair daemon')
+    parser.add_argument('command', choices = ['status', 'load', 'unload', 'concordance', 'match', 'contamination', 'shutdown'], help = 'Request to send')
+    parser.add_argument('--socket', dest = 'socket_path', required = True, help = 'Path of the Unix socket of the daemon')
+    parser.add_argument('--tumor', dest = 'tumor', default = None, help = 'Tumor pileup, or the name of a loaded sample for concordance')
+    parser.add_argument('--normal', dest = 'normal', default = None, help = 'Normal pileup, or the name of a loaded sample for concordance')
+    parser.add_argument('--sample', dest = 'sample', default = None, help = 'Pileup or loaded sample to match against the references')
+    parser.add_argument('--pileup', dest = 'pileup', default = None, help = 'Pileup of a sample to load as a reference')
+    parser.add_argument('--name', dest = 'name', default = None, help = 'Name of a sample to load or unload')
+    parser.add_argument('--top', dest = 'top', default = None, type = int, help = 'The number of matches to report')
+    parser.add_argument('--min-cov', dest = 'min_cov', default = None, type = int, help = 'Minimum coverage quality value, instead of the default of the daemon')
+    parser.add_argument('--normal-homozygous-markers-only', dest = 'normal_homozygous_markers_only', default = None, action = "store_true", help = 'Use only homozygous markers')
+    parser.add_argument('--timeout', dest = 'timeout', default = None, type = float, help = 'Seconds to wait for the response')
+
+    args = parser.parse_args()
+    main(**vars(args))
+
+if __name__ == '__main__':
+    parse()
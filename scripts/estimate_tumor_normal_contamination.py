@@ -13,22 +13,15 @@
 import sys
 import os
 import optparse
-from collections import defaultdict
-import numpy as np
-from math import pow
 
 # need to import the module from the other dir
 THIS_DIR = os.path.dirname(os.path.realpath(__file__))
 PARENT_DIR = os.path.dirname(THIS_DIR)
 sys.path.insert(0, PARENT_DIR)
-from modules import ContaminationModel
 from modules import ContaminationMarker
-from modules import MathOperations
-from modules import Genotypes
+from modules import contamination
 sys.path.pop(0)
 
-HOMOZYGOUS_P_VALUE_THRESHOLD = 0.999
-
 desc = """Program to estimate tumor-normal sample contamination"""
 parser = optparse.OptionParser(version='%prog version 1.0 March/01/2016', description=desc)
 parser.add_option('-T', '--tumor_pileup', help='TUMOR PILEUP FILE [mandatory field]', type='string', action='store')
@@ -70,80 +63,16 @@ if not os.path.exists(MARKER_FILE):
 grid_precision = opts.grid
 MMQ = opts.min_mapping_quality
 
-def drange(start, stop, step):
-    r = start
-    while r < stop:
-        yield r
-        r += step
-
 Markers = ContaminationMarker.get_markers(MARKER_FILE)
-
-Normal_homozygous_genotype = defaultdict(lambda: defaultdict())
-
-checkpoints = [i for i in drange(0.0, 1.0, grid_precision)]
-checkpoints.append(0.5)
-Scores = ContaminationModel.create_conditional_likelihood_of_base_dict(checkpoints)
-checkpoints = [i for i in drange(0.0, 0.5, grid_precision)]
-checkpoints.append(0.5)
+Scores = contamination.make_scores(grid_precision)
 
 if opts.outfile != "-":
     outfile = open(opts.outfile, 'w')
 
-### PARSING THE NORMAL PILEUP FILE, CALCULATING THE LIKELIHOOD FUNCTION
-
-file = open(opts.normal_pileup)
-Data = []
-for line in file:
-    if line.startswith("[REDUCE RESULT]"):
-        continue
-    pileup = ContaminationMarker.parse_mpileup_line(line, min_map_quality=MMQ)
-    try:
-        marker = Markers[pileup.chrom + ":" + pileup.pos]
-    except:
-        continue
-
-    if pileup.Quals[marker.ref] == [] and pileup.Quals[marker.alt] == []:
-        continue
-
-    RAF = marker.RAF
-    ref_basequals = pileup.Quals[marker.ref]
-    alt_basequals = pileup.Quals[marker.alt]
-
-    AA_likelihood, AB_likelihood, BB_likelihood = Genotypes.compute_genotype_likelihood(pileup.Quals[marker.ref], pileup.Quals[marker.alt], normalize=True)
-
-    if AA_likelihood >= HOMOZYGOUS_P_VALUE_THRESHOLD:
-        Normal_homozygous_genotype[pileup.chrom][pileup.pos] = {'genotype': marker.ref, 'AA_likelihood': AA_likelihood, 'AB_likelihood': AB_likelihood, 'BB_likelihood': BB_likelihood}
-    elif BB_likelihood >= HOMOZYGOUS_P_VALUE_THRESHOLD:
-        Normal_homozygous_genotype[pileup.chrom][pileup.pos] = {'genotype': marker.alt, 'AA_likelihood': AA_likelihood, 'AB_likelihood': AB_likelihood, 'BB_likelihood': BB_likelihood}
-
-
-    p_AA, p_AB, p_BB = Genotypes.RAF2genotypeProb(RAF)
-    lPAA = MathOperations.log10p(p_AA)
-    lPAB = MathOperations.log10p(p_AB)
-    lPBB = MathOperations.log10p(p_BB)
-
-
-    priors = [lPAA*2, lPAA+lPBB, lPAA+lPAB, lPAB*2, lPAB+lPAA, lPAB+lPBB, lPBB*2, lPBB+lPAA, lPBB+lPAB]
-    marker_data = [priors, ref_basequals, alt_basequals]
-    Data.append(marker_data)
-
-file.close()
-D = ContaminationModel.calculate_contamination_likelihood(checkpoints, Data, Scores)
-ARGMAX = np.argmax(D)
-cont = checkpoints[ARGMAX]
-
-x1 = max(cont-grid_precision, 0.0)
-x2 = cont
-x3 = min(cont+grid_precision, 1.0)
-
-if x2 == 0.0:
-    x2 += grid_precision/100
-elif x2 == 1.0:
-    x2 -= grid_precision/100
+### PARSING THE NORMAL PILEUP FILE, CALCULATING THE LIKELIHOOD FUNCTION AND SEARCHING THE SPACE AROUND ARGMAX
 
-### SEARCHING THE SPACE AROUND ARGMAX - Brent's algorithm
-
-optimal_val = ContaminationModel.apply_brents_algorithm(Data, Scores, x1, x2, x3)
+Data, Normal_homozygous_genotype = contamination.normal_contamination_data(opts.normal_pileup, Markers, min_mapping_quality=MMQ)
+optimal_val = contamination.estimate_level(Data, Scores, contamination.normal_checkpoints(grid_precision), grid_precision)
 
 ### PRINTING THE NORMAL RESULTS
 
@@ -152,70 +81,10 @@ if opts.outfile == "-":
 else:
     outfile.write("Normal sample contamination level: " + str(round(100.0*optimal_val, 3)) + "%\n")
 
+### PARSING THE TUMOR PILEUP FILE AT THE MARKERS WHERE THE NORMAL IS HOMOZYGOUS, CALCULATING THE LIKELIHOOD FUNCTION AND SEARCHING THE SPACE AROUND ARGMAX
 
-### PARSING THE TUMOR PILEUP FILE, CALCULATING THE LIKELIHOOD FUNCTION
-
-file = open(opts.tumor_pileup)
-
-checkpoints = [i for i in drange(0.0, 1.0, grid_precision)]
-Data = []
-for line in file:
-    if line.startswith("[REDUCE RESULT]"):
-        continue
-    pileup = ContaminationMarker.parse_mpileup_line(line, min_map_quality=MMQ)
-
-    try:
-        normal_hom_genotype = Normal_homozygous_genotype[pileup.chrom][pileup.pos]['genotype']
-    except:
-        continue
-
-    try:
-        marker = Markers[pileup.chrom + ":" + pileup.pos]
-    except:
-        continue
-
-    if pileup.Quals[marker.ref] == [] and pileup.Quals[marker.alt] == []:
-        continue
-
-    RAF = marker.RAF
-    ref_basequals = pileup.Quals[marker.ref]
-    alt_basequals = pileup.Quals[marker.alt]
-
-    Normal_info = Normal_homozygous_genotype[pileup.chrom][pileup.pos]
-    AA_likelihood = Normal_info['AA_likelihood']
-    AB_likelihood = Normal_info['AB_likelihood']
-    BB_likelihood = Normal_info['BB_likelihood']
-    nlPAA = MathOperations.log10p(AA_likelihood)
-    nlPAB = MathOperations.log10p(AB_likelihood)
-    nlPBB = MathOperations.log10p(BB_likelihood)
-
-
-    p_AA, p_AB, p_BB = Genotypes.RAF2genotypeProb(RAF)
-    lPAA = MathOperations.log10p(p_AA)
-    lPAB = MathOperations.log10p(p_AB)
-    lPBB = MathOperations.log10p(p_BB)
-    priors = [lPAA+nlPAA, lPBB+nlPAA,lPAB+nlPAA, lPAB+nlPAB, lPAA+nlPAB, lPBB+nlPAB, lPBB+nlPBB, lPAA+nlPBB, lPAB+nlPBB]
-    marker_data = [priors, ref_basequals, alt_basequals]
-    Data.append(marker_data)
-
-file.close()
-
-D = ContaminationModel.calculate_contamination_likelihood(checkpoints, Data, Scores)
-ARGMAX = np.argmax(D)
-cont = checkpoints[ARGMAX]
-
-x1 = max(cont-grid_precision, 0.0)
-x2 = cont
-x3 = min(cont+grid_precision, 1.0)
-
-if x2 == 0.0:
-    x2 += grid_precision/100
-elif x2 == 1.0:
-    x2 -= grid_precision/100
-
-### SEARCHING THE SPACE AROUND ARGMAX - Brent's algorithm
-
-optimal_val = ContaminationModel.apply_brents_algorithm(Data, Scores, x1, x2, x3)
+Data = contamination.tumor_contamination_data(opts.tumor_pileup, Markers, Normal_homozygous_genotype, min_mapping_quality=MMQ)
+optimal_val = contamination.estimate_level(Data, Scores, contamination.tumor_checkpoints(grid_precision), grid_precision)
 
 ### PRINTING THE TUMOR RESULTS
 
@@ -15,6 +15,7 @@ THIS_DIR = os.path.dirname(os.path.realpath(__file__))
 PARENT_DIR = os.path.dirname(THIS_DIR)
 sys.path.insert(0, PARENT_DIR)
 from modules.ContaminationMarker import get_markers, genotype_likelihoods_for_markers
+from modules.pileup_io import is_stream
 sys.path.pop(0)
 
 # need to find a default set of targets to use; Conpair-GRCh37-default
@@ -28,13 +29,19 @@ def main(**kwargs):
     pileup_file = kwargs.pop('pileup_file', None)
     pileup_list = kwargs.pop('pileup_list', "pileups.txt")
     output_dir = kwargs.pop('output_dir', None)
+    output_file = kwargs.pop('output_file', None)
     markers = kwargs.pop('markers', default_marker_file)
     min_base_quality = kwargs.pop('min_base_quality', 20)
     min_mapping_quality = kwargs.pop('min_mapping_quality', 10)
+    num_threads = kwargs.pop('num_threads', 1)
 
     # if a single pileup was passed, use that one
     if pileup_file:
         all_pileups = [ pileup_file ]
+        if output_file is None and is_stream(pileup_file):
+            raise Exception("An --output-file is needed when reading the pileup from stdin or a pipe")
+    elif output_file is not None:
+        raise Exception("--output-file can only be used with a single --pileup")
     else:
         # read paths to pileup files from list
         with open(pileup_list) as fin:
@@ -43,15 +50,25 @@ def main(**kwargs):
     Markers = get_markers(markers)
 
     for pileup_file in all_pileups:
-        likelihoods = genotype_likelihoods_for_markers(Markers, pileup_file, min_map_quality=min_mapping_quality, min_base_quality=min_base_quality)
+        likelihoods = genotype_likelihoods_for_markers(Markers, pileup_file, min_map_quality=min_mapping_quality, min_base_quality=min_base_quality, num_threads=num_threads)
 
-        # output_file = os.path.join(output_dir, os.path.basename(pileup_file)) + '.pickle'
-        pre, ext = os.path.splitext(os.path.basename(pileup_file)) # foo, .pileup
-        output_file = pre + '.pickle'
+        if output_file == '-':
+            # write the pickle to stdout so it can be piped on as well
+            fout = getattr(sys.stdout, 'buffer', sys.stdout)
+            pickle.dump(likelihoods, fout)
+            fout.flush()
+            continue
 
-        # put it in a dir if one was specified
-        if output_dir:
-            output_file = os.path.join(output_dir, output_file)
+        if output_file is None:
+            # output_file = os.path.join(output_dir, os.path.basename(pileup_file)) + '.pickle'
+            pre, ext = os.path.splitext(os.path.basename(pileup_file)) # foo, .pileup
+            if ext in ['.gz', '.bgz', '.zst']:
+                pre, ext = os.path.splitext(pre) # foo.pileup.gz -> foo, .pileup
+            output_file = pre + '.pickle'
+
+            # put it in a dir if one was specified
+            if output_dir:
+                output_file = os.path.join(output_dir, output_file)
 
         # dont overwrite existing file
         if os.path.exists(output_file):
@@ -60,18 +77,21 @@ def main(**kwargs):
         else:
             with open(output_file,"wb") as fout:
                 pickle.dump(likelihoods, fout)
+        output_file = None
 
 def parse():
     """
     Parse the command line options
     """
     parser = argparse.ArgumentParser(description = 'Generate cBio Portal metadata files from various input files')
-    parser.add_argument('--pileup', dest = 'pileup_file', default = None, help = 'A single GATK pileup file to convert')
+    parser.add_argument('--pileup', dest = 'pileup_file', default = None, help = 'A single GATK pileup file to convert; can be gzip, bgzip or zstd compressed. Use "-" to read it from stdin')
     parser.add_argument('--pileup-list', dest = 'pileup_list', default = "pileups.txt", help = 'File with a list filepaths to the pileups of the tumor samples to use')
     parser.add_argument('--output-dir', dest = 'output_dir', default = None, help = 'Output location for files')
+    parser.add_argument('--output-file', dest = 'output_file', default = None, help = 'Output file to use for a single --pileup instead of naming it after the input; use "-" for stdout')
     parser.add_argument('--markers', dest = 'markers', default = default_marker_file, help = 'Markers to use for analysis')
     parser.add_argument('--min-base-quality', dest = 'min_base_quality', type = int, default = 20, help = 'Minimum base quality to use in output')
     parser.add_argument('--min-mapping-quality', dest = 'min_mapping_quality', type = int, default = 10, help = 'Minimum mapping quality to use in output')
+    parser.add_argument('-t', '--threads', dest = 'num_threads', type = int, default = 1, help = 'The number of CPU threads to use for parsing each pileup file')
 
     args = parser.parse_args()
     main(**vars(args))
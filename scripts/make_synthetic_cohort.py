@@ -0,0 +1,54 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+Write a synthetic cohort of tumor and normal pileups for a marker panel, for testing and benchmarking
+
+Outputs a tumor and a normal pileup for each individual, tumors.txt and normals.txt lists to use with `run.py concordance --tumors-list --normals-list`,
+and truth.tsv with the individual each tumor really came from and its contamination
+"""
+import os
+import sys
+import argparse
+
+# need to import the module from the other dir
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+PARENT_DIR = os.path.dirname(THIS_DIR)
+sys.path.insert(0, PARENT_DIR)
+from modules.ContaminationMarker import get_markers
+from modules.synthetic import make_cohort, subset_markers
+sys.path.pop(0)
+
+default_marker_file = os.path.join(PARENT_DIR, 'data', 'markers', 'GRCh37.autosomes.phase3_shapeit2_mvncall_integrated.20130502.SNV.genotype.sselect_v4_MAF_0.4_LD_0.8.txt')
+
+def main(**kwargs):
+    """
+    Generate the cohort
+    """
+    output_dir = kwargs.pop('output_dir')
+    markers = kwargs.pop('markers', default_marker_file)
+    num_markers = kwargs.pop('num_markers', None)
+    markers_data = subset_markers(get_markers(markers), num_markers)
+    truth = make_cohort(output_dir, markers_data, **kwargs)
+    sys.stderr.write("Wrote {0} tumors and {0} normals with {1} markers to {2}\n".format(len(truth), len(markers_data), output_dir))
+
+def parse():
+    """
+    Parse the command line options
+    """
+    parser = argparse.ArgumentParser(description = 'Write a synthetic cohort of tumor and normal pileups')
+    parser.add_argument('--output-dir', dest = 'output_dir', required = True, help = 'Directory to write the cohort to')
+    parser.add_argument('--markers', dest = 'markers', default = default_marker_file, help = 'Markers to simulate reads for')
+    parser.add_argument('--num-markers', dest = 'num_markers', type = int, default = None, help = 'Only use this many markers, spread evenly over the panel')
+    parser.add_argument('--num-samples', dest = 'num_samples', type = int, default = 10, help = 'Number of individuals, each with a tumor and a normal')
+    parser.add_argument('--depth', dest = 'depth', type = int, default = 30, help = 'Mean number of reads per marker')
+    parser.add_argument('--format', dest = 'pileup_format', default = 'gatk', choices = ['gatk', 'samtools'], help = 'GATK verbose pileup or samtools mpileup with mapping qualities')
+    parser.add_argument('--swap-rate', dest = 'swap_rate', type = float, default = 0.0, help = 'Fraction of the tumors that are swapped with the tumor of another individual')
+    parser.add_argument('--contamination-rate', dest = 'contamination_rate', type = float, default = 0.0, help = 'Fraction of the tumors that are contaminated by another individual')
+    parser.add_argument('--contamination', dest = 'contamination', type = float, default = 0.1, help = 'Fraction of the reads of contaminated tumors that come from the other individual')
+    parser.add_argument('--seed', dest = 'seed', type = int, default = 0, help = 'Random seed')
+
+    args = parser.parse_args()
+    main(**vars(args))
+
+if __name__ == '__main__':
+    parse()
@@ -1,7 +1,11 @@
 // workflow for running concordance in parallel for all tumors vs. a single list of normals
+// the genotype likelihoods of each sample are saved to a .pickle file once, then the tumors are run in batches of tumors_per_task
+// against all the normals; or if num_shards is set, all the pairs are split into that many evenly sized jobs
 nextflow.enable.dsl=2
 
-include { run_concordance } from './run-concordance.nf'
+include { run_concordance_batch; run_concordance_shard } from './run-concordance.nf'
+include { likelihoods; pickle_name } from './likelihoods.nf'
+include { merge_shards } from './merge-shards.nf'
 include { plot_concordance_distribution } from './plot_concordance_distribution.nf'
 include { plot_benchmarks } from './plot_benchmarks.nf'
 include { filter_concordance } from './filter_concordance.nf'
@@ -12,15 +16,49 @@ log.info("${params}")
 log.info("----------------")
 
 workflow {
-    // need to load all the tumor file paths
-    tumors = Channel.fromPath("${params.tumors_list}").splitCsv().map { [file(it[0]), file("${params.normals_list}"), file("${params.markers_txt}")] }
+    if ( params.num_shards ) {
+        // split all the tumor vs. normal pairs evenly into shards, whatever the sizes of the tumor and normal lists
+        num_shards = params.num_shards as int
+        shards = Channel.of(1..num_shards).map { [it, num_shards, file("${params.tumors_list}"), file("${params.normals_list}"), file("${params.markers_txt}")] }
 
-    run_concordance(tumors)
+        run_concordance_shard(shards)
 
-    run_concordance.out.benchmarks | collectFile(name: 'benchmarks.tsv', storeDir: "${params.output_dir}") | set { benchmarks_tsv }
-    run_concordance.out.concordance_vals | set { tumor_concordance_vals }
+        run_concordance_shard.out.benchmarks | collectFile(name: 'benchmarks.tsv', storeDir: "${params.output_dir}") | set { benchmarks_tsv }
+        run_concordance_shard.out.concordance_vals | set { tumor_concordance_vals }
 
-    tumor_concordance_vals | collectFile(name: 'concordance.all.tsv', keepHeader: true, storeDir: "${params.output_dir}") | set { concordance_tsv }
+        tumor_concordance_vals.collect().map { [it, file("${params.tumors_list}"), file("${params.normals_list}")] } | merge_shards
+        merge_shards.out.concordance_tsv | set { concordance_tsv }
+    } else {
+        // make the .pickle files of the samples that do not have one yet; list entries that are already .pickle files are used as is
+        markers = file("${params.markers_txt}")
+        tumor_inputs = Channel.fromPath("${params.tumors_list}").splitCsv().map { file(it[0]) }.branch {
+            cached: it.name.endsWith('.pickle')
+            pileup: true
+            }
+        normal_inputs = Channel.fromPath("${params.normals_list}").splitCsv().map { file(it[0]) }.branch {
+            cached: it.name.endsWith('.pickle')
+            pileup: true
+            }
+        // a sample that is in both lists is only loaded once
+        likelihoods(tumor_inputs.pileup.mix(normal_inputs.pileup).unique().map { [it, markers] })
+
+        // match the .pickle files back to the tumors and normals by name
+        pickles = likelihoods.out.map { [it.name, it] }
+        tumor_pickles = tumor_inputs.pileup.map { [pickle_name(it), it] }.combine(pickles, by: 0).map { it[2] }
+        normal_pickles = normal_inputs.pileup.map { [pickle_name(it), it] }.combine(pickles, by: 0).map { it[2] }
+
+        // every batch of tumors gets the whole list of normals
+        normals = normal_pickles.mix(normal_inputs.cached).toSortedList { a, b -> a.name <=> b.name }.map { [it] }
+        batches = tumor_pickles.mix(tumor_inputs.cached).collate(params.tumors_per_task as int).map { [it] }.combine(normals).map { [it[0], it[1], markers] }
+
+        run_concordance_batch(batches)
+
+        // collect the outputs of all the batches into single files
+        run_concordance_batch.out.benchmarks | collectFile(name: 'benchmarks.tsv', storeDir: "${params.output_dir}") | set { benchmarks_tsv }
+        run_concordance_batch.out.concordance_vals | set { tumor_concordance_vals }
+
+        tumor_concordance_vals | collectFile(name: 'concordance.all.tsv', keepHeader: true, storeDir: "${params.output_dir}") | set { concordance_tsv }
+    }
 
     plot_concordance_distribution(concordance_tsv)
     plot_benchmarks(benchmarks_tsv)
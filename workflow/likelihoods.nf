@@ -1,3 +1,8 @@
+// name of the .pickle file made from a pileup, the same as make_genotype_likelihoods.py: foo.pileup or foo.pileup.gz -> foo.pickle
+def pickle_name(pileup) {
+    return "${pileup.name}".replaceFirst(/\.(gz|bgz|zst)$/, "").replaceFirst(/\.[^.]*$/, "") + ".pickle"
+}
+
 process likelihoods {
     // make a Python Pickle of the genotype likelihoods for faster loading in Conpair
     // NOTE: be careful which version of Python is used here; "python" might be Python 3 on newer systems by default
@@ -10,7 +15,7 @@ process likelihoods {
     path "${output_file}"
 
     script:
-    output_file = "${pileup}".replaceFirst(/.pileup$/, ".pickle")
+    output_file = pickle_name(pileup)
     """
     make_genotype_likelihoods.py \
     --pileup "${pileup}" \
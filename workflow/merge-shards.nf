@@ -0,0 +1,20 @@
+process merge_shards {
+    // combine the shard outputs and check that every pair was run exactly once
+    publishDir "${params.output_dir}", mode: 'copy'
+
+    input:
+    tuple path(shard_tsvs), path(tumors_list), path(normals_list)
+
+    output:
+    path "${output_file}", emit: concordance_tsv
+
+    script:
+    output_file = "concordance.all.tsv"
+    """
+    run.py merge \
+    --tumors-list "${tumors_list}" \
+    --normals-list "${normals_list}" \
+    --output-file "${output_file}" \
+    ${shard_tsvs}
+    """
+}
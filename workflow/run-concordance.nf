@@ -1,22 +1,52 @@
-process run_concordance {
-    publishDir "${params.output_dir}/concordance", mode: 'copy'
+process run_concordance_batch {
+    // run a batch of tumors against all the normals, from their genotype likelihoods .pickle files
+    // the per-batch outputs are not published; they are collected into single files by the workflow
 
     input:
-    tuple path(tumor_pileup), path(normals_list), path(markers)
+    tuple path(tumor_likelihoods, stageAs: 'tumors/*'), path(normal_likelihoods, stageAs: 'normals/*'), path(markers)
 
     output:
     path "${output_file}", emit: concordance_vals
     path "${benchmarks_file}", emit: benchmarks
 
     script:
-    output_file = "${tumor_pileup}.concordance.tsv"
-    benchmarks_file = "${tumor_pileup}.benchmarks.tsv"
+    output_file = "batch_${task.index}.concordance.tsv"
+    benchmarks_file = "batch_${task.index}.benchmarks.tsv"
     """
-    echo "${tumor_pileup}" > tumors.txt
+    # printf is a shell builtin so long lists of files are not limited by the max argument length
+    printf '%s\\n' tumors/* > tumors.txt
+    printf '%s\\n' normals/* > normals.txt
     run.py concordance \
     --tumors-list tumors.txt \
+    --normals-list normals.txt \
+    --markers "${markers}" \
+    --output-file "${output_file}" \
+    --threads "${task.cpus}" \
+    --save-benchmarks \
+    --benchmarks-file "${benchmarks_file}"
+    """
+}
+
+process run_concordance_shard {
+    // run one shard of all the tumor vs. normal pairs; each pair is assigned to a shard by run.py
+    publishDir "${params.output_dir}/concordance", mode: 'copy'
+
+    input:
+    tuple val(shard_index), val(num_shards), path(tumors_list), path(normals_list), path(markers)
+
+    output:
+    path "${output_file}", emit: concordance_vals
+    path "${benchmarks_file}", emit: benchmarks
+
+    script:
+    output_file = "shard_${shard_index}_of_${num_shards}.concordance.tsv"
+    benchmarks_file = "shard_${shard_index}_of_${num_shards}.benchmarks.tsv"
+    """
+    run.py concordance \
+    --tumors-list "${tumors_list}" \
     --normals-list "${normals_list}" \
     --markers "${markers}" \
+    --shard "${shard_index}/${num_shards}" \
     --output-file "${output_file}" \
     --threads "${task.cpus}" \
     --save-benchmarks \